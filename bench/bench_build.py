@@ -0,0 +1,67 @@
+"""
+NFA construction time for growing pattern sizes: build_nfa's State lists against the linear NFABuilder.
+Only construction is timed, not the epsilon closures both NFA classes precompute for matching.
+Each time is the best of several runs, a run slower than SLOW is not repeated and ends the column for its shape.
+
+Usage: python bench_build.py [max size] [repeat]
+"""
+import sys
+import timeit
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+from regex.compact_nfa import NFABuilder
+from regex.nfa import build_nfa
+from regex.parse_tree import build_tree
+from regex.rd_parser import RDParser
+
+SHAPES = {
+    'literal': lambda n: 'a' * n,
+    'alternation': lambda n: '|'.join('ab' for _ in range(n // 2)),
+    'star': lambda n: '(ab)*' * (n // 5),
+}
+
+
+# seconds, build_nfa is still quadratic on the larger sizes
+SLOW = 2.0
+
+
+def timed(f, tree, repeat):
+    """
+    @return -- float, seconds of the fastest of repeat calls f(tree)
+    """
+    first = timeit.timeit(lambda: f(tree), number=1)
+    if first > SLOW or repeat <= 1:
+        return first
+    return min([first] + timeit.repeat(lambda: f(tree), number=1, repeat=repeat - 1))
+
+
+def build_compact(tree):
+    # a new builder each run, as a builder keeps the states it created
+    return NFABuilder().build_fragment(tree)
+
+
+def main(max_size=102400, repeat=5):
+    parser = RDParser()
+
+    print("{:<12} {:>8} {:>14} {:>12}".format('shape', 'size', 'build_nfa ms', 'builder ms'))
+    for shape, make in SHAPES.items():
+        size = 100
+        slow = set()
+        while size <= max_size:
+            tree = build_tree(parser.run(make(size)))
+            columns = []
+            for f in (build_nfa, build_compact):
+                if f in slow:
+                    columns.append('-')
+                    continue
+                seconds = timed(f, tree, repeat)
+                if seconds > SLOW:
+                    slow.add(f)
+                columns.append("{:.2f}".format(seconds * 1000))
+            print("{:<12} {:>8} {:>14} {:>12}".format(shape, size, *columns))
+            size *= 2
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
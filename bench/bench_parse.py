@@ -0,0 +1,54 @@
+"""
+Parse throughput of the PLY grammar against the recursive descent parser.
+
+Usage: python bench_parse.py [repeat]
+"""
+import sys
+import time
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+PATTERNS = [
+    'abc',
+    '(a|b)*abb',
+    '[^a-z]x+[0-9]*',
+    '((a|b)(c|d))+e*',
+    '|'.join('word{}'.format(i) for i in range(50)),
+    'a' * 500,
+    '(' * 50 + 'a' + ')*' * 50,
+]
+
+
+def throughput(parser, repeat):
+    """
+    @return -- float, patterns parsed per second
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for pattern in PATTERNS:
+            parser.run(pattern)
+    return repeat * len(PATTERNS) / (time.perf_counter() - start)
+
+
+def main(repeat=200):
+    # importing either backend imports the package first, which already holds the rd parser,
+    # so import the package up front to keep it out of both startup times
+    import regex  # noqa: F401
+
+    start = time.perf_counter()
+    from regex.rd_parser import RDParser
+    rd = RDParser()
+    rd_startup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from regex.regex_parser import Regex
+    ply = Regex()
+    ply_startup = time.perf_counter() - start
+
+    print("{:<6} {:>12} {:>16}".format('parser', 'startup ms', 'patterns/sec'))
+    print("{:<6} {:>12.2f} {:>16.0f}".format('ply', ply_startup * 1000, throughput(ply, repeat)))
+    print("{:<6} {:>12.2f} {:>16.0f}".format('rd', rd_startup * 1000, throughput(rd, repeat)))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,60 @@
+"""
+Automaton sizes of counted repetition against the same patterns written out by hand, e.g. a{0,100} against a?a?...a?,
+for growing counts: NFA states and links as built, the largest epsilon closure, states left after simplify,
+and the compile time.
+
+Usage: python bench_repeat.py [max count]
+"""
+import sys
+import time
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+from regex.compact_nfa import build_compact_nfa
+from regex.compiler import Pattern, build_dfa
+from regex.literals import prefilters
+from regex.optimize import simplify
+from regex.parse_tree import build_tree
+from regex.rd_parser import RDParser
+
+# name -> (counted pattern, hand written pattern), as functions of the count
+CASES = {
+    'exact': (lambda n: 'a{{{}}}'.format(n), lambda n: 'a' * n),
+    'group': (lambda n: '(ab|c){{{}}}'.format(n), lambda n: '(ab|c)' * n),
+    'optional': (lambda n: 'a{{0,{}}}'.format(n), lambda n: 'a?' * n),
+    'range': (lambda n: '[a-z]{{1,{}}}x'.format(n), lambda n: '[a-z]' + '[a-z]?' * (n - 1) + 'x'),
+}
+
+
+def measure(pattern, parser):
+    """
+    @return -- tuple (NFA states, NFA links, largest epsilon closure, simplified states, compile seconds)
+    """
+    start = time.perf_counter()
+    tree = build_tree(parser.run(pattern))
+    nfa = build_compact_nfa(tree)
+    simple = simplify(nfa)
+    Pattern(pattern, simple, build_dfa(simple, tree=tree), *prefilters(tree))
+    seconds = time.perf_counter() - start
+
+    closure = max((len(nfa.closure(n)) for n in range(nfa.get_num_states())), default=0)
+    return nfa.get_num_states(), nfa.get_num_links(), closure, simple.get_num_states(), seconds
+
+
+def main(max_count=1000):
+    parser = RDParser()
+
+    print("{:<10} {:<8} {:>6} {:>8} {:>8} {:>8} {:>8} {:>10}".format(
+        'case', 'form', 'count', 'states', 'links', 'closure', 'simple', 'ms'))
+    for name, forms in CASES.items():
+        count = 10
+        while count <= max_count:
+            for form, make in zip(('counted', 'by hand'), forms):
+                states, links, closure, simple, seconds = measure(make(count), parser)
+                print("{:<10} {:<8} {:>6} {:>8} {:>8} {:>8} {:>8} {:>10.2f}".format(
+                    name, form, count, states, links, closure, simple, seconds * 1000))
+            count *= 10
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,277 @@
+"""
+Benchmark suite: parse, parse tree, NFA construction, compile and match times for pattern and text sizes
+from 10 to 100k chars, including patterns that are pathological for backtracking, against the re module.
+Results are written as JSON so runs from different versions can be compared.
+
+Usage: python bench_suite.py [--sizes 10,100,1000] [--repeat N] [--output FILE]
+       python bench_suite.py --compare OLD.json NEW.json [--threshold 1.2]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+from regex.compact_nfa import build_compact_nfa
+from regex.compiler import Pattern, build_dfa
+from regex.literals import prefilters
+from regex.nfa import NFA
+from regex.optimize import simplify
+from regex.parse_tree import build_tree
+from regex.rd_parser import RDParser
+
+SIZES = [10, 100, 1000, 10000, 100000]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# a single measurement taking longer than this is not repeated
+SLOW = 5.0
+# largest pattern size for stages that do not scale, the object NFA takes minutes beyond
+STAGE_MAX = {'nfa': 10000}
+
+
+def words(n):
+    """
+    @return -- list of distinct lowercase words w, wa, wb, ...
+    """
+    out = []
+    for i in range(n):
+        word = 'w'
+        while i:
+            i, r = divmod(i, 26)
+            word += chr(ord('a') + r)
+        out.append(word)
+    return out
+
+
+def fit(unit, n):
+    """
+    Repeat a unit until the pattern is about n chars long.
+    """
+    return unit * max(1, n // len(unit))
+
+
+def alternation(n):
+    pattern = ''
+    for word in words(n):
+        if len(pattern) + len(word) + 1 > n:
+            break
+        pattern += ('|' if pattern else '') + word
+    return pattern
+
+
+# pattern families for the parse and compile stages: name -> (function of the size, largest size to run)
+PATTERNS = {
+    'literal': (lambda n: (''.join(chr(ord('a') + i % 26) for i in range(n))), None),
+    'alternation': (alternation, None),
+    'classes': (lambda n: fit('[a-f]x', n), None),
+    'star': (lambda n: fit('(ab)*', n), None),
+    # parentheses nest as deep as the pattern is long
+    'nested': (lambda n: '(' * (n // 3) + 'a' + ')*' * (n // 3), 10000),
+}
+
+
+def text_of(alphabet, seed=0):
+    """
+    @return -- function of the size making the same random text on every run
+    """
+    def make(n):
+        rng = random.Random(seed)
+        return ''.join(rng.choice(alphabet) for _ in range(n))
+    return make
+
+
+# match cases: name -> (pattern, equivalent re pattern, text of a given size, operation, largest size re can take)
+# findall counts the non overlapping matches in the text, fullmatch matches the whole text.
+# Cases with a largest size for re are also run at that size, where re already takes about a second
+MATCHES = {
+    'words': ('(foo|bar)baz', '(?:foo|bar)baz', text_of(['foobaz ', 'lorem ', 'ipsum ', 'barbaz ', 'dolor ']),
+              'findall', None),
+    'suffix': ('[a-z]+ing', '[a-z]+ing', text_of('abcdefghijklmnopqrstuvwxyz '), 'findall', None),
+    'digits': ('x[0-9]+y', 'x[0-9]+y', text_of('x0123456789y '), 'findall', None),
+    'dfa_blowup': ('(a|b)*a' + '(a|b)' * 12, '(?:a|b)*a' + '(?:a|b)' * 12, text_of('ab'), 'fullmatch', None),
+    # catastrophic backtracking for re, the sizes it is run at are capped
+    'nested_star': ('(a*)*b', '(?:a*)*b', lambda n: 'a' * n, 'fullmatch', 22),
+    'overlap': ('(a|aa)*b', '(?:a|aa)*b', lambda n: 'a' * n, 'fullmatch', 30),
+    'optional': ('(a|[])' * 22 + 'a' * 22, 'a?' * 22 + 'a' * 22, lambda n: 'a' * n, 'fullmatch', 22),
+}
+
+
+def best_time(f, repeat):
+    """
+    @return -- float, fastest of repeat runs in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+        if times[-1] > SLOW:
+            break
+    return min(times)
+
+
+def compile_pattern(pattern, parser):
+    """
+    Compile without the pattern cache, as compile() does.
+    """
+    tree = build_tree(parser.run(pattern))
+    nfa = simplify(build_compact_nfa(tree))
+    return Pattern(pattern, nfa, build_dfa(nfa, tree=tree), *prefilters(tree))
+
+
+def bench_stages(sizes, repeat):
+    try:
+        from regex.regex_parser import Regex
+        ply = Regex()
+    except ImportError:
+        ply = None
+
+    rd = RDParser()
+    results = []
+
+    for name, (make, max_size) in PATTERNS.items():
+        for size in sizes:
+            if max_size is not None and size > max_size:
+                continue
+            pattern = make(size)
+            parsed = rd.run(pattern)
+            tree = build_tree(parsed)
+
+            stages = {
+                'parse_rd': lambda: rd.run(pattern),
+                'build_tree': lambda: build_tree(parsed),
+                'nfa': lambda: NFA(tree),
+                'compact_nfa': lambda: build_compact_nfa(tree),
+                'compile': lambda: compile_pattern(pattern, rd),
+            }
+            if ply is not None:
+                stages['parse_ply'] = lambda: ply.run(pattern)
+
+            # re caches compiled patterns, which would hide the compile time
+            re_time = best_time(lambda: (re.purge(), re.compile(pattern)), repeat)
+
+            for stage, f in stages.items():
+                if size > STAGE_MAX.get(stage, size):
+                    continue
+                seconds = best_time(f, repeat)
+                results.append({'stage': stage, 'case': name, 'size': len(pattern), 'seconds': seconds,
+                                're_seconds': re_time if stage == 'compile' else None})
+                report(results[-1])
+
+    return results
+
+
+def bench_matches(sizes, repeat):
+    results = []
+
+    for name, (pattern, re_pattern, make, operation, re_max) in MATCHES.items():
+        compiled = compile_pattern(pattern, RDParser())
+        regex = re.compile(re_pattern)
+
+        if operation == 'findall':
+            ours = lambda text: sum(1 for _ in compiled.finditer(text))
+            theirs = lambda text: sum(1 for _ in regex.finditer(text))
+        else:
+            ours = compiled.fullmatch
+            theirs = regex.fullmatch
+
+        for size in sorted(set(sizes) | ({re_max} if re_max is not None else set())):
+            text = make(size)
+            seconds = best_time(lambda: ours(text), repeat)
+            re_time = best_time(lambda: theirs(text), repeat) if re_max is None or size <= re_max else None
+
+            results.append({'stage': operation, 'case': name, 'size': len(text), 'seconds': seconds,
+                            're_seconds': re_time})
+            report(results[-1])
+
+    return results
+
+
+def report(result):
+    re_time = result['re_seconds']
+    print("{:<12} {:<12} {:>8} {:>12.3f} {:>12}".format(
+        result['stage'], result['case'], result['size'], result['seconds'] * 1000,
+        '{:.3f}'.format(re_time * 1000) if re_time is not None else '-'))
+
+
+def git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def run(sizes, repeat, output):
+    print("{:<12} {:<12} {:>8} {:>12} {:>12}".format('stage', 'case', 'size', 'ms', 're ms'))
+    results = bench_stages(sizes, repeat) + bench_matches(sizes, repeat)
+
+    revision = git_revision()
+    data = {
+        'revision': revision,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, '{}.json'.format(revision or time.strftime('%Y%m%d-%H%M%S')))
+    with open(output, 'w') as f:
+        json.dump(data, f, indent=1)
+    print("results written to {}".format(output))
+
+
+def compare(old_path, new_path, threshold):
+    """
+    Print the ratio of new to old time for every measurement both runs made.
+
+    @return -- int, number of measurements slower than threshold times the old one
+    """
+    with open(old_path) as f:
+        old = {(r['stage'], r['case'], r['size']): r['seconds'] for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = json.load(f)['results']
+
+    regressions = 0
+    print("{:<12} {:<12} {:>8} {:>12} {:>12} {:>8}".format('stage', 'case', 'size', 'old ms', 'new ms', 'ratio'))
+    for r in new:
+        before = old.get((r['stage'], r['case'], r['size']))
+        if before is None:
+            continue
+        ratio = r['seconds'] / before if before > 0 else float('inf')
+        slower = ratio > threshold
+        regressions += slower
+        print("{:<12} {:<12} {:>8} {:>12.3f} {:>12.3f} {:>8.2f}{}".format(
+            r['stage'], r['case'], r['size'], before * 1000, r['seconds'] * 1000, ratio, '  slower' if slower else ''))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='comma separated pattern and text sizes')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, the fastest is kept')
+    parser.add_argument('--output', help='JSON file to write, defaults to results/<git revision>.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    parser.add_argument('--threshold', type=float, default=1.2, help='ratio reported as slower by --compare')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(args.compare[0], args.compare[1], args.threshold) else 0
+
+    run([int(size) for size in args.sizes.split(',')], args.repeat, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,8 @@
+from .batch import match_many
+from .compiler import (Pattern, compile, cache_info, findall, finditer, purge, search, set_cache_dir, set_cache_size,
+                       set_parser)
+from .errors import DeadlineError, DFALimitError, LimitError, NFALimitError, ParseError, RegexError, StepLimitError
+from .instrument import add_observer, remove_observer, reset_stats, set_instrumentation, stats
+from .limits import Limits
+from .multi import PatternSet
+from .stream import search_stream
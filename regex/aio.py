@@ -0,0 +1,330 @@
+import asyncio
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .batch import match_many
+from .compiler import Pattern, cache, cached, compile, restore
+from .serialize import dumps, loads
+from .stream import CHUNK_SIZE
+
+# inputs shorter than this are matched on the event loop, they take well under a millisecond
+MIN_OFFLOAD_SIZE = 4096
+
+
+class AsyncMatcher(object):
+    """
+    Compiles and matches for asyncio code. Compiling a new pattern and matching a large input run on an executor,
+    so the event loop keeps serving other tasks meanwhile.
+    At most max_pending calls are queued or running on the executor at once and later ones wait for a slot,
+    which holds back the producers feeding them. Cancelling a call that has not started takes it off the executor's
+    queue; one that has started runs to its end on the worker, as the automata cannot be interrupted.
+    Worker threads take turns with the event loop for the GIL, so under heavy matching the loop can wait a few switch
+    intervals; a ProcessPoolExecutor keeps it responsive at the cost of compiling patterns in every worker.
+    """
+
+    def __init__(self, executor=None, max_pending=None, min_offload=MIN_OFFLOAD_SIZE):
+        """
+        @param executor -- concurrent.futures.Executor, a thread pool is created when first needed if None.
+                           Patterns are sent to the workers of a ProcessPoolExecutor as source strings
+                           and compiled there once per process
+        @param max_pending -- int, calls on the executor at once, defaults to twice the number of CPUs
+        @param min_offload -- int, length of the input from which matching runs on the executor
+        """
+        self.executor = executor
+        self.max_pending = max_pending or 2 * (os.cpu_count() or 1)
+        self.min_offload = min_offload
+        # event loop -> Semaphore of the free slots, as an asyncio.Semaphore belongs to one loop
+        self._slots = weakref.WeakKeyDictionary()
+
+    async def acompile(self, pattern):
+        """
+        @param pattern -- str or Pattern
+
+        @return -- Pattern
+        """
+        compiled = self._local(pattern)
+        if compiled is not None:
+            return compiled
+
+        if isinstance(self.executor, ProcessPoolExecutor):
+            compiled = restore(loads(await self._offload(_compile_dumps, pattern)))
+            # later calls find it in this process, as they would after compile()
+            cache(compiled)
+            return compiled
+        return await self._offload(compile, pattern)
+
+    async def amatch(self, pattern, s):
+        """
+        @param pattern -- str or Pattern
+        @param s -- str
+
+        @return -- int, length of the longest prefix of s that matches, or None if no prefix matches
+        """
+        return await self._call(pattern, 'match', s)
+
+    async def afullmatch(self, pattern, s):
+        """
+        @param pattern -- str or Pattern
+        @param s -- str
+
+        @return -- boolean, whether the whole of s matches
+        """
+        return await self._call(pattern, 'fullmatch', s)
+
+    async def asearch(self, pattern, s, pos=0, endpos=None):
+        """
+        @param pattern -- str or Pattern
+        @param s -- str
+        @param pos -- int, where to start looking
+        @param endpos -- int, where to stop looking, defaults to len(s)
+
+        @return -- tuple (start, end) of the leftmost-longest match in s[pos:endpos], or None if there is none
+        """
+        return await self._call(pattern, 'search', s, pos, endpos)
+
+    async def amatch_many(self, pattern, strings):
+        """
+        Check which of many strings the pattern matches in full, as the app does with its test strings.
+
+        @param pattern -- str or Pattern
+        @param strings -- iterable of str
+
+        @return -- what match_many returns
+        """
+        strings = list(strings)
+        compiled = self._local(pattern)
+        if compiled is not None and sum(map(len, strings)) < self.min_offload:
+            return match_many(compiled, strings)
+        return await self._offload(match_many, self._portable(pattern), strings)
+
+    async def afinditer(self, pattern, source, chunk_size=CHUNK_SIZE):
+        """
+        Find the non overlapping leftmost-longest matches in a str or an async byte stream.
+        A stream is read chunk by chunk and matched a line at a time, as search_stream does,
+        so a match never spans a newline and only the current chunk and line are held in memory.
+        The next chunk is only read once the matches of the previous one have been found.
+
+        @param pattern -- str or Pattern
+        @param source -- str, or asyncio.StreamReader or other object with an async read(n), or async iterable
+                         of bytes
+        @param chunk_size -- int, bytes read at a time from an object with a read method
+
+        @return -- async generator of (start, end) spans, in chars of a str or bytes from the start of a stream
+        """
+        if isinstance(source, str):
+            for span in await self._call(pattern, 'finditer', source):
+                yield span
+            return
+
+        offset = 0
+        pending = []
+
+        async for chunk in _chunks(source, chunk_size):
+            cut = chunk.rfind(b'\n') + 1
+            if not cut:
+                pending.append(chunk)
+                continue
+
+            pending.append(chunk[:cut])
+            data = b''.join(pending)
+            pending = [chunk[cut:]]
+
+            for span in await self._find_lines(pattern, data, offset):
+                yield span
+            offset += len(data)
+
+        data = b''.join(pending)
+        if data:
+            for span in await self._find_lines(pattern, data, offset):
+                yield span
+
+    async def _call(self, pattern, name, s, *args):
+        """
+        Call a method of the compiled pattern, on the event loop if the pattern is compiled and s is small.
+        """
+        compiled = self._local(pattern)
+        if compiled is not None and len(s) < self.min_offload:
+            return _apply(compiled, name, s, *args)
+        return await self._offload(_apply, self._portable(pattern), name, s, *args)
+
+    async def _find_lines(self, pattern, data, offset):
+        compiled = self._local(pattern)
+        if compiled is not None and len(data) < self.min_offload:
+            return find_lines(compiled, data, offset)
+        return await self._offload(find_lines, self._portable(pattern), data, offset)
+
+    async def _offload(self, f, *args):
+        """
+        Run f(*args) on the executor once a slot is free.
+
+        @return -- what f returns
+        """
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_pending)
+
+        await slots.acquire()
+        try:
+            future = self._executor().submit(f, *args)
+        except BaseException:
+            slots.release()
+            raise
+
+        # the slot is freed once the worker is done or the call is dropped from the queue,
+        # not as soon as the caller stops waiting
+        future.add_done_callback(lambda _: _release(loop, slots))
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(thread_name_prefix='regex')
+        return self.executor
+
+    def _local(self, pattern):
+        """
+        @return -- Pattern if it can be had without compiling, otherwise None
+        """
+        return pattern if isinstance(pattern, Pattern) else cached(pattern)
+
+    def _portable(self, pattern):
+        """
+        @return -- pattern as it is sent to the executor, the source string for worker processes
+        """
+        if isinstance(pattern, Pattern) and isinstance(self.executor, ProcessPoolExecutor):
+            return pattern.pattern
+        return pattern
+
+
+def _release(loop, slots):
+    try:
+        loop.call_soon_threadsafe(slots.release)
+    except RuntimeError:
+        # the loop is closed, so is the semaphore
+        pass
+
+
+async def _chunks(source, chunk_size):
+    """
+    @return -- async generator of the non empty bytes chunks of an async byte stream
+    """
+    read = getattr(source, 'read', None)
+    if read is not None:
+        while True:
+            chunk = await read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        async for chunk in source:
+            if chunk:
+                yield bytes(chunk)
+
+
+def _apply(pattern, name, s, *args):
+    """
+    Call a method of a pattern on a worker. Module level so it can be sent to worker processes.
+    """
+    if isinstance(pattern, (str, bytes)):
+        pattern = compile(pattern)
+    result = getattr(pattern, name)(s, *args)
+    return list(result) if name == 'finditer' else result
+
+
+def _compile_dumps(pattern):
+    """
+    @return -- bytes, the compiled pattern serialised to send it back from a worker process
+    """
+    return dumps(compile(pattern))
+
+
+def find_lines(pattern, data, offset=0):
+    """
+    Match each line of UTF-8 data on its own.
+    For a str pattern, bytes that are not valid UTF-8 are decoded to lone surrogates, which only '.' and negated
+    ranges match; a bytes pattern reads the lines as they are, and never matches such bytes.
+
+    @param pattern -- str, bytes or Pattern
+    @param data -- bytes
+    @param offset -- int, byte offset of data in its stream
+
+    @return -- list of (start, end) byte offsets of the matches
+    """
+    if isinstance(pattern, (str, bytes)):
+        pattern = compile(pattern)
+
+    # nothing in data can match without one of the literals every match contains
+    if pattern.required is not None and pattern.required.encode().finder(data)(0) < 0:
+        return []
+
+    lines = data.split(b'\n')
+    if data.endswith(b'\n'):
+        lines.pop()
+
+    spans = []
+    if isinstance(pattern.pattern, bytes):
+        for line in lines:
+            spans += [(offset + start, offset + end) for start, end in pattern.finditer(line)]
+            offset += len(line) + 1
+        return spans
+
+    for line in lines:
+        text = line.decode('utf-8', 'surrogateescape')
+        one_byte_chars = len(text) == len(line)
+        # char and byte offset of the last match boundary, the offsets only ever move forward
+        char_pos = byte_pos = 0
+        for span in pattern.finditer(text):
+            if not one_byte_chars:
+                start, end = span
+                byte_start = byte_pos + len(text[char_pos:start].encode('utf-8', 'surrogateescape'))
+                byte_pos = byte_start + len(text[start:end].encode('utf-8', 'surrogateescape'))
+                char_pos = end
+                span = byte_start, byte_pos
+            spans.append((offset + span[0], offset + span[1]))
+        offset += len(line) + 1
+
+    return spans
+
+
+_default = AsyncMatcher()
+
+
+def set_executor(executor, max_pending=None, min_offload=MIN_OFFLOAD_SIZE):
+    """
+    Configure where the module level async functions run their work.
+    The executor is not shut down when it is replaced.
+
+    @param executor -- concurrent.futures.Executor, or None for a thread pool of the default size
+    @param max_pending -- int, calls on the executor at once, defaults to twice the number of CPUs
+    @param min_offload -- int, length of the input from which matching runs on the executor
+    """
+    global _default
+    _default = AsyncMatcher(executor, max_pending, min_offload)
+
+
+async def acompile(pattern):
+    return await _default.acompile(pattern)
+
+
+async def amatch(pattern, s):
+    return await _default.amatch(pattern, s)
+
+
+async def afullmatch(pattern, s):
+    return await _default.afullmatch(pattern, s)
+
+
+async def asearch(pattern, s, pos=0, endpos=None):
+    return await _default.asearch(pattern, s, pos, endpos)
+
+
+async def amatch_many(pattern, strings):
+    return await _default.amatch_many(pattern, strings)
+
+
+def afinditer(pattern, source, chunk_size=CHUNK_SIZE):
+    """
+    @return -- async generator, see AsyncMatcher.afinditer
+    """
+    return _default.afinditer(pattern, source, chunk_size)
@@ -1,10 +1,10 @@
-import re
 import rstr
 import tkinter as tk
 
-from nfa import NFA
-from parse_tree import build_tree
-from regex_parser import Regex
+from .batch import match_many
+from .compiler import compile, parse
+from .errors import RegexError
+from .nfa import NFA
 
 
 class RegexApp(tk.Tk):
@@ -16,8 +16,6 @@ class RegexApp(tk.Tk):
         tk.Tk.__init__(self, *args, **kwargs)
         self.wm_title('Regex')
 
-        self.parser = Regex()
-
         self.screenwidth = self.winfo_screenwidth()
         self.screenheight = self.winfo_screenheight()
 
@@ -61,21 +59,21 @@ class RegexApp(tk.Tk):
         top = 10
 
         if len(usr_input) > 0:
-            self.parser.run(usr_input)
-
-            if not self.parser.error:
-                if len(test_input) > 0:
-                    p = re.compile(usr_input)
-                    m = p.match(test_input)
-
-                    if m is None:
-                        self.canvas.create_text(self.screenwidth / 2, top, text='Reject: {}'.format(test_input),
-                                                tags='text')
-                    elif m.group() is test_input:
-                        self.canvas.create_text(self.screenwidth / 2, top, text='Accept: {}'.format(test_input),
+            try:
+                pattern = compile(usr_input)
+            except RegexError as e:
+                print(str(e))
+                pattern = None
+
+            if pattern is not None:
+                # several test strings can be given separated by spaces
+                test_strs = test_input.split()
+                for test_str, accepted in zip(test_strs, match_many(pattern, test_strs)):
+                    if accepted:
+                        self.canvas.create_text(self.screenwidth / 2, top, text='Accept: {}'.format(test_str),
                                                 tags='text')
                     else:
-                        self.canvas.create_text(self.screenwidth / 2, top, text='Reject: {}'.format(test_input),
+                        self.canvas.create_text(self.screenwidth / 2, top, text='Reject: {}'.format(test_str),
                                                 tags='text')
                     top += 20
 
@@ -93,9 +91,8 @@ class RegexApp(tk.Tk):
                     self.canvas.create_text(self.screenwidth / 2, top, text=ex_str, tags='text')
                     top += 15
 
-                tree = build_tree(self.parser.tree)
-                nfa = NFA(tree)
-                create_nfa(self, nfa)
+                # the compiled NFA has its epsilon links removed, draw the Thompson construction instead
+                create_nfa(self, NFA(parse(usr_input)))
 
     def clear(self, tag='all'):
         """
@@ -0,0 +1,145 @@
+from .compiler import compile
+from .dfa import CompactDFA
+
+# strings advanced together through the DFA table, sorted by length so the padding in each block stays small
+BLOCK_SIZE = 4096
+# a block is padded to its longest string, so strings longer than this many times the median length,
+# and at least MIN_WIDTH, are matched one by one rather than widening the block
+WIDTH_FACTOR = 4
+MIN_WIDTH = 256
+
+# NumPy is imported by the first match_many call, as importing it takes longer than importing the whole package
+np = None
+_np_loaded = False
+
+
+def load_numpy():
+    """
+    @return -- the numpy module, or None if NumPy is not installed
+    """
+    global np, _np_loaded
+    if not _np_loaded:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            pass
+        _np_loaded = True
+    return np
+
+
+def match_many(pattern, strings):
+    """
+    Check which of many strings the pattern matches in full.
+
+    @param pattern -- str, bytes or Pattern
+    @param strings -- iterable of str, or of bytes-like UTF-8 for a bytes pattern
+
+    @return -- numpy bool array if NumPy is installed, otherwise bytearray of 0/1 flags
+    """
+    if isinstance(pattern, (str, bytes)):
+        pattern = compile(pattern)
+
+    strings = list(strings)
+    is_bytes = isinstance(pattern.pattern, bytes)
+    if is_bytes:
+        if any(isinstance(s, str) for s in strings):
+            raise TypeError("a bytes pattern cannot match str")
+        strings = [bytes(s) for s in strings]
+    elif not all(isinstance(s, str) for s in strings):
+        raise TypeError("a str pattern can only match str")
+    dfa = pattern.dfa
+    np = load_numpy()
+
+    if np is None or not isinstance(dfa, CompactDFA):
+        results = bytearray(len(strings))
+        if isinstance(dfa, CompactDFA):
+            match_compact(dfa, strings, range(len(strings)), results)
+        else:
+            for i, s in enumerate(strings):
+                results[i] = dfa.fullmatch(s)
+        return np.frombuffer(results, dtype=bool).copy() if np is not None else results
+
+    results = np.zeros(len(strings), dtype=bool)
+    # every byte indexes the class map, as every ASCII char does
+    ascii_rows = [i for i, s in enumerate(strings) if is_bytes or s.isascii()]
+    other_rows = [i for i, s in enumerate(strings) if not (is_bytes or s.isascii())]
+
+    ascii_rows.sort(key=lambda i: len(strings[i]), reverse=True)
+    if ascii_rows:
+        width = max(MIN_WIDTH, WIDTH_FACTOR * len(strings[ascii_rows[len(ascii_rows) // 2]]))
+        long_rows = 0
+        while long_rows < len(ascii_rows) and len(strings[ascii_rows[long_rows]]) > width:
+            long_rows += 1
+        other_rows += ascii_rows[:long_rows]
+        del ascii_rows[:long_rows]
+
+    for start in range(0, len(ascii_rows), BLOCK_SIZE):
+        rows = ascii_rows[start:start + BLOCK_SIZE]
+        results[rows] = match_columns(dfa, [strings[i] for i in rows])
+
+    flags = bytearray(len(strings))
+    match_compact(dfa, strings, other_rows, flags)
+    results[other_rows] = np.frombuffer(flags, dtype=bool)[other_rows]
+
+    return results
+
+
+def match_compact(dfa, strings, rows, results):
+    """
+    Run the DFA over each string in turn.
+
+    @param dfa -- CompactDFA
+    @param strings -- list of str, or of bytes for a CompactDFA over bytes
+    @param rows -- iterable of indexes into strings to match
+    @param results -- bytearray, set to 1 at each matching index
+    """
+    table, classmap, char_class, n, accept = dfa.table, dfa.classmap, dfa.char_class, dfa.num_classes, dfa.accept
+
+    for i in rows:
+        state = 0
+        s = strings[i]
+        for o in s if isinstance(s, bytes) else map(ord, s):
+            state = table[state * n + (classmap[o] if o < 256 else char_class(o))]
+            if state < 0:
+                break
+        else:
+            results[i] = accept[state]
+
+
+def match_columns(dfa, strings):
+    """
+    Advance all strings through the DFA table together, one character position at a time.
+    Strings must be ASCII, or bytes, and sorted longest first.
+
+    @param dfa -- CompactDFA
+    @param strings -- list of str, or of bytes
+
+    @return -- numpy bool array
+    """
+    lengths = np.array([len(s) for s in strings], dtype=np.intp)
+    width = int(lengths[0]) if len(strings) else 0
+
+    if strings and isinstance(strings[0], bytes):
+        data = b''.join(s.ljust(width, b'\0') for s in strings)
+    else:
+        data = ''.join(s.ljust(width, '\0') for s in strings).encode('ascii')
+    chars = np.frombuffer(data, dtype=np.uint8)
+    classes = np.frombuffer(dfa.classmap, dtype=np.uint8).astype(np.intp)[chars].reshape(len(strings), width)
+    table = np.frombuffer(dfa.table, dtype=np.int32)
+    n = dfa.num_classes
+
+    states = np.zeros(len(strings), dtype=np.intp)
+    # strings longer than the current column are always a prefix of the block
+    active = len(strings)
+
+    for col in range(width):
+        while active and lengths[active - 1] <= col:
+            active -= 1
+        current = states[:active]
+        alive = current >= 0
+        moved = table[np.where(alive, current, 0) * n + classes[:active, col]]
+        states[:active] = np.where(alive, moved, -1)
+
+    accept = np.frombuffer(dfa.accept, dtype=np.uint8).astype(bool)
+    return (states >= 0) & accept[np.maximum(states, 0)]
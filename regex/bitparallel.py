@@ -0,0 +1,264 @@
+from bisect import bisect_right
+
+from .charset import charset
+from .dfa import alphabet_classes
+from .errors import StateLimitError
+from .limits import slices
+from .nfa import empty, walk_tree
+
+# patterns with more char and range labels than this use the DFAs, the follow tables grow with every 8 of them
+MAX_POSITIONS = 64
+# sets of positions whose transitions are remembered, the steps out of later ones are computed every time
+MAX_ROWS = 4096
+
+class BitParallelNFA(object):
+    """
+    Position (Glushkov) automaton of a pattern, simulated with its set of active states held in the bits of an int.
+    Bit 0 is the initial state and bit p the p-th char or range label of the pattern. Every link into a position
+    carries that position's label, so one step over c is follow(active) & masks[class of c]:
+    the follow set of the active positions is ORed together from a table per byte of the state,
+    and the mask of the alphabet class of c keeps the positions whose label holds c.
+    While it is built a fragment is a tuple (first positions, last positions, whether it matches the empty string,
+    its lowest position, the position after its highest), the positions of a sub-tree being numbered consecutively.
+    """
+
+    def __init__(self, tree):
+        """
+        @param tree -- ParseTree, raise StateLimitError if it has more than MAX_POSITIONS char and range labels
+                       once counted repetitions are expanded
+        """
+        self.labels = []
+        # position -> int, positions that may follow it
+        self.follow = [0]
+
+        fragment = walk_tree(tree, self.char, self.concat, self.create_or_branch, self.kleene_star, self.plus,
+                             self.optional, self.copy)
+        first, last, nullable = fragment[:3] if fragment is not None else (0, 0, True)
+        self.follow[0] = first
+        self.final = last | (1 if nullable else 0)
+
+        self.classmap, self.upper_starts, self.upper_classes, reps = alphabet_classes(self.labels)
+        sets = [charset(label) for label in self.labels]
+        self.masks = [sum(1 << p for p, chars in enumerate(sets, 1) if rep in chars) for rep in reps]
+        self.build_tables()
+
+    @classmethod
+    def from_tables(cls, labels, follow, final, classmap, upper_starts, upper_classes, masks):
+        """
+        Rebuild the automaton from the sets and classes of another one, e.g. ones read from a file.
+
+        @param labels -- list of str, label of each position from 1 on
+        @param follow -- list of int, positions that may follow each position
+        @param final -- int, set of final positions
+        @param classmap -- bytes-like, class of each char below 256
+        @param upper_starts -- int sequence, first code point of each class interval from 256 up, starting with 256
+        @param upper_classes -- int sequence, class of each of those intervals
+        @param masks -- list of int, positions whose label holds the chars of each class
+
+        @return -- BitParallelNFA
+        """
+        bits = cls.__new__(cls)
+        bits.labels = labels
+        bits.follow = follow
+        bits.final = final
+        bits.classmap = classmap
+        bits.upper_starts = upper_starts
+        bits.upper_classes = upper_classes
+        bits.masks = masks
+        bits.build_tables()
+        return bits
+
+    def __repr__(self):
+        output = ""
+        for p, follow in enumerate(self.follow):
+            for q in range(1, len(self.follow)):
+                if follow >> q & 1:
+                    output += "pos{} -- {} --> pos{}\n".format(p, self.labels[q - 1], q)
+        return output
+
+    def char(self, label):
+        if label == empty:
+            return 0, 0, True, len(self.follow), len(self.follow)
+        self.add_positions(1)
+        self.labels.append(label)
+        self.follow.append(0)
+        bit = 1 << len(self.labels)
+        return bit, bit, False, len(self.labels), len(self.follow)
+
+    def concat(self, frag1, frag2):
+        first1, last1, nullable1, low1, high1 = frag1
+        first2, last2, nullable2, low2, high2 = frag2
+        self.link(last1, first2)
+        return (first1 | (first2 if nullable1 else 0), last2 | (last1 if nullable2 else 0), nullable1 and nullable2,
+                min(low1, low2), max(high1, high2))
+
+    def create_or_branch(self, frag1, frag2):
+        return (frag1[0] | frag2[0], frag1[1] | frag2[1], frag1[2] or frag2[2], min(frag1[3], frag2[3]),
+                max(frag1[4], frag2[4]))
+
+    def kleene_star(self, frag):
+        first, last, _, low, high = self.plus(frag)
+        return first, last, True, low, high
+
+    def plus(self, frag):
+        self.link(frag[1], frag[0])
+        return frag
+
+    def optional(self, frag):
+        first, last, _, low, high = frag
+        return first, last, True, low, high
+
+    def copy(self, frag):
+        """
+        Copy the positions of a fragment that is not linked to any position outside it yet,
+        shifting them and their follow sets past the existing ones.
+        """
+        first, last, nullable, low, high = frag
+        shift = len(self.follow) - low
+        self.add_positions(high - low)
+
+        for p in range(low, high):
+            self.labels.append(self.labels[p - 1])
+            self.follow.append(self.follow[p] << shift)
+
+        return first << shift, last << shift, nullable, low + shift, high + shift
+
+    def build_tables(self):
+        """
+        Build the follow tables from the follow sets and start with no remembered transitions.
+        """
+        # tables[k][byte] = follow set of the positions 8k to 8k + 7 set in byte
+        self.tables = []
+        for low in range(0, len(self.follow), 8):
+            table = [0] * 256
+            for byte in range(1, 256):
+                bit = (byte & -byte).bit_length() - 1
+                table[byte] = table[byte & (byte - 1)] | (self.follow[low + bit] if low + bit < len(self.follow) else 0)
+            self.tables.append(table)
+
+        # set of positions -> row of its transitions on the chars read so far
+        self._rows = {}
+
+    def add_positions(self, n):
+        if len(self.labels) + n > MAX_POSITIONS:
+            raise StateLimitError("more than {} positions".format(MAX_POSITIONS))
+
+    def link(self, sources, targets):
+        """
+        Let every position in targets follow every position in sources.
+        """
+        while sources:
+            low = sources & -sources
+            self.follow[low.bit_length() - 1] |= targets
+            sources ^= low
+
+    def get_num_states(self):
+        return len(self.follow)
+
+    def char_class(self, o):
+        """
+        @param o -- int, code point
+
+        @return -- int, alphabet class of the char
+        """
+        if o < 256:
+            return self.classmap[o]
+        return self.upper_classes[bisect_right(self.upper_starts, o) - 1]
+
+    def new_row(self, active):
+        """
+        @param active -- int, set of active positions
+
+        @return -- dict, char -> positions active after reading it, filled in as the chars are first read
+        """
+        row = {}
+        if len(self._rows) < MAX_ROWS:
+            self._rows[active] = row
+        return row
+
+    def step(self, active, row, c):
+        """
+        Advance a set of positions over one char and remember the result in its row.
+
+        @param active -- int, set of active positions
+        @param row -- dict, row of active
+        @param c -- str
+
+        @return -- int, set of positions active after c
+        """
+        follow = 0
+        rest = active
+        for table in self.tables:
+            follow |= table[rest & 255]
+            rest >>= 8
+            if not rest:
+                break
+
+        nxt = row[c] = follow & self.masks[self.char_class(ord(c))]
+        return nxt
+
+    def match(self, s, budget=None):
+        """
+        Match the automaton against the start of s.
+
+        @param s -- str
+        @param budget -- Budget limiting the call, or None
+
+        @return -- int, length of the longest matching prefix, or None if no prefix matches
+        """
+        rows, new_row, step, final = self._rows, self.new_row, self.step, self.final
+        active = 1
+        end = 0 if final & 1 else None
+
+        for lo, hi in slices(0, len(s), budget):
+            for pos, c in enumerate(s[lo:hi], lo):
+                row = rows.get(active)
+                if row is None:
+                    row = new_row(active)
+                nxt = row.get(c)
+                active = nxt if nxt is not None else step(active, row, c)
+                if not active:
+                    break
+                if active & final:
+                    end = pos + 1
+            else:
+                continue
+            break
+
+        return end
+
+    def fullmatch(self, s, budget=None):
+        """
+        Check whether the automaton accepts the whole of s.
+
+        @param s -- str
+        @param budget -- Budget limiting the call, or None
+
+        @return -- boolean
+        """
+        rows, new_row, step = self._rows, self.new_row, self.step
+        active = 1
+
+        for lo, hi in slices(0, len(s), budget):
+            for c in s[lo:hi]:
+                row = rows.get(active)
+                if row is None:
+                    row = new_row(active)
+                nxt = row.get(c)
+                active = nxt if nxt is not None else step(active, row, c)
+                if not active:
+                    return False
+
+        return bool(active & self.final)
+
+
+def build_bit_parallel(tree):
+    """
+    @param tree -- ParseTree
+
+    @return -- BitParallelNFA, or None if the pattern has more than MAX_POSITIONS char and range labels
+    """
+    try:
+        return BitParallelNFA(tree)
+    except StateLimitError:
+        return None
@@ -0,0 +1,166 @@
+import sys
+from bisect import bisect_right
+from functools import lru_cache
+
+MAX_CHAR = sys.maxunicode
+
+
+class CharSet(object):
+    """
+    Set of chars stored as sorted, disjoint (first, last) code point intervals.
+    Membership of chars below 256 is looked up in a bitmap, other chars are found by bisecting the intervals.
+    """
+
+    __slots__ = ('starts', 'ends', 'bitmap')
+
+    def __init__(self, intervals=()):
+        """
+        @param intervals -- iterable of (first, last) code points, inclusive, in any order and possibly overlapping
+        """
+        self.starts = []
+        self.ends = []
+
+        for lo, hi in sorted(intervals):
+            if lo > hi:
+                continue
+            if self.ends and lo <= self.ends[-1] + 1:
+                self.ends[-1] = max(self.ends[-1], hi)
+            else:
+                self.starts.append(lo)
+                self.ends.append(hi)
+
+        bitmap = bytearray(256)
+        for lo, hi in zip(self.starts, self.ends):
+            if lo > 255:
+                break
+            bitmap[lo:min(hi, 255) + 1] = b'\1' * (min(hi, 255) + 1 - lo)
+        self.bitmap = bytes(bitmap)
+
+    @classmethod
+    def from_label(cls, label):
+        """
+        Parse an edge label: a single char, '.' for any char, an escaped char such as "\\.",
+        or a range string such as "[^a-z]". Inside a range '.' is the char itself and chars may be escaped.
+
+        @param label -- str
+
+        @return -- CharSet
+        """
+        if label == '.':
+            return cls([(0, MAX_CHAR)])
+
+        if len(label) == 1:
+            return cls([(ord(label), ord(label))])
+
+        if label[0] == '\\':
+            return cls([(ord(label[1]), ord(label[1]))])
+
+        body = label[1:-1]
+        negate = body.startswith('^')
+        if negate:
+            body = body[1:]
+
+        # the chars of the body with their escapes removed, and whether each one was a '-' between two chars
+        chars = []
+        dashes = []
+        i = 0
+        while i < len(body):
+            escaped = body[i] == '\\'
+            i += escaped
+            chars.append(body[i])
+            dashes.append(body[i] == '-' and not escaped)
+            i += 1
+
+        intervals = []
+        i = 0
+        while i < len(chars):
+            if i + 2 < len(chars) and dashes[i + 1]:
+                intervals.append((ord(chars[i]), ord(chars[i + 2])))
+                i += 3
+            else:
+                intervals.append((ord(chars[i]), ord(chars[i])))
+                i += 1
+
+        charset = cls(intervals)
+        return charset.negate() if negate else charset
+
+    def __contains__(self, c):
+        o = ord(c)
+        if o < 256:
+            return self.bitmap[o] == 1
+        i = bisect_right(self.starts, o) - 1
+        return i >= 0 and o <= self.ends[i]
+
+    def __iter__(self):
+        """
+        Iterates thru the intervals: ( first code point, last code point )
+        """
+        return zip(self.starts, self.ends)
+
+    def __eq__(self, other):
+        return isinstance(other, CharSet) and self.starts == other.starts and self.ends == other.ends
+
+    def __hash__(self):
+        return hash((tuple(self.starts), tuple(self.ends)))
+
+    def __repr__(self):
+        return "CharSet({!r})".format(list(self))
+
+    def negate(self):
+        """
+        @return -- CharSet of every char not in this set
+        """
+        intervals = []
+        lo = 0
+        for start, end in self:
+            intervals.append((lo, start - 1))
+            lo = end + 1
+        intervals.append((lo, MAX_CHAR))
+        return CharSet(intervals)
+
+
+@lru_cache(maxsize=1024)
+def charset(label):
+    """
+    @param label -- str, edge label
+
+    @return -- CharSet, shared between all edges with the same label
+    """
+    return CharSet.from_label(label)
+
+
+def partition(charsets):
+    """
+    Split the code points into classes that none of the sets can tell apart.
+    The boundaries of all the intervals are swept in order, keeping a bit per set for the sets the sweep is inside,
+    so this takes time in the number of intervals rather than in the size of the alphabet.
+
+    @param charsets -- iterable of CharSet
+
+    @return -- tuple (list of interval start code points from 0 up, class of each interval,
+                      first code point of each class)
+    """
+    events = {0: 0}
+    for bit, cs in enumerate(charsets):
+        for lo, hi in cs:
+            events[lo] = events.get(lo, 0) ^ (1 << bit)
+            if hi < MAX_CHAR:
+                events[hi + 1] = events.get(hi + 1, 0) ^ (1 << bit)
+
+    starts = []
+    classes = []
+    reps = []
+    index = {}
+    inside = 0
+
+    for point in sorted(events):
+        inside ^= events[point]
+        if inside not in index:
+            index[inside] = len(reps)
+            reps.append(point)
+        if classes and classes[-1] == index[inside]:
+            continue
+        starts.append(point)
+        classes.append(index[inside])
+
+    return starts, classes, reps
@@ -0,0 +1,412 @@
+from array import array
+
+from . import instrument
+from .errors import NFALimitError
+from .limits import CHECK_INTERVAL
+
+from .nfa import empty, epsilon, epsilon_closure, label_matcher, walk_tree
+
+
+class CompactNFA(object):
+    """
+    NFA stored as integer arrays instead of State objects.
+    The links out of state n are entries offsets[n] to offsets[n + 1] of targets and labels,
+    where a label is an index into label_names or -1 for epsilon. State 0 is the initial state.
+    """
+
+    __slots__ = ('offsets', 'targets', 'labels', 'label_names', 'accept',
+                 '_matchers', '_eps_links', '_closures', '_accepts')
+
+    def __init__(self, offsets, targets, labels, label_names, accept):
+        """
+        @param offsets -- array('i'), num_states + 1 offsets into targets and labels
+        @param targets -- array('i'), linked state of each link
+        @param labels -- array('i'), label index of each link, -1 for epsilon
+        @param label_names -- list of str
+        @param accept -- bytearray, accept flag of each state
+        """
+        self.offsets = offsets
+        self.targets = targets
+        self.labels = labels
+        self.label_names = label_names
+        self.accept = accept
+        self.prepare()
+
+    @classmethod
+    def from_links(cls, num_states, links, accepts):
+        """
+        @param num_states -- int
+        @param links -- iterable of (state number, linked state number, char linking states)
+        @param accepts -- iterable of accept state numbers
+
+        @return -- CompactNFA
+        """
+        return cls(*link_arrays(num_states, links, accepts))
+
+    @classmethod
+    def from_nfa(cls, nfa):
+        """
+        @param nfa -- NFA
+
+        @return -- CompactNFA
+        """
+        return cls.from_links(nfa.get_num_states(), nfa.links(), nfa.get_accepts())
+
+    def prepare(self):
+        """
+        Precompute the label predicates, the epsilon links and the accept states.
+        Epsilon closures are computed the first time a state needs one, as computing all of them up front
+        is quadratic for long chains of epsilon links such as wide alternations.
+        """
+        offsets, targets, labels = self.offsets, self.targets, self.labels
+        num_states = self.get_num_states()
+        empty_label = self.label_names.index(empty) if empty in self.label_names else -1
+
+        self._eps_links = [[targets[e] for e in range(offsets[n], offsets[n + 1]) if labels[e] in (-1, empty_label)]
+                           for n in range(num_states)]
+        self._closures = {}
+        self._matchers = [None if name == empty else label_matcher(name) for name in self.label_names]
+        self._accepts = frozenset(n for n in range(num_states) if self.accept[n])
+
+    def closure(self, n):
+        """
+        @param n -- int, state number
+
+        @return -- tuple of the state numbers reachable from n using only epsilon links
+        """
+        closure = self._closures.get(n)
+        if closure is None:
+            closure = self._closures[n] = epsilon_closure(self._eps_links, n)
+        return closure
+
+    def links(self):
+        """
+        @return -- generator of (state number, linked state number, char linking states)
+        """
+        names = self.label_names
+        for n in range(self.get_num_states()):
+            for e in range(self.offsets[n], self.offsets[n + 1]):
+                label = self.labels[e]
+                yield n, self.targets[e], names[label] if label >= 0 else epsilon
+
+    def unanchored(self):
+        """
+        Copy the NFA with its initial state also looping on every char,
+        so it accepts any string with a match ending at its last char.
+
+        @return -- CompactNFA
+        """
+        links = list(self.links())
+        if self.get_num_states():
+            links.append((0, 0, '.'))
+        return type(self).from_links(self.get_num_states(), links, self.get_accepts())
+
+    def reverse(self):
+        """
+        Build the NFA matching the reversed strings, with a new initial state linked to the old accept states.
+
+        @return -- CompactNFA
+        """
+        if not self.get_num_states():
+            return self
+
+        links = [(b + 1, a + 1, c) for a, b, c in self.links()]
+        links += [(0, n + 1, epsilon) for n in sorted(self.get_accepts())]
+        return type(self).from_links(self.get_num_states() + 1, links, [1])
+
+    def get_labels(self):
+        """
+        @return -- dict, non-epsilon edge label -> predicate on a single char
+        """
+        return {name: m for name, m in zip(self.label_names, self._matchers) if m is not None}
+
+    def get_accepts(self):
+        return self._accepts
+
+    def get_num_states(self):
+        return len(self.offsets) - 1
+
+    def get_num_links(self):
+        return len(self.targets)
+
+    def start_set(self):
+        """
+        @return -- frozenset, states reachable from the initial state without consuming input
+        """
+        if not self.get_num_states():
+            return frozenset()
+        return frozenset(self.closure(0))
+
+    def step(self, current, c):
+        """
+        Advance a set of states over one input character.
+
+        @param current -- set of state numbers
+        @param c -- str, single character
+
+        @return -- frozenset
+        """
+        offsets, targets, labels, matchers = self.offsets, self.targets, self.labels, self._matchers
+        closures = self._closures
+        nxt = set()
+
+        for n in current:
+            for e in range(offsets[n], offsets[n + 1]):
+                label = labels[e]
+                if label >= 0 and matchers[label] is not None and matchers[label](c):
+                    t = targets[e]
+                    closure = closures.get(t)
+                    nxt.update(closure if closure is not None else self.closure(t))
+
+        return frozenset(nxt)
+
+    def is_accepting(self, current):
+        """
+        @param current -- set of state numbers
+
+        @return -- boolean
+        """
+        return not self._accepts.isdisjoint(current)
+
+    def match(self, s):
+        """
+        @param s -- str
+
+        @return -- int, length of the longest matching prefix, or None if no prefix matches
+        """
+        current = self.start_set()
+        end = 0 if self.is_accepting(current) else None
+
+        for pos, c in enumerate(s):
+            if not current:
+                break
+            current = self.step(current, c)
+            if self.is_accepting(current):
+                end = pos + 1
+
+        return end
+
+    def fullmatch(self, s):
+        """
+        @param s -- str
+
+        @return -- boolean
+        """
+        current = self.start_set()
+
+        for c in s:
+            if not current:
+                return False
+            current = self.step(current, c)
+
+        return self.is_accepting(current)
+
+
+def link_arrays(num_states, links, accepts):
+    """
+    @param num_states -- int
+    @param links -- iterable of (state number, linked state number, char linking states)
+    @param accepts -- iterable of accept state numbers
+
+    @return -- tuple (offsets, targets, labels, label_names, accept), the arguments of CompactNFA
+    """
+    links = list(links)
+    label_names = []
+    label_index = {}
+
+    # counting sort of the links by state
+    offsets = array('i', [0]) * (num_states + 1)
+    for a, b, c in links:
+        offsets[a + 1] += 1
+    for n in range(num_states):
+        offsets[n + 1] += offsets[n]
+
+    targets = array('i', [0]) * len(links)
+    labels = array('i', [0]) * len(links)
+    fill = offsets[:-1]
+
+    for a, b, c in links:
+        if c == epsilon:
+            index = -1
+        else:
+            if c not in label_index:
+                label_index[c] = len(label_names)
+                label_names.append(c)
+            index = label_index[c]
+
+        targets[fill[a]] = b
+        labels[fill[a]] = index
+        fill[a] += 1
+
+    accept = bytearray(num_states)
+    for n in accepts:
+        accept[n] = 1
+
+    return offsets, targets, labels, label_names, accept
+
+
+class NFABuilder(object):
+    """
+    Builds the same automaton as build_nfa straight into integer form, in time linear in the size of the tree.
+    A fragment is a (start, accept) pair of state ids. Instead of the State lists joined with +,
+    the states of a fragment are chained through next_state in build_nfa's list order, so joining fragments
+    only relinks their ends, and concat moves the at most two links out of the second start state.
+    """
+
+    def __init__(self, max_states=None, budget=None):
+        """
+        @param max_states -- int, raise NFALimitError if more states are created
+        @param budget -- Budget charged for the states created, or None
+        """
+        # state id -> list of (linked state id, char), None once the state has been merged away
+        self.out_links = []
+        # state id -> following state id in list order, -1 at the end
+        self.next_state = []
+        self.max_states = max_states
+        self.budget = budget
+
+    def new_state(self):
+        n = len(self.out_links)
+        if self.max_states is not None and n >= self.max_states:
+            raise NFALimitError("NFA needs more than {} states".format(self.max_states))
+        # charged a run of states at a time, which covers the states copy() creates for counted repetition
+        if self.budget is not None and n and not n % CHECK_INTERVAL:
+            self.budget.charge(CHECK_INTERVAL)
+        self.out_links.append([])
+        self.next_state.append(-1)
+        return len(self.out_links) - 1
+
+    def build(self, tree):
+        """
+        @param tree -- ParseTree
+
+        @return -- CompactNFA
+        """
+        fragment = self.build_fragment(tree)
+        if not isinstance(fragment, tuple):
+            return CompactNFA.from_links(0, [], [])
+
+        number = self.number_states(fragment, {})
+        links = [(number[n], number[s], c) for n in number for s, c in self.out_links[n]]
+        accepts = [number[n] for n in number if not self.out_links[n]]
+
+        return CompactNFA.from_links(len(number), links, accepts)
+
+    def number_states(self, fragment, number):
+        """
+        Number the states of a fragment in list order, as NFA.assign_states does, after those already numbered.
+
+        @param fragment -- (start, accept) tuple
+        @param number -- dict, state id -> state number, extended in place
+
+        @return -- dict, number
+        """
+        n = fragment[0]
+        while n >= 0:
+            number[n] = len(number)
+            n = self.next_state[n]
+        return number
+
+    def build_fragment(self, tree):
+        """
+        @param tree -- ParseTree
+
+        @return -- (start, accept) tuple, or None for an empty tree
+        """
+        return walk_tree(tree, self.char, self.concat, self.create_or_branch, self.kleene_star, self.plus,
+                         self.optional, self.copy)
+
+    def char(self, c):
+        init_state = self.new_state()
+        final_state = self.new_state()
+        self.out_links[init_state].append((final_state, c))
+        self.next_state[init_state] = final_state
+        return init_state, final_state
+
+    def concat(self, frag1, frag2):
+        start1, accept1 = frag1
+        start2, accept2 = frag2
+
+        # accept1 takes over the links of start2, which drops out of the list
+        self.out_links[accept1].extend(self.out_links[start2])
+        self.out_links[start2] = None
+        self.next_state[accept1] = self.next_state[start2]
+
+        return start1, accept2
+
+    def create_or_branch(self, frag1, frag2):
+        new_init_state = self.new_state()
+        new_final_state = self.new_state()
+
+        self.out_links[new_init_state] += [(frag1[0], epsilon), (frag2[0], epsilon)]
+        self.out_links[frag1[1]].append((new_final_state, epsilon))
+        self.out_links[frag2[1]].append((new_final_state, epsilon))
+
+        self.next_state[new_init_state] = frag1[0]
+        self.next_state[frag1[1]] = frag2[0]
+        self.next_state[frag2[1]] = new_final_state
+
+        return new_init_state, new_final_state
+
+    def kleene_star(self, frag):
+        new_init_state, new_final_state = self.wrap(frag)
+        self.out_links[new_init_state].append((new_final_state, epsilon))
+        return new_init_state, new_final_state
+
+    def plus(self, frag):
+        return self.wrap(frag)
+
+    def optional(self, frag):
+        start, accept = frag
+        self.out_links[start].append((accept, epsilon))
+        return frag
+
+    def copy(self, frag):
+        """
+        Copy a fragment that is not linked to any state outside it yet, walking its states in list order.
+        """
+        start, accept = frag
+        states = [start]
+        while states[-1] != accept:
+            states.append(self.next_state[states[-1]])
+
+        copies = {n: self.new_state() for n in states}
+        for n in states:
+            self.out_links[copies[n]] = [(copies[s], c) for s, c in self.out_links[n]]
+            if n != accept:
+                self.next_state[copies[n]] = copies[self.next_state[n]]
+
+        return copies[start], copies[accept]
+
+    def wrap(self, frag):
+        """
+        Add the new init and final states shared by kleene_star and plus, with the loop back to the start.
+        """
+        start, accept = frag
+        new_final_state = self.new_state()
+        new_init_state = self.new_state()
+
+        self.out_links[new_init_state].append((start, epsilon))
+        self.out_links[accept] += [(start, epsilon), (new_final_state, epsilon)]
+
+        self.next_state[new_init_state] = start
+        self.next_state[accept] = new_final_state
+
+        return new_init_state, new_final_state
+
+
+def build_compact_nfa(tree, max_states=None, budget=None):
+    """
+    Build a CompactNFA from a ParseTree in linear time.
+
+    @param tree -- ParseTree
+    @param max_states -- int, raise NFALimitError if more states are needed
+    @param budget -- Budget charged for the states created, or None
+
+    @return -- CompactNFA
+    """
+    with instrument.stage('nfa'):
+        nfa = NFABuilder(max_states, budget).build(tree)
+        instrument.count(states=nfa.get_num_states(), edges=nfa.get_num_links())
+
+    return nfa
@@ -0,0 +1,553 @@
+import os
+import time
+from collections import OrderedDict, namedtuple
+from threading import Lock, local
+
+from . import instrument
+from .bitparallel import build_bit_parallel
+from .compact_nfa import build_compact_nfa
+from .dfa import DFA, CompactDFA
+from .errors import DFALimitError, NFALimitError, RegexError, StateLimitError
+from .literals import prefilters
+from .nfa import check_repeat_size
+from .optimize import simplify
+from .parse_tree import build_tree
+from .rd_parser import RDParser
+from .search import Searcher
+from .serialize import DiskCache
+from .utf8 import to_byte_nfa
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+# patterns whose minimal DFA would be larger than this are simulated bit-parallel or keep a lazily built DFA instead
+MAX_COMPACT_STATES = 10000
+# state table size of the lazily built DFAs, which simulate the NFA once it is full
+MAX_LAZY_STATES = 1000
+
+
+class Pattern(object):
+    """
+    A compiled regular expression: the NFA built from the pattern, simplified and in compact form,
+    and the DFA used to match with it.
+    A bytes pattern matches bytes, bytearray or memoryview inputs holding UTF-8 encoded text, with its automata
+    reading the bytes directly, and spans are byte offsets.
+    """
+
+    def __init__(self, pattern, nfa, dfa=None, prefix=None, required=None, limits=None):
+        """
+        @param pattern -- str, or bytes for a pattern matching UTF-8 encoded bytes, the source pattern
+        @param nfa -- CompactNFA, or ByteNFA for a bytes pattern, without epsilon links when built by compile()
+        @param dfa -- DFA, CompactDFA or BitParallelNFA, built from the NFA if not given
+        @param prefix -- Prefilter for the literals every match starts with, or None
+        @param required -- Prefilter for the literals every match contains, or None
+        @param limits -- Limits for the DFAs built for the pattern and for the calls not given their own, or None
+        """
+        self.pattern = pattern
+        self.nfa = nfa
+        self.dfa = dfa
+        self.prefix = prefix
+        self.required = required
+        self.limits = limits
+        self._searcher = None
+        self._line_scanner = None
+
+        if self.dfa is None:
+            self.dfa = build_dfa(nfa, limits)
+
+    def __repr__(self):
+        return "Pattern({!r})".format(self.pattern)
+
+    def match(self, s, limits=None):
+        """
+        @param s -- str
+        @param limits -- Limits for the call, defaults to the pattern's
+
+        @return -- int, length of the longest prefix of s that matches, or None if no prefix matches
+        """
+        budget = self._budget(limits)
+        if instrument.enabled:
+            return self._measure('match', [self.dfa], self.dfa.match, s, budget)
+        return self.dfa.match(s, budget)
+
+    def fullmatch(self, s, limits=None):
+        """
+        @param s -- str
+        @param limits -- Limits for the call, defaults to the pattern's
+
+        @return -- boolean, whether the whole of s matches
+        """
+        budget = self._budget(limits)
+        if instrument.enabled:
+            return self._measure('fullmatch', [self.dfa], self.dfa.fullmatch, s, budget)
+        return self.dfa.fullmatch(s, budget)
+
+    @property
+    def searcher(self):
+        """
+        Searcher for the pattern, built the first time a search needs it.
+
+        @return -- Searcher
+        """
+        if self._searcher is None:
+            limits = self.limits
+            with instrument.stage('searcher', self.pattern):
+                budget = self._budget(None)
+                reverse = build_dfa(simplify(self.nfa.reverse(), budget), limits, budget)
+            self._searcher = Searcher(self.nfa, reverse, self.prefix, self.required, lazy_states(limits))
+        return self._searcher
+
+    @property
+    def line_scanner(self):
+        """
+        LineScanner for the pattern, built the first time a stream or file search needs it.
+
+        @return -- LineScanner
+        """
+        if self._line_scanner is None:
+            # stream imports this module
+            from .stream import LineScanner
+            self._line_scanner = LineScanner.from_pattern(self)
+        return self._line_scanner
+
+    def search(self, s, pos=0, endpos=None, limits=None):
+        """
+        @param s -- str
+        @param pos -- int, where to start looking
+        @param endpos -- int, where to stop looking, defaults to len(s)
+        @param limits -- Limits for the call, defaults to the pattern's
+
+        @return -- tuple (start, end) of the leftmost-longest match in s[pos:endpos], or None if there is none
+        """
+        budget = self._budget(limits)
+        if instrument.enabled:
+            searcher = self.searcher
+            return self._measure('search', [searcher.forward, searcher.reverse], searcher.search, s, pos, endpos,
+                                 budget)
+        return self.searcher.search(s, pos, endpos, budget)
+
+    def finditer(self, s, pos=0, endpos=None, limits=None):
+        """
+        @param s -- str
+        @param pos -- int, where to start looking
+        @param endpos -- int, where to stop looking, defaults to len(s)
+        @param limits -- Limits for the whole iteration, defaults to the pattern's
+
+        @return -- generator of (start, end) spans of the non overlapping leftmost-longest matches
+        """
+        budget = self._budget(limits)
+        if instrument.enabled:
+            return self._measure_finditer(s, pos, endpos, budget)
+        return self.searcher.finditer(s, pos, endpos, budget)
+
+    def findall(self, s, pos=0, endpos=None, limits=None):
+        """
+        @param s -- str
+        @param pos -- int, where to start looking
+        @param endpos -- int, where to stop looking, defaults to len(s)
+        @param limits -- Limits for the call, defaults to the pattern's
+
+        @return -- list of slices of s, the non overlapping leftmost-longest matches
+        """
+        return [s[start:end] for start, end in self.finditer(s, pos, endpos, limits)]
+
+    def _budget(self, limits):
+        """
+        @param limits -- Limits given to a call, or None for the pattern's
+
+        @return -- Budget for the call, or None if it is not limited
+        """
+        if limits is None:
+            limits = self.limits
+        return limits.budget() if limits is not None else None
+
+    def _measure(self, name, dfas, f, s, *args):
+        """
+        Run f(s, *args) as an instrumented stage, counting the chars the lazily built DFAs among dfas read
+        and how many of them needed a transition the DFAs did not have yet.
+
+        @return -- what f returns
+        """
+        lookups, misses = lazy_counts(dfas)
+        with instrument.stage(name, self.pattern):
+            result = f(s, *args)
+            after = lazy_counts(dfas)
+            instrument.count(chars=len(s), dfa_lookups=after[0] - lookups, dfa_misses=after[1] - misses)
+        return result
+
+    def _measure_finditer(self, s, pos, endpos, budget):
+        """
+        finditer recording one 'finditer' event once the matches run out or the generator is closed,
+        timing only the search for each match and not the caller's work in between.
+        """
+        searcher = self.searcher
+        dfas = [searcher.forward, searcher.reverse]
+        lookups, misses = lazy_counts(dfas)
+        spans = searcher.finditer(s, pos, endpos, budget)
+        seconds = 0.0
+        matches = 0
+
+        try:
+            while True:
+                start = time.perf_counter()
+                span = next(spans, None)
+                seconds += time.perf_counter() - start
+                if span is None:
+                    return
+                matches += 1
+                yield span
+        finally:
+            after = lazy_counts(dfas)
+            instrument.emit({'stage': 'finditer', 'pattern': self.pattern, 'seconds': seconds, 'chars': len(s),
+                             'matches': matches, 'dfa_lookups': after[0] - lookups, 'dfa_misses': after[1] - misses})
+
+
+def lazy_counts(dfas):
+    """
+    @param dfas -- list of DFA or CompactDFA
+
+    @return -- tuple (chars read, chars whose transition was missing) summed over the lazily built DFAs,
+               a CompactDFA has every transition and counts nothing
+    """
+    lazy = [dfa for dfa in dfas if isinstance(dfa, DFA)]
+    return sum(dfa.lookups for dfa in lazy), sum(dfa.misses for dfa in lazy)
+
+
+def build_dfa(nfa, limits=None, budget=None, tree=None):
+    """
+    @param nfa -- CompactNFA
+    @param limits -- Limits, a max_dfa_states up to MAX_COMPACT_STATES makes a larger DFA an error, or None
+    @param budget -- Budget charged while the DFA is built, or None
+    @param tree -- ParseTree the NFA was built from, or None
+
+    @return -- CompactDFA if the minimal DFA has at most MAX_COMPACT_STATES states, otherwise a BitParallelNFA
+               for a tree with at most MAX_POSITIONS char and range labels or a lazily built DFA
+    """
+    max_states = MAX_COMPACT_STATES
+    strict = limits is not None and limits.max_dfa_states is not None and limits.max_dfa_states <= max_states
+    if strict:
+        max_states = limits.max_dfa_states
+
+    with instrument.stage('dfa'):
+        try:
+            dfa = CompactDFA(nfa, max_states, budget)
+        except StateLimitError as e:
+            bits = build_bit_parallel(tree) if tree is not None else None
+            # a BitParallelNFA has no DFA states to limit
+            if strict and isinstance(e, DFALimitError) and bits is None:
+                raise
+            if bits is not None:
+                dfa = bits
+                instrument.count(bit_parallel=1)
+            else:
+                dfa = DFA(nfa, lazy_states(limits))
+                instrument.count(lazy=1)
+        instrument.count(states=dfa.get_num_states())
+
+    return dfa
+
+
+def lazy_states(limits):
+    """
+    @param limits -- Limits or None
+
+    @return -- int, state table size of the lazily built DFAs of a pattern
+    """
+    if limits is None or limits.max_dfa_states is None:
+        return MAX_LAZY_STATES
+    return min(MAX_LAZY_STATES, limits.max_dfa_states)
+
+
+class PatternCache(object):
+    """
+    Bounded cache of compiled patterns keyed by the pattern string, evicting the least recently used.
+    """
+
+    def __init__(self, maxsize=128):
+        """
+        @param maxsize -- int, number of patterns kept
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._patterns = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def get(self, pattern):
+        """
+        @param pattern -- str
+
+        @return -- Pattern or None if the pattern is not cached
+        """
+        with self._lock:
+            compiled = self._patterns.get(pattern)
+            if compiled is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._patterns.move_to_end(pattern)
+            return compiled
+
+    def peek(self, pattern):
+        """
+        Look a pattern up without counting a hit or a miss or refreshing its place.
+
+        @param pattern -- str
+
+        @return -- Pattern or None if the pattern is not cached
+        """
+        with self._lock:
+            return self._patterns.get(pattern)
+
+    def put(self, pattern, compiled):
+        """
+        @param pattern -- str
+        @param compiled -- Pattern
+        """
+        with self._lock:
+            self._patterns[pattern] = compiled
+            self._patterns.move_to_end(pattern)
+            self._evict()
+
+    def resize(self, maxsize):
+        """
+        @param maxsize -- int, new number of patterns kept
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._patterns.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        """
+        @return -- CacheInfo
+        """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._patterns))
+
+    def _evict(self):
+        while len(self._patterns) > self.maxsize:
+            self._patterns.popitem(last=False)
+            self.evictions += 1
+
+
+_cache = PatternCache()
+_disk_cache = None
+# one parser per thread and backend, the grammar tables behind them are shared
+_parsers = local()
+# 'ply' parses with the Regex grammar in regex_parser, 'rd' with RDParser which does not need PLY
+_parser_backend = os.environ.get('REGEX_PARSER', 'ply')
+
+
+def parse(pattern):
+    """
+    Parse a pattern into a ParseTree.
+
+    @param pattern -- str
+
+    @return -- ParseTree, raise ParseError if the pattern is invalid
+               and RegexError if its counted repetitions expand it too much
+    """
+    parser = getattr(_parsers, _parser_backend, None)
+    if parser is None:
+        if _parser_backend == 'rd':
+            parser = RDParser()
+        else:
+            # only import PLY when it is actually used
+            from .regex_parser import Regex
+            parser = Regex()
+        setattr(_parsers, _parser_backend, parser)
+
+    tree = build_tree(parser.run(pattern))
+    if '{' in pattern:
+        check_repeat_size(tree)
+    return tree
+
+
+def set_parser(backend):
+    """
+    Choose the parser used by compile().
+    Changing it empties the compile() cache, as purge() does, so no pattern parsed by the other backend is reused.
+
+    @param backend -- str, 'ply' or 'rd'
+    """
+    global _parser_backend
+    if backend not in ('ply', 'rd'):
+        raise ValueError("unknown parser backend: {!r}".format(backend))
+    if backend != _parser_backend:
+        _cache.clear()
+    _parser_backend = backend
+
+
+def compile(pattern, limits=None):
+    """
+    Compile a pattern, reusing the cached Pattern if it was compiled recently
+    or loading it from the cache directory if one is set.
+    A pattern compiled with limits is always compiled afresh under them and is not cached.
+    Bytes patterns are cached too, the cache directory keeps them in files of their own.
+
+    @param pattern -- str, or bytes to match UTF-8 encoded bytes
+    @param limits -- Limits for compiling the pattern and, unless they are given their own, for its calls
+
+    @return -- Pattern
+    """
+    if limits is not None:
+        with instrument.stage('compile', pattern):
+            return build_pattern(pattern, limits)
+
+    compiled = _cache.get(pattern)
+
+    if compiled is None:
+        with instrument.stage('compile', pattern):
+            loaded = _disk_cache.load(pattern) if _disk_cache is not None else None
+
+            if loaded is not None:
+                compiled = restore(loaded)
+                instrument.count(loaded=1)
+            else:
+                compiled = build_pattern(pattern)
+                if _disk_cache is not None:
+                    try:
+                        _disk_cache.store(compiled)
+                    except OSError:
+                        # a read-only or full cache directory only costs the next process a recompile
+                        pass
+
+        _cache.put(pattern, compiled)
+
+    return compiled
+
+
+def build_pattern(pattern, limits=None):
+    """
+    Compile a pattern without the caches.
+
+    @param pattern -- str, or bytes to match UTF-8 encoded bytes
+    @param limits -- Limits or None
+
+    @return -- Pattern
+    """
+    budget = limits.budget() if limits is not None else None
+    max_nfa_states = limits.max_nfa_states if limits is not None else None
+    text = pattern
+    if isinstance(pattern, bytes):
+        try:
+            text = pattern.decode('utf-8')
+        except UnicodeDecodeError:
+            raise RegexError("pattern is not valid UTF-8: {!r}".format(pattern))
+    tree = parse(text)
+    if budget is not None:
+        budget.charge()
+
+    nfa = simplify(build_compact_nfa(tree, max_nfa_states, budget), budget)
+
+    prefix, required = prefilters(tree)
+    if budget is not None:
+        budget.charge()
+    if isinstance(pattern, str):
+        return Pattern(pattern, nfa, build_dfa(nfa, limits, budget, tree), prefix, required, limits)
+
+    # the bit-parallel matcher reads chars, so the DFAs of the byte automaton are built without the tree
+    nfa = simplify(to_byte_nfa(nfa), budget)
+    if max_nfa_states is not None and nfa.get_num_states() > max_nfa_states:
+        raise NFALimitError("UTF-8 NFA needs more than {} states".format(max_nfa_states))
+
+    prefix, required = (p.encode() if p is not None else None for p in (prefix, required))
+    return Pattern(pattern, nfa, build_dfa(nfa, limits, budget), prefix, required, limits)
+
+
+def restore(loaded):
+    """
+    @param loaded -- tuple as returned by serialize.loads
+
+    @return -- Pattern
+    """
+    pattern, nfa, dfa, prefix, required = loaded
+    return Pattern(pattern, nfa, dfa, prefix, required)
+
+
+def cache(compiled):
+    """
+    Put a Pattern compiled elsewhere, e.g. loaded from a worker process, in the compile() cache.
+
+    @param compiled -- Pattern
+    """
+    _cache.put(compiled.pattern, compiled)
+
+
+def cached(pattern):
+    """
+    @param pattern -- str
+
+    @return -- Pattern if compile() would return it without compiling, otherwise None
+    """
+    return _cache.peek(pattern)
+
+
+def search(pattern, s):
+    """
+    @param pattern -- str
+    @param s -- str
+
+    @return -- tuple (start, end) of the leftmost-longest match in s, or None if there is none
+    """
+    return compile(pattern).search(s)
+
+
+def finditer(pattern, s):
+    """
+    @param pattern -- str
+    @param s -- str
+
+    @return -- generator of (start, end) spans of the non overlapping leftmost-longest matches in s
+    """
+    return compile(pattern).finditer(s)
+
+
+def findall(pattern, s):
+    """
+    @param pattern -- str
+    @param s -- str
+
+    @return -- list of str, the non overlapping leftmost-longest matches in s
+    """
+    return compile(pattern).findall(s)
+
+
+def set_cache_dir(directory):
+    """
+    Keep compiled patterns on disk so other processes can load them instead of compiling.
+
+    @param directory -- str, or None to stop using the disk cache
+    """
+    global _disk_cache
+    _disk_cache = DiskCache(directory) if directory is not None else None
+
+
+def set_cache_size(maxsize):
+    """
+    @param maxsize -- int, number of compiled patterns kept by compile()
+    """
+    _cache.resize(maxsize)
+
+
+def cache_info():
+    """
+    @return -- CacheInfo, hit/miss/eviction counters and size of the compile() cache
+    """
+    return _cache.info()
+
+
+def purge():
+    """
+    Empty the compile() cache and reset its counters.
+    """
+    _cache.clear()
@@ -0,0 +1,531 @@
+from array import array
+from bisect import bisect_right
+from threading import Lock
+
+from .charset import charset, partition
+from .errors import DFALimitError, StateLimitError
+from .limits import slices
+
+
+class DFA(object):
+    """
+    Deterministic Finite Automaton built from an NFA by subset construction.
+    States are only materialised when an input character first needs them,
+    so the table holds the part of the automaton the input actually visits.
+    """
+
+    def __init__(self, nfa, max_states=1000):
+        """
+        Initialise the DFA with only its initial state.
+
+        @param nfa -- NFA
+        @param max_states -- int, size of the state table before falling back to NFA simulation
+        """
+        self._nfa = nfa
+        self.max_states = max_states
+
+        # DFA state number -> frozenset of NFA state numbers, and the reverse
+        self._sets = []
+        self._index = {}
+        # DFA state number -> {char: DFA state number}
+        self._trans = []
+        self._accept = []
+
+        self.fallbacks = 0
+        # chars read, and chars whose transition was not in the table yet
+        self.lookups = 0
+        self.misses = 0
+        # the table only grows under the lock, so threads can match with the same DFA
+        self._lock = Lock()
+
+        self._start = self._add_state(nfa.start_set())
+        self._dead = self._add_state(frozenset())
+
+    def __repr__(self):
+        output = ""
+        for n, links in enumerate(self._trans):
+            for c, s in links.items():
+                output += "state{} -- {} --> state{}\n".format(n, c, s)
+        return output
+
+    def _add_state(self, nfa_states):
+        """
+        Add a DFA state for a set of NFA states.
+
+        @param nfa_states -- frozenset
+
+        @return -- int, new state number or None if the table is full
+        """
+        if len(self._sets) >= self.max_states:
+            return None
+
+        n = len(self._sets)
+        self._sets.append(nfa_states)
+        self._index[nfa_states] = n
+        self._trans.append({})
+        self._accept.append(self._nfa.is_accepting(nfa_states))
+
+        return n
+
+    def _add_transition(self, state, c):
+        """
+        Compute the transition out of state on c and store it in the table.
+
+        @param state -- int
+        @param c -- str
+
+        @return -- int, target state number or None if the table is full
+        """
+        with self._lock:
+            nfa_states = self._nfa.step(self._sets[state], c)
+
+            target = self._index.get(nfa_states)
+            if target is None:
+                target = self._add_state(nfa_states)
+                if target is None:
+                    return None
+
+            self._trans[state][c] = target
+            self.misses += 1
+            return target
+
+    def _simulate(self, state, s, pos, end=None, budget=None):
+        """
+        Continue a run on the NFA once the DFA table has filled up.
+
+        @param state -- int, DFA state reached before s[pos]
+        @param s -- str
+        @param pos -- int
+        @param end -- int, end of the longest match found so far
+        @param budget -- Budget charged for every NFA state advanced, or None
+
+        @return -- tuple (frozenset of NFA states after consuming s[pos:], end of the longest match)
+        """
+        self.fallbacks += 1
+        nfa = self._nfa
+        current = self._sets[state]
+
+        i = pos
+        for i in range(pos, len(s)):
+            if budget is not None:
+                budget.charge(len(current))
+            current = nfa.step(current, s[i])
+            if not current:
+                break
+            if nfa.is_accepting(current):
+                end = i + 1
+
+        self.lookups += i + 1 - pos
+        self.misses += i + 1 - pos
+        return current, end
+
+    def get_num_states(self):
+        return len(self._sets)
+
+    def match(self, s, budget=None):
+        """
+        Match the DFA against the start of s.
+
+        @param s -- str, or bytes-like for a DFA built from a ByteNFA
+        @param budget -- Budget limiting the call, or None
+
+        @return -- int, length of the longest matching prefix, or None if no prefix matches
+        """
+        trans = self._trans
+        accept = self._accept
+        state = self._start
+        end = 0 if accept[state] else None
+
+        chars = as_chunks(s)
+        pos = -1
+        for lo, hi in slices(0, len(s), budget):
+            for pos, c in enumerate(chars[lo:hi], lo):
+                nxt = trans[state].get(c)
+                if nxt is None:
+                    nxt = self._add_transition(state, c)
+                    if nxt is None:
+                        self.lookups += pos
+                        return self._simulate(state, s, pos, end, budget)[1]
+                if nxt == self._dead:
+                    break
+                state = nxt
+                if accept[state]:
+                    end = pos + 1
+            else:
+                continue
+            break
+
+        self.lookups += pos + 1
+        return end
+
+    def fullmatch(self, s, budget=None):
+        """
+        Check whether the DFA accepts the whole of s.
+
+        @param s -- str, or bytes-like for a DFA built from a ByteNFA
+        @param budget -- Budget limiting the call, or None
+
+        @return -- boolean
+        """
+        trans = self._trans
+        state = self._start
+        chars = as_chunks(s)
+
+        for lo, hi in slices(0, len(s), budget):
+            for pos, c in enumerate(chars[lo:hi], lo):
+                nxt = trans[state].get(c)
+                if nxt is None:
+                    nxt = self._add_transition(state, c)
+                    if nxt is None:
+                        self.lookups += pos
+                        return self._nfa.is_accepting(self._simulate(state, s, pos, None, budget)[0])
+                if nxt == self._dead:
+                    self.lookups += pos + 1
+                    return False
+                state = nxt
+
+        self.lookups += len(s)
+        return self._accept[state]
+
+
+class CompactDFA(object):
+    """
+    Minimal DFA stored in flat arrays.
+    Input chars are first mapped to alphabet classes, chars in the same class behave the same on every edge,
+    and the transition for (state, class) is table[state * num_classes + class], -1 meaning no match is possible.
+    Chars below 256 are mapped through classmap, other chars by bisecting the class intervals in upper_starts.
+    State 0 is the initial state.
+    """
+
+    def __init__(self, nfa, max_states=None, budget=None):
+        """
+        Build the DFA from an NFA by subset construction over the alphabet classes, then minimise it.
+
+        @param nfa -- NFA
+        @param max_states -- int, raise DFALimitError if subset construction needs more states
+        @param budget -- Budget charged for every state built, or None
+        """
+        self.classmap, self.upper_starts, self.upper_classes, reps = alphabet_classes(nfa.get_labels())
+        self.num_classes = len(reps)
+
+        delta, accept, start = subset_construction(nfa, reps, max_states, budget)
+        block_of, num_blocks = minimize(delta, accept, self.num_classes, budget)
+
+        self.table, self.accept = compact_table(delta, accept, start, block_of, num_blocks, self.num_classes)
+
+    @classmethod
+    def from_tables(cls, classmap, upper_starts, upper_classes, num_classes, table, accept):
+        """
+        Wrap existing tables, e.g. ones mapped from a file, without copying them.
+
+        @param classmap -- bytes-like, class of each char below 256
+        @param upper_starts -- int sequence, first code point of each class interval from 256 up, starting with 256
+        @param upper_classes -- int sequence, class of each of those intervals
+        @param num_classes -- int
+        @param table -- int sequence, flat transition table
+        @param accept -- bytes-like, accept flag of each state
+
+        @return -- CompactDFA
+        """
+        dfa = cls.__new__(cls)
+        dfa.classmap = classmap
+        dfa.upper_starts = upper_starts
+        dfa.upper_classes = upper_classes
+        dfa.num_classes = num_classes
+        dfa.table = table
+        dfa.accept = accept
+        return dfa
+
+    def __repr__(self):
+        output = ""
+        n = self.num_classes
+        for i, target in enumerate(self.table):
+            if target >= 0:
+                output += "state{} -- class{} --> state{}\n".format(i // n, i % n, target)
+        return output
+
+    def get_num_states(self):
+        return len(self.accept)
+
+    def char_class(self, o):
+        """
+        @param o -- int, code point
+
+        @return -- int, alphabet class of the char
+        """
+        if o < 256:
+            return self.classmap[o]
+        return self.upper_classes[bisect_right(self.upper_starts, o) - 1]
+
+    def match(self, s, budget=None):
+        """
+        Match the DFA against the start of s.
+
+        @param s -- str, or bytes-like for a DFA built from a ByteNFA
+        @param budget -- Budget limiting the call, or None
+
+        @return -- int, length of the longest matching prefix, or None if no prefix matches
+        """
+        if not isinstance(s, str):
+            return self._match_bytes(s, budget)
+
+        table, classmap, char_class, n = self.table, self.classmap, self.char_class, self.num_classes
+        accept = self.accept
+        state = 0
+        end = 0 if accept[0] else None
+
+        for lo, hi in slices(0, len(s), budget):
+            for pos, c in enumerate(s[lo:hi], lo):
+                o = ord(c)
+                state = table[state * n + (classmap[o] if o < 256 else char_class(o))]
+                if state < 0:
+                    break
+                if accept[state]:
+                    end = pos + 1
+            else:
+                continue
+            break
+
+        return end
+
+    def fullmatch(self, s, budget=None):
+        """
+        Check whether the DFA accepts the whole of s.
+
+        @param s -- str, or bytes-like for a DFA built from a ByteNFA
+        @param budget -- Budget limiting the call, or None
+
+        @return -- boolean
+        """
+        if not isinstance(s, str):
+            return self._fullmatch_bytes(s, budget)
+
+        table, classmap, char_class, n = self.table, self.classmap, self.char_class, self.num_classes
+        state = 0
+
+        for lo, hi in slices(0, len(s), budget):
+            for c in s[lo:hi]:
+                o = ord(c)
+                state = table[state * n + (classmap[o] if o < 256 else char_class(o))]
+                if state < 0:
+                    return False
+
+        return bool(self.accept[state])
+
+    def _match_bytes(self, s, budget=None):
+        """
+        match over bytes, whose values all map through classmap.
+        """
+        table, classmap, n, accept = self.table, self.classmap, self.num_classes, self.accept
+        chars = as_chunks(s)
+        state = 0
+        end = 0 if accept[0] else None
+
+        for lo, hi in slices(0, len(s), budget):
+            for pos, b in enumerate(chars[lo:hi], lo):
+                state = table[state * n + classmap[b]]
+                if state < 0:
+                    break
+                if accept[state]:
+                    end = pos + 1
+            else:
+                continue
+            break
+
+        return end
+
+    def _fullmatch_bytes(self, s, budget=None):
+        """
+        fullmatch over bytes, whose values all map through classmap.
+        """
+        table, classmap, n = self.table, self.classmap, self.num_classes
+        chars = as_chunks(s)
+        state = 0
+
+        for lo, hi in slices(0, len(s), budget):
+            for b in chars[lo:hi]:
+                state = table[state * n + classmap[b]]
+                if state < 0:
+                    return False
+
+        return bool(self.accept[state])
+
+
+def as_chunks(s):
+    """
+    @param s -- str or bytes-like
+
+    @return -- s if it is str or bytes, which are not copied when sliced whole,
+               otherwise a memoryview of it whose slices are views, so scanning never copies the whole input
+    """
+    return s if isinstance(s, (str, bytes)) else memoryview(s)
+
+
+def alphabet_classes(labels):
+    """
+    Partition the chars into classes that no edge label can tell apart.
+
+    @param labels -- iterable of edge labels
+
+    @return -- tuple (bytes mapping ord(c) < 256 to its class,
+                      array of the first code point of each class interval from 256 up, array of their classes,
+                      representative char of each class)
+    """
+    starts, classes, reps = partition(charset(label) for label in labels)
+    if len(reps) > 256:
+        raise StateLimitError("more than 256 alphabet classes")
+
+    # the interval holding code point 256 is cut in two
+    split = bisect_right(starts, 256) - 1
+    classmap = bytearray(256)
+    for i in range(split + 1):
+        end = starts[i + 1] if i + 1 <= split else 256
+        classmap[starts[i]:end] = bytes([classes[i]]) * (end - starts[i])
+
+    upper_starts = array('i', [256] + starts[split + 1:])
+    upper_classes = array('i', classes[split:])
+
+    return bytes(classmap), upper_starts, upper_classes, [chr(r) for r in reps]
+
+
+def subset_construction(nfa, reps, max_states=None, budget=None):
+    """
+    Build every reachable DFA state of an NFA, including the dead state.
+
+    @param nfa -- NFA
+    @param reps -- list, representative char of each alphabet class
+    @param max_states -- int, raise DFALimitError if more states are needed
+    @param budget -- Budget charged for the NFA states advanced, or None
+
+    @return -- tuple (flat transition list, list of accept flags, initial state number)
+    """
+    num_classes = len(reps)
+    index = {}
+    sets = []
+    delta = []
+    accept = []
+
+    def add_state(nfa_states):
+        if nfa_states not in index:
+            if max_states is not None and len(sets) >= max_states:
+                raise DFALimitError("DFA needs more than {} states".format(max_states))
+            index[nfa_states] = len(sets)
+            sets.append(nfa_states)
+            accept.append(nfa.is_accepting(nfa_states))
+        return index[nfa_states]
+
+    start = add_state(nfa.start_set())
+
+    # sets grows while it is walked, each state is expanded exactly once
+    n = 0
+    while n < len(sets):
+        if budget is not None:
+            budget.charge(len(sets[n]) * num_classes)
+        for c in reps:
+            delta.append(add_state(nfa.step(sets[n], c)))
+        n += 1
+
+    assert len(delta) == len(sets) * num_classes
+    return delta, accept, start
+
+
+def minimize(delta, accept, num_classes, budget=None):
+    """
+    Hopcroft's partition refinement: split the states into blocks of equivalent states.
+
+    @param delta -- list, flat transition list
+    @param accept -- list of accept flags
+    @param num_classes -- int
+    @param budget -- Budget charged for the transitions walked, or None
+
+    @return -- tuple (block number of each state, number of blocks)
+    """
+    num_states = len(accept)
+    if budget is not None:
+        budget.charge(num_states * num_classes)
+
+    # inverse transitions: inverse[c][t] = states moving to t on class c
+    inverse = [[[] for _ in range(num_states)] for _ in range(num_classes)]
+    for s in range(num_states):
+        for c in range(num_classes):
+            inverse[c][delta[s * num_classes + c]].append(s)
+
+    blocks = [b for b in ({s for s in range(num_states) if accept[s]},
+                          {s for s in range(num_states) if not accept[s]}) if b]
+    block_of = [0] * num_states
+    for b, members in enumerate(blocks):
+        for s in members:
+            block_of[s] = b
+
+    work = set(range(len(blocks)))
+
+    while work:
+        splitter = list(blocks[work.pop()])
+        if budget is not None:
+            budget.charge(len(splitter) * num_classes)
+
+        for c in range(num_classes):
+            # group the states moving into the splitter by their current block
+            touched = {}
+            for t in splitter:
+                for s in inverse[c][t]:
+                    touched.setdefault(block_of[s], set()).add(s)
+
+            for b, members in touched.items():
+                if len(members) == len(blocks[b]):
+                    continue
+
+                blocks[b] -= members
+                new_block = len(blocks)
+                blocks.append(members)
+                for s in members:
+                    block_of[s] = new_block
+
+                if b in work or len(members) <= len(blocks[b]):
+                    work.add(new_block)
+                else:
+                    work.add(b)
+
+    return block_of, len(blocks)
+
+
+def compact_table(delta, accept, start, block_of, num_blocks, num_classes):
+    """
+    Lay the minimised DFA out as flat arrays, numbering the initial state 0
+    and replacing moves into the dead state by -1.
+
+    @param delta -- list, flat transition list
+    @param accept -- list of accept flags
+    @param start -- int, initial state number
+    @param block_of -- list, block number of each state
+    @param num_blocks -- int
+    @param num_classes -- int
+
+    @return -- tuple (array('i') transition table, bytes of accept flags)
+    """
+    # one representative state per block
+    reps = [None] * num_blocks
+    for s, b in enumerate(block_of):
+        if reps[b] is None:
+            reps[b] = s
+
+    def is_dead(b):
+        s = reps[b]
+        return not accept[s] and all(block_of[delta[s * num_classes + c]] == b for c in range(num_classes))
+
+    # renumber so the initial block is 0 and the dead block is dropped
+    number = {block_of[start]: 0}
+    for b in range(num_blocks):
+        if b not in number and not is_dead(b):
+            number[b] = len(number)
+
+    table = array('i', [-1]) * (len(number) * num_classes)
+    flags = bytearray(len(number))
+
+    for b, n in number.items():
+        s = reps[b]
+        flags[n] = accept[s]
+        for c in range(num_classes):
+            table[n * num_classes + c] = number.get(block_of[delta[s * num_classes + c]], -1)
+
+    return table, bytes(flags)
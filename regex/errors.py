@@ -0,0 +1,57 @@
+class RegexError(Exception):
+    """
+    Base class for errors raised while compiling or matching a regular expression.
+    """
+
+
+class LimitError(RegexError):
+    """
+    Compiling or matching needed more of a resource than it was allowed.
+    """
+
+
+class StateLimitError(LimitError):
+    """
+    An automaton needed more states than it was allowed.
+    """
+
+
+class NFALimitError(StateLimitError):
+    """
+    The NFA built from a pattern needed more states than it was allowed.
+    """
+
+
+class DFALimitError(StateLimitError):
+    """
+    A DFA needed more states than it was allowed.
+    """
+
+
+class StepLimitError(LimitError):
+    """
+    A call took more automaton steps than it was allowed.
+    """
+
+
+class DeadlineError(LimitError):
+    """
+    A call ran past its deadline.
+    """
+
+
+class ParseError(RegexError):
+    """
+    A pattern could not be parsed.
+    """
+
+    def __init__(self, msg, pattern, pos):
+        """
+        @param msg -- str, what was wrong
+        @param pattern -- str
+        @param pos -- int, index into pattern where the error was found
+        """
+        RegexError.__init__(self, "{} at position {}".format(msg, pos))
+        self.msg = msg
+        self.pattern = pattern
+        self.pos = pos
@@ -0,0 +1,144 @@
+"""
+grep-like search over files using a pool of worker processes.
+
+Usage: python -m regex.grep [-j JOBS] [-b] PATTERN FILE...
+"""
+import argparse
+import mmap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from .compiler import compile, set_parser
+from .dfa import CompactDFA
+from .errors import RegexError
+from .serialize import dumps, loads
+from .stream import CHUNK_SIZE, LineScanner, search_chunks, search_stream
+
+# files smaller than this are searched in the calling process
+MIN_PARALLEL_SIZE = 1 << 20
+# target size of the byte range handed to a worker in one task
+RANGE_SIZE = 1 << 22
+
+# scanner of a worker process, set once by _init_worker
+_scanner = None
+
+
+def _init_worker(data):
+    """
+    Rebuild the serialised scanner once per worker process.
+
+    @param data -- bytes, serialised LineScanner
+    """
+    global _scanner
+    pattern, nfa, dfa, prefix, required = loads(data)
+    _scanner = LineScanner(pattern, nfa, dfa if isinstance(dfa, CompactDFA) else None, prefix, required)
+
+
+def _search_range(path, start, end, chunk_size):
+    """
+    Search the lines in bytes [start, end) of a file. start and end are line boundaries.
+
+    @return -- list of (byte offset of the line, line bytes)
+    """
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            chunks = (mm[i:min(i + chunk_size, end)] for i in range(start, end, chunk_size))
+            return list(search_chunks(_scanner, chunks, offset=start))
+
+
+def split_lines(path, parts):
+    """
+    Split a file into about the given number of byte ranges, each starting at the beginning of a line.
+
+    @param path -- str
+    @param parts -- int
+
+    @return -- list of (start, end) tuples
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    ranges = []
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            for i in range(1, parts + 1):
+                target = size * i // parts
+                if target <= start:
+                    continue
+                newline = mm.find(b'\n', target - 1)
+                end = size if newline < 0 or i == parts else newline + 1
+                ranges.append((start, end))
+                start = end
+                if end == size:
+                    break
+
+    return ranges
+
+
+def grep(pattern, path, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Find the lines of a file that contain a match, searching large files in parallel.
+    The scanner is serialised once and sent to each worker when the pool starts, and results come back in file order.
+
+    @param pattern -- str or Pattern
+    @param path -- str
+    @param workers -- int, number of processes, defaults to the number of CPUs
+    @param chunk_size -- int, bytes read at a time
+
+    @return -- generator of (byte offset of the line, line bytes without its newline)
+    """
+    if isinstance(pattern, str):
+        pattern = compile(pattern)
+
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(path)
+
+    if workers == 1 or size < MIN_PARALLEL_SIZE:
+        yield from search_stream(pattern, path, chunk_size)
+        return
+
+    data = dumps(pattern.line_scanner)
+    ranges = split_lines(path, max(workers, size // RANGE_SIZE))
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(data,)) as pool:
+        futures = [pool.submit(_search_range, path, start, end, chunk_size) for start, end in ranges]
+        for future in futures:
+            yield from future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m regex.grep', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('pattern')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes')
+    parser.add_argument('-b', '--byte-offset', action='store_true', help='print the byte offset of each line')
+    args = parser.parse_args(argv)
+
+    # the recursive descent parser avoids the PLY start up cost
+    set_parser('rd')
+    try:
+        pattern = compile(args.pattern)
+    except RegexError as e:
+        parser.error(str(e))
+
+    out = sys.stdout.buffer
+    found = False
+
+    for path in args.files:
+        for offset, line in grep(pattern, path, args.jobs):
+            found = True
+            if len(args.files) > 1:
+                out.write(os.fsencode(path) + b':')
+            if args.byte_offset:
+                out.write(b'%d:' % offset)
+            out.write(line + b'\n')
+
+    out.flush()
+    return 0 if found else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+from threading import Lock, local
+
+# read on every match, so it is a plain module attribute rather than a function call
+enabled = False
+
+_trace_memory = False
+_started_tracemalloc = False
+_observers = []
+_lock = Lock()
+# stage name -> dict of counts summed over every event of the stage
+_totals = {}
+# events of the stages running on each thread, innermost last
+_frames = local()
+
+# event keys that describe the event rather than count something
+_LABELS = ('stage', 'pattern', 'error')
+
+
+def set_instrumentation(on, memory=False):
+    """
+    Turn instrumentation on or off. While it is off the stages cost a flag check and nothing is recorded.
+
+    @param on -- boolean
+    @param memory -- boolean, also measure the bytes each stage leaves allocated using tracemalloc, which slows
+                     every allocation down while it is on
+    """
+    global enabled, _trace_memory, _started_tracemalloc
+    enabled = bool(on)
+    _trace_memory = enabled and memory
+
+    if _trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+    elif not _trace_memory and _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+
+def add_observer(callback):
+    """
+    Call callback with the event dict of every stage that finishes while instrumentation is on.
+    An event holds 'stage', 'pattern', 'seconds', 'bytes' when memory is measured, 'error' with the name of the
+    exception if the stage raised one, and the counts of the stage, e.g. 'states' and 'edges'.
+
+    @param callback -- function taking a dict
+    """
+    with _lock:
+        _observers.append(callback)
+
+
+def remove_observer(callback):
+    """
+    @param callback -- function given to add_observer
+    """
+    with _lock:
+        _observers.remove(callback)
+
+
+def stats():
+    """
+    Totals of the events recorded since the last reset_stats(), per stage:
+    'calls', 'errors', 'seconds' and the counts of the events summed, or for 'max_' counts the largest one,
+    with 'dfa_hit_rate' the share of the chars for which a lazily built DFA already had the transition.
+
+    @return -- dict, stage name -> dict
+    """
+    with _lock:
+        out = {name: dict(totals) for name, totals in _totals.items()}
+
+    for totals in out.values():
+        if totals.get('dfa_lookups'):
+            totals['dfa_hit_rate'] = 1.0 - totals.get('dfa_misses', 0) / totals['dfa_lookups']
+
+    return out
+
+
+def reset_stats():
+    with _lock:
+        _totals.clear()
+
+
+@contextmanager
+def stage(name, pattern=None):
+    """
+    Time the code run in the with block and record it as an event of the stage.
+    Stages run inside it are recorded as events of their own, and take its pattern if they are not given one.
+
+    @param name -- str, stage name
+    @param pattern -- str, pattern the stage works on
+
+    @return -- context manager giving the event dict, or None while instrumentation is off
+    """
+    if not enabled:
+        yield None
+        return
+
+    frames = _stack()
+    if pattern is None and frames:
+        pattern = frames[-1]['pattern']
+    event = {'stage': name, 'pattern': pattern}
+    frames.append(event)
+
+    memory = _trace_memory and tracemalloc.is_tracing()
+    before = tracemalloc.get_traced_memory()[0] if memory else 0
+    start = time.perf_counter()
+
+    try:
+        yield event
+    except BaseException as e:
+        event['error'] = type(e).__name__
+        raise
+    finally:
+        event['seconds'] = time.perf_counter() - start
+        if memory:
+            event['bytes'] = tracemalloc.get_traced_memory()[0] - before
+        frames.pop()
+        emit(event)
+
+
+def count(**counts):
+    """
+    Add counts to the event of the innermost stage running on this thread, or keep the largest for 'max_' counts.
+    Does nothing while instrumentation is off.
+    """
+    if not enabled:
+        return
+
+    frames = _stack()
+    if frames:
+        merge(frames[-1], counts)
+
+
+def emit(event):
+    """
+    Record a finished event and pass it to the observers.
+
+    @param event -- dict with at least 'stage', 'pattern' and 'seconds'
+    """
+    with _lock:
+        totals = _totals.setdefault(event['stage'], {'calls': 0, 'errors': 0})
+        totals['calls'] += 1
+        if 'error' in event:
+            totals['errors'] += 1
+        merge(totals, {key: value for key, value in event.items() if key not in _LABELS})
+        observers = list(_observers)
+
+    for observer in observers:
+        observer(event)
+
+
+def merge(into, counts):
+    """
+    @param into -- dict to update
+    @param counts -- dict, name -> number
+    """
+    for key, value in counts.items():
+        if key.startswith('max_'):
+            into[key] = max(into.get(key, value), value)
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+def _stack():
+    frames = getattr(_frames, 'stack', None)
+    if frames is None:
+        frames = _frames.stack = []
+    return frames
@@ -0,0 +1,90 @@
+import time
+
+from .errors import DeadlineError, StepLimitError
+
+# positions scanned between two checks of a Budget, small enough to check about every millisecond
+CHECK_INTERVAL = 4096
+
+
+class Limits(object):
+    """
+    Resource limits for compiling and matching untrusted patterns, None meaning no limit.
+    The state limits apply when a pattern is compiled, the step limit and the timeout to each call.
+    """
+
+    def __init__(self, max_nfa_states=None, max_dfa_states=None, max_steps=None, timeout=None):
+        """
+        @param max_nfa_states -- int, states of the NFA built from the pattern, NFALimitError beyond
+        @param max_dfa_states -- int, states of the DFA built when compiling, DFALimitError beyond.
+                                 The tables of lazily built DFAs are also kept to this size
+        @param max_steps -- int, automaton steps of a call: a char read by a DFA or an NFA state advanced over a char,
+                            including while a DFA is built, and when compiling the states created, simplified
+                            and minimised. StepLimitError beyond
+        @param timeout -- float, seconds a call may take, DeadlineError beyond
+        """
+        self.max_nfa_states = max_nfa_states
+        self.max_dfa_states = max_dfa_states
+        self.max_steps = max_steps
+        self.timeout = timeout
+
+    def __repr__(self):
+        return "Limits(max_nfa_states={!r}, max_dfa_states={!r}, max_steps={!r}, timeout={!r})".format(
+            self.max_nfa_states, self.max_dfa_states, self.max_steps, self.timeout)
+
+    def budget(self):
+        """
+        @return -- Budget for a call starting now, or None if there is no step limit or timeout
+        """
+        if self.max_steps is None and self.timeout is None:
+            return None
+        return Budget(self.max_steps, self.timeout)
+
+
+class Budget(object):
+    """
+    Steps and time left to one call. The automata charge it as they go, a run of positions at a time,
+    so a call may overrun its limits by up to CHECK_INTERVAL steps before it is stopped.
+    """
+
+    __slots__ = ('steps', 'max_steps', 'deadline')
+
+    def __init__(self, max_steps=None, timeout=None):
+        """
+        @param max_steps -- int or None
+        @param timeout -- float, seconds from now, or None
+        """
+        self.steps = 0
+        self.max_steps = max_steps
+        self.deadline = time.perf_counter() + timeout if timeout is not None else None
+
+    def charge(self, steps=0):
+        """
+        @param steps -- int, steps taken since the last charge
+
+        Raises StepLimitError or DeadlineError if the call is over its limits.
+        """
+        self.steps += steps
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise StepLimitError("more than {} steps".format(self.max_steps))
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise DeadlineError("deadline passed after {} steps".format(self.steps))
+
+
+def slices(start, stop, budget):
+    """
+    Split the positions range(start, stop) into runs to scan, charging the budget for each run once it is scanned.
+
+    @param budget -- Budget, or None to scan the whole range as one run
+
+    @return -- iterable of (start, stop) tuples
+    """
+    if budget is None:
+        return (start, stop),
+    return _charged_slices(start, stop, budget)
+
+
+def _charged_slices(start, stop, budget):
+    for lo in range(start, stop, CHECK_INTERVAL):
+        hi = min(stop, lo + CHECK_INTERVAL)
+        yield lo, hi
+        budget.charge(hi - lo)
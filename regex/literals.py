@@ -0,0 +1,363 @@
+from collections import deque
+
+from . import instrument
+from .charset import charset
+from .nfa import empty, walk_tree
+
+# largest set of literals kept for a node, larger sets are cut down to shorter literals
+MAX_LITERALS = 64
+# literals are cut to this length, which also keeps long literal patterns from being copied char by char
+MAX_LENGTH = 32
+# a Prefilter runs str.find once per literal up to this many literals, which beats stepping through
+# the input in Python, and Aho-Corasick beyond
+MAX_FIND = 16
+
+
+class Literals(object):
+    """
+    What is known about the strings matched by a sub-tree.
+    exact is the set of all of them when it is small, otherwise None.
+    Every match starts with one of prefixes, ends with one of suffixes and contains one of required.
+    A set holding '' says nothing.
+    """
+
+    __slots__ = ('exact', 'prefixes', 'suffixes', 'required')
+
+    def __init__(self, exact=None, prefixes=None, suffixes=None, required=None):
+        if exact is not None and len(exact) <= MAX_LITERALS and all(len(s) <= MAX_LENGTH for s in exact):
+            self.exact = self.prefixes = self.suffixes = self.required = frozenset(exact)
+            return
+
+        if exact is not None:
+            prefixes = suffixes = required = exact
+
+        self.exact = None
+        self.prefixes = cut_prefixes(prefixes)
+        self.suffixes = cut_suffixes(suffixes)
+        self.required = cut_prefixes(required)
+
+
+NOTHING = frozenset([''])
+
+
+def cut_prefixes(literals):
+    """
+    Shorten literals from the end until there are few enough of them.
+
+    @param literals -- iterable of str
+
+    @return -- frozenset
+    """
+    literals = {s[:MAX_LENGTH] for s in literals}
+    while len(literals) > MAX_LITERALS:
+        length = max(len(s) for s in literals) - 1
+        literals = {s[:length] for s in literals}
+    return NOTHING if '' in literals else frozenset(literals)
+
+
+def cut_suffixes(literals):
+    """
+    Shorten literals from the start until there are few enough of them.
+
+    @param literals -- iterable of str
+
+    @return -- frozenset
+    """
+    literals = {s[-MAX_LENGTH:] for s in literals}
+    while len(literals) > MAX_LITERALS:
+        length = max(len(s) for s in literals) - 1
+        literals = {s[len(s) - length:] for s in literals}
+    return NOTHING if '' in literals else frozenset(literals)
+
+
+def cross(xs, ys):
+    """
+    @return -- set of every x + y, or None if there would be more than MAX_LITERALS
+    """
+    if len(xs) * len(ys) > MAX_LITERALS:
+        return None
+    return {x + y for x in xs for y in ys}
+
+
+def score(literals):
+    """
+    Rank a set of required literals: sets str.find can look for come first, then longer literals give fewer false
+    hits and fewer literals are quicker to find.
+    """
+    if not useful(literals):
+        return False, 0, 0
+    return useful(literals, skip=True), min(len(s) for s in literals), -len(literals)
+
+
+def common_prefix(literals):
+    """
+    @param literals -- set of str
+
+    @return -- frozenset holding the longest string every literal starts with, NOTHING if there is none
+    """
+    if not literals:
+        return NOTHING
+    first, last = min(literals), max(literals)
+    n = 0
+    while n < min(len(first), len(last)) and first[n] == last[n]:
+        n += 1
+    return frozenset([first[:n]])
+
+
+def common_suffix(literals):
+    """
+    @param literals -- set of str
+
+    @return -- frozenset holding the longest string every literal ends with, NOTHING if there is none
+    """
+    return frozenset(s[::-1] for s in common_prefix({s[::-1] for s in literals}))
+
+
+def char_literals(label):
+    if label == empty:
+        return Literals(exact={''})
+
+    chars = charset(label)
+    if sum(hi - lo + 1 for lo, hi in chars) > MAX_LITERALS:
+        return Literals(prefixes=NOTHING, suffixes=NOTHING, required=NOTHING)
+
+    return Literals(exact={chr(o) for lo, hi in chars for o in range(lo, hi + 1)})
+
+
+def concat_literals(x, y):
+    if x.exact is not None and y.exact is not None:
+        both = cross(x.exact, y.exact)
+        if both is not None:
+            return Literals(exact=both)
+
+    prefixes = x.prefixes
+    if x.exact is not None:
+        prefixes = cross(x.exact, y.prefixes) or x.exact
+
+    suffixes = y.suffixes
+    if y.exact is not None:
+        suffixes = cross(x.suffixes, y.exact) or y.exact
+
+    # a suffix of x followed by a prefix of y is also in every match
+    bridge = cross(x.suffixes, y.prefixes) or NOTHING
+    literals = Literals(prefixes=prefixes, suffixes=suffixes, required=bridge)
+
+    # so is the start all the prefixes share and the end all the suffixes share, e.g. 'ing' for [a-z]+ing
+    literals.required = max([x.required, y.required, literals.required, literals.prefixes, literals.suffixes,
+                             common_prefix(literals.prefixes), common_suffix(literals.suffixes)], key=score)
+    return literals
+
+
+def or_literals(x, y):
+    if x.exact is not None and y.exact is not None:
+        return Literals(exact=x.exact | y.exact)
+
+    return Literals(prefixes=x.prefixes | y.prefixes, suffixes=x.suffixes | y.suffixes,
+                    required=x.required | y.required)
+
+
+def star_literals(x):
+    if x.exact == NOTHING:
+        return x
+    return Literals(prefixes=NOTHING, suffixes=NOTHING, required=NOTHING)
+
+
+def plus_literals(x):
+    if x.exact == NOTHING:
+        return x
+    return Literals(prefixes=x.prefixes, suffixes=x.suffixes, required=x.required)
+
+
+def optional_literals(x):
+    return or_literals(x, Literals(exact={''}))
+
+
+def copy_literals(x):
+    return x
+
+
+def extract_literals(tree):
+    """
+    Find literals every match of a pattern starts with, and literals every match contains.
+
+    @param tree -- ParseTree
+
+    @return -- tuple (prefix literals, required literals), each a frozenset holding '' when nothing is known
+    """
+    literals = walk_tree(tree, char_literals, concat_literals, or_literals, star_literals, plus_literals,
+                         optional_literals, copy_literals)
+    if literals is None:
+        return NOTHING, NOTHING
+
+    # a literal is redundant if a shorter one in the set is found wherever it is, e.g. 'ab' with 'a' as prefixes
+    prefixes = frozenset(s for s in literals.prefixes
+                         if not any(t != s and s.startswith(t) for t in literals.prefixes))
+    required = frozenset(s for s in literals.required
+                         if not any(t != s and t in s for t in literals.required))
+
+    return prefixes, required
+
+
+def prefilters(tree):
+    """
+    @param tree -- ParseTree
+
+    @return -- tuple (Prefilter for the start of a match, Prefilter for a literal inside a match), either None if
+               the pattern has no such literals
+    """
+    with instrument.stage('literals'):
+        prefixes, required = extract_literals(tree)
+        prefix = Prefilter(prefixes) if useful(prefixes, skip=True) else None
+        inside = Prefilter(required) if useful(required) else None
+        instrument.count(prefixes=len(prefix.literals) if prefix else 0, required=len(inside.literals) if inside else 0)
+
+    return prefix, inside
+
+
+def useful(literals, skip=False):
+    """
+    @param literals -- set of str
+    @param skip -- boolean, the literals are looked for again wherever a match may start, as prefixes are
+
+    @return -- boolean, whether every match is known to contain one of the literals,
+               and with skip whether looking for them is quicker than running the automaton over the input
+    """
+    # an empty set comes from a range matching no char, so the pattern cannot match at all
+    if not literals or '' in literals:
+        return False
+    if not skip:
+        return True
+    # more literals need the Aho-Corasick automaton, which reads the input char by char in Python as the DFA does,
+    # and several single chars are found so often that calling find costs more than it skips
+    return len(literals) <= MAX_FIND and (len(literals) == 1 or max(len(s) for s in literals) > 1)
+
+
+class Prefilter(object):
+    """
+    Skips ahead to where one of a set of literals occurs, before running the automaton on the input.
+    A few literals are each looked for with str.find or bytes.find, larger sets with an Aho-Corasick automaton.
+    """
+
+    def __init__(self, literals):
+        """
+        @param literals -- iterable of non empty str or bytes
+        """
+        self.literals = tuple(sorted(literals))
+        self.max_length = max(len(s) for s in self.literals)
+        self.automaton = AhoCorasick(self.literals) if len(self.literals) > MAX_FIND else None
+        # automaton for the inputs without a find method, built the first time one is searched
+        self._view_automaton = self.automaton
+
+    def __repr__(self):
+        return "Prefilter({!r})".format(list(self.literals))
+
+    def encode(self):
+        """
+        @return -- Prefilter for the UTF-8 encoded literals, to search bytes, or itself if they already are bytes
+        """
+        if isinstance(self.literals[0], bytes):
+            return self
+        return Prefilter(s.encode('utf-8') for s in self.literals)
+
+    def finder(self, s):
+        """
+        Build the skip function for one input.
+
+        @param s -- str, or bytes, bytearray or memoryview for an encoded Prefilter
+
+        @return -- function taking a position, which must not decrease from call to call, and returning a position
+                   at or after it such that no literal starts in between, or -1 if no literal starts from it on
+        """
+        automaton = self.automaton
+        if automaton is None and not hasattr(s, 'find'):
+            # a memoryview is searched in place rather than copied to bytes to use find
+            if self._view_automaton is None:
+                self._view_automaton = AhoCorasick(self.literals)
+            automaton = self._view_automaton
+
+        if automaton is not None:
+            search, max_length = automaton.search, self.max_length
+            # last position returned, still the answer while pos has not passed it, or -1 once nothing is left
+            last = [None]
+
+            def find(pos):
+                if last[0] is not None and (last[0] >= pos or last[0] < 0):
+                    return last[0]
+                end = search(s, pos)
+                last[0] = -1 if end < 0 else max(pos, end - max_length)
+                return last[0]
+
+            return find
+
+        literals = self.literals
+        # next occurrence of each literal, kept until pos passes it so rare literals are not searched for again
+        found = [None] * len(literals)
+
+        def find(pos):
+            first = -1
+            for i, literal in enumerate(literals):
+                n = found[i]
+                if n is None or 0 <= n < pos:
+                    n = found[i] = s.find(literal, pos)
+                if n >= 0 and (first < 0 or n < first):
+                    first = n
+            return first
+
+        return find
+
+
+class AhoCorasick(object):
+    """
+    Trie of a set of literals with failure links, finding the first place any of them occurs in one pass.
+    """
+
+    def __init__(self, literals):
+        """
+        @param literals -- iterable of non empty str or bytes
+        """
+        # node -> {char: node}, node -> node of the longest proper suffix in the trie, node -> ends a literal
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [False]
+
+        for literal in literals:
+            node = 0
+            for c in literal:
+                if c not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(False)
+                    self.goto[node][c] = len(self.goto) - 1
+                node = self.goto[node][c]
+            self.out[node] = True
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for c, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and c not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(c, 0)
+                self.out[child] = self.out[child] or self.out[self.fail[child]]
+
+    def search(self, s, pos=0):
+        """
+        @param s -- str or bytes, of the same type as the literals
+        @param pos -- int, where to start
+
+        @return -- int, end of the first literal found in s[pos:], or -1 if there is none
+        """
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+
+        for i in range(pos, len(s)):
+            c = s[i]
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            if out[node]:
+                return i + 1
+
+        return -1
@@ -0,0 +1,155 @@
+from .compact_nfa import CompactNFA, NFABuilder, link_arrays
+from .compiler import parse
+from .dfa import DFA
+from .nfa import epsilon
+
+
+class MultiNFA(CompactNFA):
+    """
+    Union of the NFAs of several patterns, with each accept state tagged by the index of its pattern.
+    State 0 is a new initial state linked to the initial state of every pattern, which is followed by its states.
+    """
+
+    __slots__ = ('_tags',)
+
+    def __init__(self, trees, unanchored=False):
+        """
+        @param trees -- list of ParseTree
+        @param unanchored -- boolean, loop the initial state on every char so matches can start anywhere
+        """
+        builder = NFABuilder()
+        fragments = [builder.build_fragment(tree) for tree in trees]
+        number = {}
+        for fragment in fragments:
+            builder.number_states(fragment, number)
+
+        # every state moves up one for the new initial state
+        links = [(0, number[start] + 1, epsilon) for start, _ in fragments]
+        links += [(number[n] + 1, number[s] + 1, c) for n in number for s, c in builder.out_links[n]]
+        if unanchored:
+            links.append((0, 0, '.'))
+
+        self._tags = {number[accept] + 1: i for i, (_, accept) in enumerate(fragments)}
+        CompactNFA.__init__(self, *link_arrays(len(number) + 1, links, self._tags))
+
+    def matched(self, current):
+        """
+        @param current -- set of state numbers
+
+        @return -- frozenset, indexes of the patterns whose accept state is in current
+        """
+        return frozenset(self._tags[n] for n in current if n in self._tags)
+
+
+class MultiDFA(DFA):
+    """
+    Lazily built DFA over a MultiNFA, recording for each state the patterns it accepts.
+    """
+
+    def __init__(self, nfa, max_states=1000):
+        """
+        @param nfa -- MultiNFA
+        @param max_states -- int, size of the state table before falling back to NFA simulation
+        """
+        self._matches = []
+        DFA.__init__(self, nfa, max_states)
+
+    def _add_state(self, nfa_states):
+        n = DFA._add_state(self, nfa_states)
+        if n is not None:
+            self._matches.append(self._nfa.matched(nfa_states))
+        return n
+
+    def fullmatch_all(self, s):
+        """
+        @param s -- str
+
+        @return -- frozenset, indexes of the patterns matching the whole of s
+        """
+        trans = self._trans
+        state = self._start
+
+        for pos, c in enumerate(s):
+            nxt = trans[state].get(c)
+            if nxt is None:
+                nxt = self._add_transition(state, c)
+                if nxt is None:
+                    self.lookups += pos
+                    return self._nfa.matched(self._simulate(state, s, pos)[0])
+            if nxt == self._dead:
+                self.lookups += pos + 1
+                return frozenset()
+            state = nxt
+
+        self.lookups += len(s)
+        return self._matches[state]
+
+    def search_all(self, s):
+        """
+        @param s -- str
+
+        @return -- frozenset, indexes of the patterns whose accept state was reached anywhere in s
+        """
+        trans = self._trans
+        matches = self._matches
+        state = self._start
+        found = set(matches[state])
+
+        for pos, c in enumerate(s):
+            nxt = trans[state].get(c)
+            if nxt is None:
+                nxt = self._add_transition(state, c)
+                if nxt is None:
+                    # table is full, finish the scan on the NFA
+                    self.fallbacks += 1
+                    self.lookups += len(s)
+                    self.misses += len(s) - pos
+                    nfa = self._nfa
+                    current = self._sets[state]
+                    for i in range(pos, len(s)):
+                        current = nfa.step(current, s[i])
+                        found.update(nfa.matched(current))
+                    return frozenset(found)
+            state = nxt
+            if matches[state]:
+                found.update(matches[state])
+
+        self.lookups += len(s)
+        return frozenset(found)
+
+
+class PatternSet(object):
+    """
+    Many patterns compiled into one automaton, so one pass over the input reports every pattern that matches.
+    Patterns are identified by their index in the list they were given in.
+    """
+
+    def __init__(self, patterns, max_states=1000):
+        """
+        @param patterns -- iterable of str
+        @param max_states -- int, size of each DFA state table
+        """
+        self.patterns = list(patterns)
+        trees = [parse(pattern) for pattern in self.patterns]
+
+        self._anchored = MultiDFA(MultiNFA(trees), max_states)
+        self._unanchored = MultiDFA(MultiNFA(trees, unanchored=True), max_states)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def fullmatch(self, s):
+        """
+        @param s -- str
+
+        @return -- frozenset, indexes of the patterns matching the whole of s
+        """
+        return self._anchored.fullmatch_all(s)
+
+    def search(self, s):
+        """
+        @param s -- str
+
+        @return -- frozenset, indexes of the patterns matching some substring of s
+        """
+        return self._unanchored.search_all(s)
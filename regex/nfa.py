@@ -1,4 +1,10 @@
+from . import instrument
+from .charset import charset
+from .errors import NFALimitError, RegexError
+from .parse_tree import MAX_REPEAT_SIZE, repeat_bounds
+
 epsilon = 'ϵ'
+empty = '[]'
 
 
 class NFA(object):
@@ -6,14 +12,24 @@ class NFA(object):
     Non-deterministic Finite Automaton object
     """
 
-    def __init__(self, tree):
+    def __init__(self, tree, max_states=None):
         """
         Initialise the NFA using a ParseTree
 
         @param tree -- ParseTree
+        @param max_states -- int, raise NFALimitError if the NFA has more states, before its closures are computed
         """
-        self._states = build_nfa(tree)
-        self.assign_states()
+        with instrument.stage('nfa'):
+            self._states = build_nfa(tree)
+            if max_states is not None and len(self._states) > max_states:
+                raise NFALimitError("NFA needs more than {} states".format(max_states))
+            self.assign_states()
+            self.prepare()
+
+            if instrument.enabled:
+                instrument.count(states=len(self._states), edges=sum(len(links) for state, links in self),
+                                 closure_states=sum(map(len, self._closures)),
+                                 max_closure=max(map(len, self._closures), default=0))
 
     def __repr__(self):
         output = ""
@@ -42,6 +58,121 @@ class NFA(object):
             if not state.get_out_links():
                 state.make_accept()
 
+    def prepare(self):
+        """
+        Precompute the tables used by the matcher:
+        the epsilon closure of every state, the labelled moves out of every state and the accept states.
+        """
+        num_states = len(self._states)
+        eps_links = [[] for _ in range(num_states)]
+        self._moves = [[] for _ in range(num_states)]
+        self._matchers = matchers = {}
+
+        for state in self._states:
+            for s, c in state.get_out_links():
+                if c == epsilon or c == empty:
+                    eps_links[state.state_no].append(s.state_no)
+                else:
+                    if c not in matchers:
+                        matchers[c] = label_matcher(c)
+                    self._moves[state.state_no].append((matchers[c], s.state_no))
+
+        self._closures = [epsilon_closure(eps_links, n) for n in range(num_states)]
+        self._accepts = frozenset(state.state_no for state in self._states if state.get_accept())
+
+    def start_set(self):
+        """
+        @return -- frozenset, states reachable from the initial state without consuming input
+        """
+        if not self._states:
+            return frozenset()
+        return frozenset(self._closures[self._states[0].state_no])
+
+    def step(self, current, c):
+        """
+        Advance a set of states over one input character.
+
+        @param current -- set of state numbers
+        @param c -- str, single character
+
+        @return -- frozenset
+        """
+        closures = self._closures
+        nxt = set()
+
+        for n in current:
+            for matches, target in self._moves[n]:
+                if matches(c):
+                    nxt.update(closures[target])
+
+        return frozenset(nxt)
+
+    def is_accepting(self, current):
+        """
+        @param current -- set of state numbers
+
+        @return -- boolean
+        """
+        return not self._accepts.isdisjoint(current)
+
+    def match(self, s):
+        """
+        Match the NFA against the start of s, keeping one set of active states per character
+        so the run is linear in len(s) with no backtracking.
+
+        @param s -- str
+
+        @return -- int, length of the longest matching prefix, or None if no prefix matches
+        """
+        current = self.start_set()
+        end = 0 if self.is_accepting(current) else None
+
+        for pos, c in enumerate(s):
+            if not current:
+                break
+            current = self.step(current, c)
+            if self.is_accepting(current):
+                end = pos + 1
+
+        return end
+
+    def fullmatch(self, s):
+        """
+        Check whether the NFA accepts the whole of s.
+
+        @param s -- str
+
+        @return -- boolean
+        """
+        current = self.start_set()
+
+        for c in s:
+            if not current:
+                return False
+            current = self.step(current, c)
+
+        return self.is_accepting(current)
+
+    def links(self):
+        """
+        @return -- generator of (state number, linked state number, char linking states)
+        """
+        for state in self._states:
+            for s, c in state.get_out_links():
+                yield state.state_no, s.state_no, c
+
+    def get_accepts(self):
+        """
+        @return -- frozenset of accept state numbers
+        """
+        return self._accepts
+
+    def get_labels(self):
+        """
+        @return -- dict, non-epsilon edge label -> predicate on a single char
+        """
+        return self._matchers
+
     def get_states(self):
         return self._states
 
@@ -55,6 +186,8 @@ class State(object):
     Contains lists of links out and in to the connecting states in the NFA.
     """
 
+    __slots__ = ('_accept', '_out_links', '_in_links', 'state_no')
+
     def __init__(self):
         """
         Initialise state.
@@ -127,6 +260,39 @@ class State(object):
                 self._in_links.remove((s, c))
 
 
+def epsilon_closure(eps_links, n):
+    """
+    Find every state reachable from state n using only epsilon links.
+
+    @param eps_links -- list, epsilon link targets for each state number
+    @param n -- int, state number
+
+    @return -- tuple of state numbers
+    """
+    seen = {n}
+    stack = [n]
+
+    while stack:
+        for target in eps_links[stack.pop()]:
+            if target not in seen:
+                seen.add(target)
+                stack.append(target)
+
+    return tuple(seen)
+
+
+def label_matcher(label):
+    """
+    Build a predicate for a single character from an edge label.
+    Labels are either a single char ('.' matches anything) or a range string such as "[^a-z]".
+
+    @param label -- str
+
+    @return -- function
+    """
+    return charset(label).__contains__
+
+
 def build_nfa(tree):
     """
     Build an Non-deterministic Finite Automata from a ParseTree.
@@ -136,73 +302,177 @@ def build_nfa(tree):
 
     @return -- list
     """
-    # if the node has value None then the node's children need to be cycled through
-    if tree.value is None:
-        # sub NFAs will be built from the children of each node
-        sub_nfas = []
+    return walk_tree(tree, char_nfa, concat, create_or_branch, kleene_star, plus, optional, copy_nfa) or []
+
+
+def walk_tree(tree, char, concat, create_or_branch, kleene_star, plus, optional, copy):
+    """
+    Combine the sub NFAs of a ParseTree bottom up, using an explicit stack rather than recursion
+    so the depth of the tree is not limited by the recursion limit.
 
-        for child in tree.children:
-            sub_nfa = build_nfa(child)
-            # if there is a sub NFA from this branch it is appended
-            if sub_nfa:
-                sub_nfas.append(sub_nfa)
+    @param tree -- ParseTree
+    @param char -- function building a sub NFA for a single char or range label
+    @param concat, create_or_branch, kleene_star, plus, optional -- functions combining sub NFAs
+    @param copy -- function copying a finished sub NFA, which counted repetition builds on
 
-        # now check what the sub NFA list contains and deal with each applicably
+    @return -- sub NFA of the root, or None if the tree is empty
+    """
+    # each frame is [node, index of the next child to visit, sub NFAs of the children visited so far]
+    stack = [[tree, 0, []]]
 
-        # for or nodes the list will look like [ nfa, '|', nfa ]
-        if '|' in sub_nfas and len(sub_nfas) == 3:
-            return create_or_branch(sub_nfas[0], sub_nfas[2])
+    while True:
+        frame = stack[-1]
+        node, sub_nfas = frame[0], frame[2]
 
-        # kleene star nodes will have [ nfa, '*' ]
-        elif '*' in sub_nfas and len(sub_nfas) == 2:
-            return kleene_star(sub_nfas[0])
+        # if the node has value None then the node's children need to be cycled through
+        if node.value is None and frame[1] < len(node.children):
+            stack.append([node.children[frame[1]], 0, []])
+            frame[1] += 1
+            continue
 
-        # '+' will be the same but has different application
-        elif '+' in sub_nfas and len(sub_nfas) == 2:
-            return plus(sub_nfas[0])
+        stack.pop()
+        result = combine(node, sub_nfas, char, concat, create_or_branch, kleene_star, plus, optional, copy)
 
-        # bracket nodes will be [ '(', nfa, ')', '*' ]
-        # the final star may not be there so both sizes will need to be checked
-        elif '(' in sub_nfas and (len(sub_nfas) == 4 or len(sub_nfas) == 3):
-            if '*' in sub_nfas:
-                return kleene_star(sub_nfas[1])
-            elif '+' in sub_nfas:
-                return plus(sub_nfas[1])
-            else:
-                return sub_nfas[1]
-
-        # if the list is size two then the node contains two sub NFAs that need to be concatenated
-        elif len(sub_nfas) == 2:
-            return concat(sub_nfas[0], sub_nfas[1])
-
-        # size is 1 could contain chars * or +
-        elif len(sub_nfas) == 1:
-            return sub_nfas[0]
-
-        # otherwise return (empty list)
-        else:
-            return sub_nfas
+        if not stack:
+            return result
+        # if there is a sub NFA from this branch it is appended
+        if result is not None:
+            stack[-1][2].append(result)
+
+
+def combine(node, sub_nfas, char, concat, create_or_branch, kleene_star, plus, optional, copy):
+    """
+    Build the sub NFA for one node of the ParseTree once its children have been built.
 
+    @param node -- ParseTree
+    @param sub_nfas -- list, sub NFAs and operators built from the node's children
+
+    @return -- sub NFA, operator str, or None if the node is empty
+    """
     # if not None then op or char
-    else:
+    if node.value is not None:
         # operators should simply be returned
-        if tree.value in ['|', '*', '+', '(', ')']:
-            return tree.value
+        if is_operator(node.value):
+            return node.value
 
         # if chars then build a sub NFA e.g. a -> s0--a-->s1
+        return char(node.value)
+
+    # now check what the sub NFA list contains and deal with each applicably
+
+    # for or nodes the list will look like [ nfa, '|', nfa ]
+    if '|' in sub_nfas and len(sub_nfas) == 3:
+        return create_or_branch(sub_nfas[0], sub_nfas[2])
+
+    # nodes with a postfix operator will have [ nfa, '*' ], and the same for '+', '?' and counts like '{2,3}'
+    elif len(sub_nfas) == 2 and is_operator(sub_nfas[1]):
+        op = sub_nfas[1]
+        if op == '*':
+            return kleene_star(sub_nfas[0])
+        elif op == '+':
+            return plus(sub_nfas[0])
+        elif op == '?':
+            return optional(sub_nfas[0])
+        return repeat(sub_nfas[0], *repeat_bounds(op), char=char, concat=concat, kleene_star=kleene_star, plus=plus,
+                      optional=optional, copy=copy)
+
+    # bracket nodes will be [ '(', nfa, ')', '*' ]
+    # the final operator may not be there so both sizes will need to be checked
+    elif '(' in sub_nfas and (len(sub_nfas) == 4 or len(sub_nfas) == 3):
+        if len(sub_nfas) == 4:
+            return combine(node, [sub_nfas[1], sub_nfas[3]], char, concat, create_or_branch, kleene_star, plus,
+                           optional, copy)
         else:
-            nfa = []
+            return sub_nfas[1]
+
+    # if the list is size two then the node contains two sub NFAs that need to be concatenated
+    elif len(sub_nfas) == 2:
+        return concat(sub_nfas[0], sub_nfas[1])
+
+    # size is 1 could contain chars * or +
+    elif len(sub_nfas) == 1:
+        return sub_nfas[0]
+
+    # otherwise the node is empty
+    else:
+        return None
+
+
+def is_operator(value):
+    """
+    @param value -- node value of a ParseTree, or a sub NFA
+
+    @return -- boolean, whether it is an operator rather than a char or range label
+    """
+    return isinstance(value, str) and (value in ('|', '*', '+', '?', '(', ')') or value.startswith('{'))
+
+
+def repeat(nfa, m, n, char, concat, kleene_star, plus, optional, copy):
+    """
+    Build the counted repetition x{m,n} of a sub NFA: m copies in a row followed by the n - m optional copies
+    nested as (x(x(x)?)?)?, so a single epsilon link skips all the copies left and the epsilon closures stay small.
+    Without a max count the last required copy loops, x{m,} being x{m-1}x+.
+
+    @param nfa -- sub NFA of x, not used by anything else yet
+    @param m -- int
+    @param n -- int, or None for no max
+
+    @return -- sub NFA
+    """
+    if n == 0:
+        return char(empty)
+    if n is None and m == 0:
+        return kleene_star(nfa)
+
+    # every copy is made before the sub NFA is linked to anything
+    copies = [nfa] + [copy(nfa) for _ in range((n or m) - 1)]
 
-            init_state = State()
-            final_state = State()
+    tail = None
+    if n is None:
+        copies[-1] = plus(copies[-1])
+    else:
+        for _ in range(n - m):
+            x = copies.pop()
+            tail = optional(x if tail is None else concat(x, tail))
+
+    out = tail
+    for x in reversed(copies):
+        out = x if out is None else concat(x, out)
+    return out
 
-            final_state.add_in_link((init_state, tree.value))
-            init_state.add_out_link((final_state, tree.value))
 
-            nfa.append(init_state)
-            nfa.append(final_state)
+def check_repeat_size(tree):
+    """
+    Raise RegexError if the counted repetitions of a pattern expand it to more than MAX_REPEAT_SIZE char and range
+    labels, before any automaton is built. Each count is at most MAX_REPEAT, but nested counts multiply,
+    e.g. ((a{1000}){1000}){1000} would need 10^9 copies of a.
 
-            return nfa
+    @param tree -- ParseTree
+    """
+    # a sub-tree is measured as (labels once expanded, labels written in the pattern)
+    add = lambda x, y: (x[0] + y[0], x[1] + y[1])
+    same = lambda x: x
+    size = walk_tree(tree, lambda label: (1, 1), add, add, same, same, same, lambda x: (x[0], 0))
+
+    if size is not None and size[0] > max(MAX_REPEAT_SIZE, size[1]):
+        raise RegexError("counted repetition expands the pattern to more than {} labels".format(MAX_REPEAT_SIZE))
+
+
+def char_nfa(c):
+    """
+    Build a sub NFA for a single char, e.g. a -> s0--a-->s1
+
+    @param c -- str
+
+    @return list
+    """
+    init_state = State()
+    final_state = State()
+
+    final_state.add_in_link((init_state, c))
+    init_state.add_out_link((final_state, c))
+
+    return [init_state, final_state]
 
 
 def concat(nfa1, nfa2):
@@ -251,6 +521,38 @@ def create_or_branch(nfa1, nfa2):
     return [new_init_state] + nfa1 + nfa2 + [new_final_state]
 
 
+def optional(nfa):
+    """
+    Make a sub NFA optional with an epsilon link from its init to its final state.
+    Nothing links back into the init state of a sub NFA, so the link cannot be taken after reading input.
+
+    @param nfa -- list
+
+    @return list
+    """
+    nfa[0].add_out_link((nfa[-1], epsilon))
+    nfa[-1].add_in_link((nfa[0], epsilon))
+    return nfa
+
+
+def copy_nfa(nfa):
+    """
+    Copy a sub NFA that is not linked to any state outside it yet.
+
+    @param nfa -- list
+
+    @return list
+    """
+    copies = {state: State() for state in nfa}
+
+    for state in nfa:
+        for target, c in state.get_out_links():
+            copies[state].add_out_link((copies[target], c))
+            copies[target].add_in_link((copies[state], c))
+
+    return [copies[state] for state in nfa]
+
+
 def kleene_star(nfa):
     """
     Implement kleene star by creating new init and final states.
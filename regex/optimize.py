@@ -0,0 +1,280 @@
+from . import instrument
+from .nfa import empty, epsilon, epsilon_closure
+
+# removing epsilon links can multiply the links, e.g. every state of (a|b)*(a|b)*... links to all the later loops
+MAX_GROWTH = 4
+
+
+def remove_epsilons(nfa, budget=None):
+    """
+    Build an NFA without epsilon links accepting the same strings.
+    Only the initial state and the states entered by a char are kept: each takes over the char links
+    of every state in its epsilon closure, and accepts if its closure holds an accept state.
+
+    @param nfa -- CompactNFA
+    @param budget -- Budget charged for the closure states visited, or None
+
+    @return -- tuple (set of (state, linked state, char) links, set of accept states), in the state numbers of nfa,
+               or None if that would take more than MAX_GROWTH times as many links
+    """
+    num_states = nfa.get_num_states()
+    accepts = nfa.get_accepts()
+
+    eps_links = [[] for _ in range(num_states)]
+    char_links = [[] for _ in range(num_states)]
+    for a, b, c in nfa.links():
+        if c == epsilon or c == empty:
+            eps_links[a].append(b)
+        else:
+            char_links[a].append((b, c))
+
+    # a state whose only link is an epsilon link is skipped over, which keeps the closures short
+    # on the chains of final states that nested alternations and repeats leave behind
+    skip = [eps[0] if len(eps) == 1 and not char_links[n] and n not in accepts else n
+            for n, eps in enumerate(eps_links)]
+    for n in range(num_states):
+        path = {n}
+        m = n
+        while skip[m] not in path:
+            m = skip[m]
+            path.add(m)
+        for p in path:
+            skip[p] = m
+    eps_links = [[skip[b] for b in eps] for eps in eps_links]
+
+    kept = {0} if num_states else set()
+    for out in char_links:
+        kept.update(b for b, c in out)
+
+    links = set()
+    new_accepts = set()
+    allowed = MAX_GROWTH * (nfa.get_num_links() + num_states)
+    closure_states = largest = 0
+
+    for n in kept:
+        closure = epsilon_closure(eps_links, skip[n])
+        allowed -= len(closure)
+        closure_states += len(closure)
+        largest = max(largest, len(closure))
+        if allowed < 0 or len(links) > allowed:
+            return None
+        if budget is not None:
+            budget.charge(len(closure))
+        for m in closure:
+            if m in accepts:
+                new_accepts.add(n)
+            for b, c in char_links[m]:
+                links.add((n, b, c))
+
+    instrument.count(closure_states=closure_states, max_closure=largest)
+    return links, new_accepts
+
+
+def prune(links, accepts):
+    """
+    Drop the states that cannot be reached from the initial state 0 or cannot reach an accept state.
+
+    @param links -- set of (state, linked state, char) links
+    @param accepts -- set of accept states
+
+    @return -- tuple (links, accepts) between the remaining states; state 0 is always kept
+    """
+    forward = {}
+    backward = {}
+    for a, b, c in links:
+        forward.setdefault(a, []).append(b)
+        backward.setdefault(b, []).append(a)
+
+    reachable = reach({0}, forward)
+    useful = reach(accepts & reachable, backward) | {0}
+    live = reachable & useful
+
+    return ({(a, b, c) for a, b, c in links if a in live and b in live},
+            accepts & live)
+
+
+def reach(starts, graph):
+    """
+    @param starts -- set of states
+    @param graph -- dict, state -> list of linked states
+
+    @return -- set of states reachable from starts
+    """
+    seen = set(starts)
+    stack = list(starts)
+
+    while stack:
+        for n in graph.get(stack.pop(), ()):
+            if n not in seen:
+                seen.add(n)
+                stack.append(n)
+
+    return seen
+
+
+def merge_equivalent(links, accepts, budget=None):
+    """
+    Merge states that behave the same: same accept flag and, for every char, links into the same merged states.
+    The strongly connected components are visited from the end of the automaton back, so a state outside any loop
+    is merged as soon as its linked states are; the states of a loop are split into blocks by these signatures
+    until nothing changes (a bisimulation). Either way merging preserves the language.
+
+    @param links -- set of (state, linked state, char) links
+    @param accepts -- set of accept states
+    @param budget -- Budget charged for the states signed, or None
+
+    @return -- dict, state -> block number, with state 0 in block 0
+    """
+    states = {0} | {a for a, b, c in links} | {b for a, b, c in links} | accepts
+    out_links = {n: [] for n in states}
+    for a, b, c in links:
+        out_links[a].append((c, b))
+
+    block = {}
+    signatures = {}
+    num_blocks = 0
+
+    for component in strongly_connected(sorted(states), out_links):
+        n = component[0]
+        if budget is not None:
+            budget.charge(len(component))
+        if len(component) == 1 and all(b != n for c, b in out_links[n]):
+            signature = (n in accepts, frozenset((c, block[b]) for c, b in out_links[n]))
+            if signature not in signatures:
+                signatures[signature] = num_blocks
+                num_blocks += 1
+            block[n] = signatures[signature]
+            continue
+
+        local = refine(component, out_links, accepts, block, budget) if len(component) <= MAX_REFINE else \
+            {n: i for i, n in enumerate(component)}
+        for n, i in local.items():
+            block[n] = num_blocks + i
+        num_blocks += len(set(local.values()))
+
+    # renumber so the initial state's block is 0
+    order = {block[0]: 0}
+    for n in sorted(states):
+        order.setdefault(block[n], len(order))
+
+    return {n: order[b] for n, b in block.items()}
+
+
+# loops with more states than this are left as they are, as each round of refine() may only split one block
+MAX_REFINE = 1000
+
+
+def refine(component, out_links, accepts, block, budget=None):
+    """
+    Split the states of a strongly connected component into blocks of states that behave the same.
+
+    @param component -- list of states
+    @param out_links -- dict, state -> list of (char, linked state)
+    @param accepts -- set of accept states
+    @param block -- dict, block number of each state the component links out to
+    @param budget -- Budget charged for the states signed in each round, or None
+
+    @return -- dict, state of the component -> block number counted from 0
+    """
+    inside = set(component)
+    local = {n: 0 for n in component}
+    num_blocks = 1
+
+    while True:
+        if budget is not None:
+            budget.charge(len(component))
+        signatures = {}
+        new_local = {}
+        for n in component:
+            signature = (local[n], n in accepts,
+                         frozenset((c, b in inside, local[b] if b in inside else block[b]) for c, b in out_links[n]))
+            new_local[n] = signatures.setdefault(signature, len(signatures))
+
+        local = new_local
+        if len(signatures) == num_blocks:
+            return local
+        num_blocks = len(signatures)
+
+
+def strongly_connected(states, out_links):
+    """
+    Tarjan's algorithm without recursion.
+
+    @param states -- list of states
+    @param out_links -- dict, state -> list of (char, linked state)
+
+    @return -- list of strongly connected components, each a list of states,
+               every component coming after all the components it links to
+    """
+    index = {}
+    low = {}
+    on_stack = set()
+    stack = []
+    components = []
+
+    for root in states:
+        if root in index:
+            continue
+
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(out_links[root]))]
+
+        while work:
+            n, links = work[-1]
+            for c, b in links:
+                if b not in index:
+                    index[b] = low[b] = len(index)
+                    stack.append(b)
+                    on_stack.add(b)
+                    work.append((b, iter(out_links[b])))
+                    break
+                if b in on_stack:
+                    low[n] = min(low[n], index[b])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[n])
+                if low[n] == index[n]:
+                    component = []
+                    while True:
+                        m = stack.pop()
+                        on_stack.discard(m)
+                        component.append(m)
+                        if m == n:
+                            break
+                    components.append(component)
+
+    return components
+
+
+def simplify(nfa, budget=None):
+    """
+    Remove epsilon links, drop unreachable and dead states and merge equivalent states.
+
+    @param nfa -- CompactNFA
+    @param budget -- Budget charged as the work goes, or None
+
+    @return -- CompactNFA of the same class as nfa,
+               or nfa itself if it is empty or would grow too much without epsilon links
+    """
+    with instrument.stage('simplify'):
+        removed = remove_epsilons(nfa, budget) if nfa.get_num_states() else None
+        if removed is None:
+            instrument.count(unchanged=1)
+            return nfa
+
+        links, accepts = removed
+
+        links, accepts = prune(links, accepts)
+        block = merge_equivalent(links, accepts, budget)
+
+        merged_links = sorted({(block[a], block[b], c) for a, b, c in links})
+        merged_accepts = {block[n] for n in accepts}
+
+        simple = type(nfa).from_links(len(set(block.values())), merged_links, merged_accepts)
+        instrument.count(states=simple.get_num_states(), edges=simple.get_num_links())
+
+    return simple
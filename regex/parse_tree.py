@@ -1,4 +1,10 @@
-from itertools import chain
+from . import instrument
+from .errors import RegexError
+
+# largest count of a counted repetition such as a{2,5}, every repeat is a copy of the sub-automaton
+MAX_REPEAT = 1000
+# largest number of char and range labels counted repetitions may expand a pattern to, as nested counts multiply
+MAX_REPEAT_SIZE = 10000
 
 
 class ParseTree(object):
@@ -14,20 +20,34 @@ class ParseTree(object):
         self.children = []
 
     def __repr__(self, level=0):
-        if self.value is None:
-            output = "-" * level + "l{}".format(level) + "\n"
-        else:
-            output = "-" * level + self.value.strip() + "\n"
-
-        for child in self.children:
-            output += child.__repr__(level + 1)
+        lines = []
+        # explicit stack so deeply nested trees don't hit the recursion limit
+        stack = [(self, level)]
+
+        while stack:
+            node, depth = stack.pop()
+            if node.value is None:
+                lines.append("-" * depth + "l{}".format(depth))
+            else:
+                lines.append("-" * depth + node.value.strip())
+            stack.extend((child, depth + 1) for child in reversed(node.children))
 
-        return output
+        return "\n".join(lines) + "\n"
 
     def __iter__(self):
-        for v in chain(*map(iter, self.children)):
-            yield v
-        yield self.value
+        """
+        Iterates thru the node values in post-order.
+        """
+        stack = [(self, iter(self.children))]
+
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                stack.append((child, iter(child.children)))
+                break
+            else:
+                stack.pop()
+                yield node.value
 
 
 def build_tree(t):
@@ -38,25 +58,58 @@ def build_tree(t):
 
     @return -- ParseTree
     """
-    root = ParseTree(None)
+    with instrument.stage('build_tree'):
+        root = None
+        nodes = 0
+        # (list or str to build, node to add it to)
+        stack = [(t, None)]
+
+        while stack:
+            t, parent = stack.pop()
+            node = ParseTree(t if isinstance(t, str) else None)
+            nodes += 1
+
+            if parent is None:
+                root = node
+            else:
+                parent.children.append(node)
 
-    if isinstance(t, str):
-        root = ParseTree(t)
+            if t is not None and not isinstance(t, str):
+                children = []
+                for c in t:
+                    if c == '[':
+                        children.append(range_to_id(t))
+                        break
+                    else:
+                        children.append(c)
+                # pushed in reverse so the children are added in order
+                stack.extend((c, node) for c in reversed(children))
 
-    elif t is not None:
-        root = ParseTree(None)
-        for c in t:
-            if c is '[':
-                node = build_tree(range_to_id(t))
-                root.children.append(node)
-                break
-            else:
-                node = build_tree(c)
-                root.children.append(node)
+        instrument.count(nodes=nodes)
 
     return root
 
 
+def repeat_bounds(op):
+    """
+    Read the counts of a counted repetition operator.
+
+    @param op -- str, '{m}', '{m,n}', '{m,}' or '{,n}'
+
+    @return -- tuple (min count, max count or None if there is no max)
+    """
+    lo, comma, hi = op[1:-1].partition(',')
+    m = int(lo) if lo else 0
+    n = m if not comma else int(hi) if hi else None
+
+    if n is not None and m > n:
+        raise RegexError("min repeat {} greater than max repeat {}".format(m, n))
+    if max(m, n or 0) > MAX_REPEAT:
+        raise RegexError("repeat count greater than {}".format(MAX_REPEAT))
+
+    return m, n
+
+
 def range_to_id(t):
     """
     Unnest the elements of the range and concatenate them to a string.
@@ -66,12 +119,17 @@ def range_to_id(t):
 
     @return str
     """
-    ret = ""
+    chars = []
+    stack = [iter(t)]
 
-    for c in t:
-        while isinstance(c, list):
-            c = range_to_id(c)
-        if isinstance(c, str):
-            ret += c
+    while stack:
+        for c in stack[-1]:
+            if isinstance(c, list):
+                stack.append(iter(c))
+                break
+            if isinstance(c, str):
+                chars.append(c)
+        else:
+            stack.pop()
 
-    return ret
+    return "".join(chars)
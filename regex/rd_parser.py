@@ -0,0 +1,225 @@
+import re
+import string
+
+from . import instrument
+from .errors import ParseError, RegexError
+from .parse_tree import repeat_bounds
+
+# single char tokens, everything else is either ID or an error
+TOKENS = {
+    '*': 'ASTERIX',
+    '+': 'PLUS',
+    '?': 'QUESTION',
+    '(': 'LBRACKET',
+    ')': 'RBRACKET',
+    '|': 'OR',
+    '[': 'LBRACE',
+    ']': 'RBRACE',
+    '-': 'DASH',
+    '^': 'NOT',
+}
+
+ID_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.')
+# chars a backslash makes literal, an escaped char is an ID token holding the backslash
+ESCAPABLE = frozenset(string.punctuation)
+# counted repetition: {m}, {m,n}, {m,} or {,n}
+COUNT = re.compile(r'\{(?:[0-9]+(?:,[0-9]*)?|,[0-9]+)\}')
+
+
+def tokenize(s):
+    """
+    Split a pattern into the same tokens as the Regex lexer.
+    Like the PLY lexer, which is only run as the parser needs tokens, a char that starts no token is only
+    an error once the parser reaches it, so an earlier syntax error is reported first.
+
+    @param s -- str
+
+    @return -- list of (type, value, position) tuples, ending with an 'END' token,
+               or an 'ERROR' token whose value is the ParseError for the first char that starts no token
+    """
+    tokens = []
+    try:
+        _tokenize(s, tokens)
+    except ParseError as e:
+        tokens.append(('ERROR', e, e.pos))
+        return tokens
+
+    tokens.append(('END', None, len(s)))
+    return tokens
+
+
+def _tokenize(s, tokens):
+    pos = 0
+
+    while pos < len(s):
+        c = s[pos]
+        if c in ID_CHARS:
+            tokens.append(('ID', c, pos))
+        elif c == '\\':
+            if pos + 1 == len(s):
+                raise ParseError("trailing backslash", s, pos)
+            if s[pos + 1] not in ESCAPABLE:
+                raise ParseError("bad escape {!r}".format(s[pos:pos + 2]), s, pos)
+            tokens.append(('ID', s[pos:pos + 2], pos))
+            pos += 1
+        elif c == '{':
+            count = COUNT.match(s, pos)
+            if count is None:
+                raise ParseError("bad repeat count", s, pos)
+            try:
+                repeat_bounds(count.group())
+            except RegexError as e:
+                raise ParseError(str(e), s, pos)
+            tokens.append(('COUNT', count.group(), pos))
+            pos = count.end() - 1
+        elif s.startswith('[]', pos):
+            tokens.append(('EMPTY', '[]', pos))
+            pos += 1
+        elif c in TOKENS:
+            tokens.append((TOKENS[c], c, pos))
+        else:
+            raise ParseError("illegal character {!r}".format(c), s, pos)
+        pos += 1
+
+
+class RDParser(object):
+    """
+    Recursive descent parser for the Regex grammar.
+    Produces the same nested lists as Regex.run without importing PLY, and raises the same ParseErrors.
+    """
+
+    def __init__(self):
+        self._pattern = None
+        self._tokens = None
+        self._pos = 0
+
+    def run(self, s):
+        """
+        Run the parser on input s
+
+        @param s -- String input
+
+        @return -- list, the parse result
+        """
+        with instrument.stage('parse', s):
+            self._pattern = s
+            self._tokens = tokenize(s)
+            self._pos = 0
+
+            tree = [self.regex()]
+            self.expect('END')
+            instrument.count(tokens=len(self._tokens))
+
+        return tree
+
+    def peek(self):
+        kind, value, pos = self._tokens[self._pos]
+        if kind == 'ERROR':
+            raise value
+        return kind
+
+    def advance(self):
+        token = self._tokens[self._pos]
+        self._pos += 1
+        return token[1]
+
+    def expect(self, kind):
+        if self.peek() != kind:
+            self.fail()
+        return self.advance()
+
+    def fail(self):
+        kind, value, pos = self._tokens[self._pos]
+        if kind == 'END':
+            raise ParseError("unexpected end of pattern", self._pattern, pos)
+        raise ParseError("unexpected {!r}".format(value), self._pattern, pos)
+
+    def regex(self):
+        """
+        regex : regex OR expression
+              | expression
+        expression : expression expr
+                   | expr
+        expr : bracketexpr
+             | id
+        bracketexpr : LBRACKET regex RBRACKET symbol
+
+        Groups are parsed with an explicit stack rather than by recursion,
+        so the nesting depth is not limited by the recursion limit.
+        """
+        # per open group: (alternatives, expression and OR token before it, LBRACKET token)
+        groups = []
+        alternatives = expression = bar = None
+
+        while True:
+            if self.peek() == 'LBRACKET':
+                groups.append((alternatives, expression, bar, self.advance()))
+                alternatives = expression = bar = None
+                continue
+
+            item = [self.id()]
+            while True:
+                expression = [item] if expression is None else [expression, item]
+                if self.peek() in ('ID', 'LBRACE', 'EMPTY', 'LBRACKET'):
+                    break
+
+                alternatives = [expression] if alternatives is None else [alternatives, bar, expression]
+                expression = None
+                if self.peek() == 'OR':
+                    bar = self.advance()
+                    break
+                if not groups:
+                    return alternatives
+
+                rbracket = self.expect('RBRACKET')
+                inner = alternatives
+                alternatives, expression, bar, lbracket = groups.pop()
+                item = [[lbracket, inner, rbracket, self.symbol()]]
+
+    def id(self):
+        """
+        id : ID symbol
+           | range symbol
+           | EMPTY
+        """
+        kind = self.peek()
+        if kind == 'ID':
+            return [self.advance(), self.symbol()]
+        if kind == 'LBRACE':
+            return [self.range(), self.symbol()]
+        if kind == 'EMPTY':
+            return [self.advance()]
+        self.fail()
+
+    def range(self):
+        """
+        range : LBRACE not subranges RBRACE
+        """
+        lbrace = self.expect('LBRACE')
+        negate = [self.advance()] if self.peek() == 'NOT' else [None]
+        subranges = [self.subrange()]
+        while self.peek() == 'ID':
+            subranges = [subranges, self.subrange()]
+        return [lbrace, negate, subranges, self.expect('RBRACE')]
+
+    def subrange(self):
+        """
+        subrange : ID
+                 | ID DASH ID
+        """
+        lo = self.expect('ID')
+        if self.peek() == 'DASH':
+            return [lo, self.advance(), self.expect('ID')]
+        return [lo]
+
+    def symbol(self):
+        """
+        symbol : ASTERIX
+               | PLUS
+               | QUESTION
+               | COUNT
+               | empty
+        """
+        if self.peek() in ('ASTERIX', 'PLUS', 'QUESTION', 'COUNT'):
+            return [self.advance()]
+        return [None]
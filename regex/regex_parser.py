@@ -1,27 +1,61 @@
+from copy import copy
+from threading import Lock
+
 from ply import lex, yacc
 
+from . import instrument
+from .errors import ParseError
+
 
 class Parser(object):
     """
-    Base class for a lexer/parser
+    Base class for a lexer/parser.
+    The lexer and grammar tables are built once per class and shared,
+    each instance gets its own lexer and parser state so instances can be used from different threads.
     """
     tokens = ()
     precedence = ()
 
+    _built = {}
+    _build_lock = Lock()
+
     def __init__(self):
         self.tree = None
-        self.error = False
 
-        lex.lex(module=self)
-        yacc.yacc(module=self)
+        lexer, parser = self.build()
+        self._lexer = lexer.clone()
+        self._parser = copy(parser)
+        self._parser.errorfunc = self.p_error
+
+    @classmethod
+    def build(cls):
+        """
+        Build the lexer and the grammar tables for the class the first time they are needed.
+        Grammar actions are bound to a throwaway instance, so they must only use p.
+
+        @return -- tuple (lex.Lexer, yacc.LRParser)
+        """
+        with cls._build_lock:
+            if cls not in cls._built:
+                module = cls.__new__(cls)
+                cls._built[cls] = (lex.lex(module=module),
+                                   yacc.yacc(module=module, debug=False, write_tables=False, optimize=True))
+            return cls._built[cls]
 
     def run(self, s):
         """
         Run the parser on input s
 
         @param s -- String input
+
+        @return -- list, the parse result, raise ParseError if s has a syntax error
         """
-        yacc.parse(s)
+        self.tree = None
+
+        with instrument.stage('parse', s):
+            self.tree = self._parser.parse(s, lexer=self._lexer)
+
+        return self.tree
 
 
 class Regex(Parser):
@@ -30,6 +64,8 @@ class Regex(Parser):
         'ID',
         'ASTERIX',
         'PLUS',
+        'QUESTION',
+        'COUNT',
         'LBRACKET',
         'RBRACKET',
         'OR',
@@ -43,6 +79,8 @@ class Regex(Parser):
     # token definitions (using RE)
     t_ASTERIX = r'\*'
     t_PLUS = r'\+'
+    t_QUESTION = r'\?'
+    t_COUNT = r'\{([0-9]+(,[0-9]*)?|,[0-9]+)\}'
     t_LBRACKET = r'\('
     t_RBRACKET = r'\)'
     t_OR = r'\|'
@@ -53,7 +91,7 @@ class Regex(Parser):
 
     # define more complex tokens
     def t_ID(self, t):
-        r'[a-zA-Z0-9.]'
+        r'[a-zA-Z0-9.]|\\[!-/:-@[-`{-~]'
         t.type = 'ID'
         return t
 
@@ -63,12 +101,12 @@ class Regex(Parser):
         return t
 
     def t_error(self, t):
-        print("Illegal characters!")
-        t.lexer.skip(1)
+        # bound to the instance the lexer was built with, so the error is raised rather than flagged on self
+        raise ParseError("illegal character {!r}".format(t.value[0]), t.lexer.lexdata, t.lexpos)
 
     precedence = (
         ('left', 'OR'),
-        ('left', 'PLUS', 'ASTERIX'),
+        ('left', 'PLUS', 'ASTERIX', 'QUESTION', 'COUNT'),
         ('left', 'LBRACKET', 'RBRACKET')
     )
 
@@ -77,7 +115,7 @@ class Regex(Parser):
         """
         grammar : regex
         """
-        self.tree = p[1:]
+        p[0] = p[1:]
 
     def p_regex(self, p):
         """
@@ -145,6 +183,8 @@ class Regex(Parser):
         """
         symbol : ASTERIX
                | PLUS
+               | QUESTION
+               | COUNT
                | empty
         """
         p[0] = p[1:]
@@ -156,5 +196,7 @@ class Regex(Parser):
         p[0] = None
 
     def p_error(self, p):
-        self.error = True
-        print("Syntax error found!")
+        data = self._lexer.lexdata
+        if p is None:
+            raise ParseError("unexpected end of pattern", data, len(data))
+        raise ParseError("unexpected {!r}".format(p.value), data, p.lexpos)
@@ -0,0 +1,271 @@
+from threading import Lock
+
+from .dfa import DFA
+from .limits import CHECK_INTERVAL
+
+
+class SearchDFA(DFA):
+    """
+    Lazily built DFA finding where the leftmost-longest match of an NFA ends in a text.
+    A state holds the NFA states of the runs still alive, grouped by the position each run started at, earliest first,
+    and an NFA state only stays in the earliest group reaching it.
+    Until a match is found a new run starts at every char, as if the initial state looped on every char.
+    Once a group accepts, the later groups are dropped and no new runs start,
+    so the scan follows the leftmost match until it cannot grow any longer.
+    """
+
+    def __init__(self, nfa, max_states=1000):
+        """
+        @param nfa -- NFA or CompactNFA
+        @param max_states -- int, size of the state table before falling back to computing states on the fly
+        """
+        self._nfa = nfa
+        self.max_states = max_states
+        self._start_set = nfa.start_set()
+
+        # DFA state number -> (tuple of frozensets of NFA state numbers, whether a match was found), and the reverse
+        self._sets = []
+        self._index = {}
+        self._trans = []
+        self._accept = []
+
+        self.fallbacks = 0
+        self.lookups = 0
+        self.misses = 0
+        self._lock = Lock()
+
+        self._start = self._add_state(self._settle([], set(), False))
+        self._dead = self._add_state(((), True))
+
+    def _add_state(self, key):
+        if len(self._sets) >= self.max_states:
+            return None
+
+        n = len(self._sets)
+        self._sets.append(key)
+        self._index[key] = n
+        self._trans.append({})
+        self._accept.append(any(self._nfa.is_accepting(group) for group in key[0]))
+
+        return n
+
+    def _add_transition(self, state, c):
+        with self._lock:
+            key = self._next(self._sets[state], c)
+
+            target = self._index.get(key)
+            if target is None:
+                target = self._add_state(key)
+                if target is None:
+                    return None
+
+            self._trans[state][c] = target
+            self.misses += 1
+            return target
+
+    def _next(self, key, c):
+        """
+        @param key -- state key before c
+        @param c -- str
+
+        @return -- state key after c
+        """
+        groups, matched = key
+        seen = set()
+        out = []
+
+        for group in groups:
+            group = self._nfa.step(group, c).difference(seen)
+            if group:
+                out.append(group)
+                seen.update(group)
+
+        return self._settle(out, seen, matched)
+
+    def _settle(self, groups, seen, matched):
+        """
+        Start a new run unless a match was found, then drop the groups after the first accepting one.
+
+        @param groups -- list of frozensets
+        @param seen -- set, NFA states in groups
+        @param matched -- boolean
+
+        @return -- state key
+        """
+        if not matched:
+            group = self._start_set.difference(seen)
+            if group:
+                groups.append(group)
+
+        for i, group in enumerate(groups):
+            if self._nfa.is_accepting(group):
+                return tuple(groups[:i + 1]), True
+
+        return tuple(groups), matched
+
+    def search(self, s, pos=0, endpos=None, find=None, budget=None):
+        """
+        Find where the leftmost-longest match in s[pos:endpos] ends.
+
+        @param s -- str
+        @param pos -- int
+        @param endpos -- int, defaults to len(s)
+        @param find -- Prefilter finder over s for the literals a match starts with, or None
+        @param budget -- Budget limiting the call, or None
+
+        @return -- tuple (position no match starts before, end of the match), or None if there is no match
+        """
+        endpos = len(s) if endpos is None else endpos
+        trans, accept, start, dead = self._trans, self._accept, self._start, self._dead
+        state = start
+        lo = pos
+        end = pos if accept[state] else None
+        key = None
+        i = pos
+        # chars jumped over by the prefilter, which are not read
+        skipped = 0
+        # with a budget the scan stops every CHECK_INTERVAL positions to charge the chars read since the last stop
+        stop = endpos if budget is None else min(endpos, pos + CHECK_INTERVAL)
+        charged = 0
+
+        while True:
+            while i < stop:
+                if state == start:
+                    # every run alive started here, and with a prefilter no run can start before its next hit
+                    if find is not None:
+                        j = find(i)
+                        if j < 0 or j >= endpos:
+                            self.lookups += i - pos - skipped
+                            return None
+                        skipped += j - i
+                        i = j
+                    lo = i
+
+                c = s[i]
+                nxt = trans[state].get(c)
+                if nxt is None:
+                    nxt = self._add_transition(state, c)
+                    if nxt is None:
+                        key = self._next(self._sets[state], c)
+                        i += 1
+                        break
+                if nxt == dead:
+                    i += 1
+                    break
+                state = nxt
+                i += 1
+                if accept[state]:
+                    end = i
+            else:
+                if i < endpos:
+                    budget.charge(i - pos - skipped - charged)
+                    charged = i - pos - skipped
+                    stop = min(endpos, i + CHECK_INTERVAL)
+                    continue
+            break
+
+        if key is not None:
+            # the table is full, carry on without storing states
+            self.fallbacks += 1
+            first = i - 1
+            while True:
+                if any(self._nfa.is_accepting(group) for group in key[0]):
+                    end = i
+                if not key[0] or i >= endpos:
+                    break
+                if budget is not None:
+                    budget.charge(sum(map(len, key[0])))
+                key = self._next(key, s[i])
+                i += 1
+            self.misses += i - first
+
+        self.lookups += i - pos - skipped
+        return None if end is None else (lo, end)
+
+
+class Searcher(object):
+    """
+    Finds leftmost-longest matches in a text.
+    A forward SearchDFA finds where the match ends, then the DFA of the reversed pattern is run backwards
+    from there to find where it starts, so each search reads the text between its start position and the match
+    about twice and never restarts at every offset.
+    """
+
+    def __init__(self, nfa, reverse_dfa, prefix=None, required=None, max_states=1000):
+        """
+        @param nfa -- CompactNFA
+        @param reverse_dfa -- DFA or CompactDFA matching the reversed strings the NFA matches
+        @param prefix -- Prefilter for the literals every match starts with, or None
+        @param required -- Prefilter for the literals every match contains, or None
+        @param max_states -- int, size of the state table of the forward SearchDFA
+        """
+        self.forward = SearchDFA(nfa, max_states)
+        self.reverse = reverse_dfa
+        self.prefix = prefix
+        self.required = required
+
+    def search(self, s, pos=0, endpos=None, budget=None):
+        """
+        @param s -- str
+        @param pos -- int
+        @param endpos -- int, defaults to len(s)
+        @param budget -- Budget limiting the call, or None
+
+        @return -- tuple (start, end) of the leftmost-longest match in s[pos:endpos], or None if there is none
+        """
+        endpos = len(s) if endpos is None else endpos
+        if not self.may_match(s, pos, endpos):
+            return None
+
+        return self._search(s, pos, endpos, self.prefix.finder(s) if self.prefix is not None else None, budget)
+
+    def may_match(self, s, pos, endpos):
+        """
+        @return -- boolean, False if s[pos:endpos] lacks the literals every match contains
+        """
+        return self.required is None or 0 <= self.required.finder(s)(pos) < endpos
+
+    def _search(self, s, pos, endpos, find, budget=None):
+        """
+        @param find -- finder of the prefix Prefilter over s, reused between the searches of finditer
+
+        @return -- tuple (start, end) or None
+        """
+        found = self.forward.search(s, pos, endpos, find, budget)
+        if found is None:
+            return None
+
+        lo, end = found
+        length = self.reverse.match(s[lo:end][::-1], budget)
+        return end - length, end
+
+    def finditer(self, s, pos=0, endpos=None, budget=None):
+        """
+        @param s -- str, or bytes-like holding UTF-8 for a Searcher of a ByteNFA
+        @param pos -- int
+        @param endpos -- int, defaults to len(s)
+        @param budget -- Budget shared by all the searches, or None
+
+        @return -- generator of (start, end) spans of the non overlapping leftmost-longest matches,
+                   an empty match may directly follow a non empty one as with re.finditer
+        """
+        endpos = len(s) if endpos is None else endpos
+        find = self.prefix.finder(s) if self.prefix is not None else None
+        required = self.required.finder(s) if self.required is not None else None
+        utf8 = not isinstance(s, str)
+
+        while pos <= endpos:
+            # no match is left once the literals every match contains are not found after pos
+            if required is not None and not 0 <= required(pos) < endpos:
+                return
+            span = self._search(s, pos, endpos, find, budget)
+            if span is None:
+                return
+            yield span
+
+            start, end = span
+            pos = end if end > start else end + 1
+            if utf8:
+                # after an empty match skip to the next char, UTF-8 continuation bytes being 10xxxxxx
+                while pos < endpos and s[pos] & 0xc0 == 0x80:
+                    pos += 1
@@ -0,0 +1,357 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from .bitparallel import MAX_POSITIONS, BitParallelNFA
+from .compact_nfa import CompactNFA
+from .dfa import DFA, CompactDFA
+from .literals import Prefilter
+from .utf8 import ByteNFA
+
+# File layout, every section starts on a 4 byte boundary:
+#   header
+#   pattern         utf-8, or the pattern bytes with FLAG_BYTES
+#   labels          strings, the edge labels
+#   prefix          strings, the prefix literals, empty without a prefix Prefilter
+#   required        strings, the required literals, empty without a required Prefilter
+#   nfa accepts     one byte per NFA state
+#   nfa offsets     int32 per NFA state + 1, CompactNFA layout
+#   nfa targets     int32 per NFA link
+#   nfa labels      int32 per NFA link, label index or -1 for epsilon
+#   dfa classmap    256 bytes                                       (only with FLAG_DFA)
+#   dfa upper       int32 start of each class interval from 256 up  (only with FLAG_DFA)
+#   dfa classes     int32 class of each of those intervals          (only with FLAG_DFA)
+#   dfa accepts     one byte per DFA state                          (only with FLAG_DFA)
+#   dfa table       int32 per (state, class)                        (only with FLAG_DFA)
+#   bits labels     strings, the label of each position from 1 on  (only with FLAG_BIT_PARALLEL)
+#   bits classmap   256 bytes                                       (only with FLAG_BIT_PARALLEL)
+#   bits upper      int32 start of each class interval from 256 up  (only with FLAG_BIT_PARALLEL)
+#   bits classes    int32 class of each of those intervals          (only with FLAG_BIT_PARALLEL)
+#   bits sets       SET_SIZE bytes little endian per set of positions: the follow set of each position,
+#                   the mask of each class, then the final positions (only with FLAG_BIT_PARALLEL)
+# strings are each an int32 length followed by that many bytes, utf-8 or, for the literals of a bytes pattern,
+# the literal bytes, so labels and literals may hold any char
+# the class counts of the header are those of the DFA or of the bit-parallel automaton, whichever is stored
+MAGIC = b'RGXA'
+VERSION = 6
+
+FLAG_DFA = 1
+FLAG_BIG_ENDIAN = 2
+FLAG_BYTES = 4
+FLAG_BIT_PARALLEL = 8
+
+LENGTH = struct.Struct('=i')
+
+HEADER = struct.Struct('<4sHHIIIIIIIIIII')
+
+# bytes per set of positions, enough for the initial state and MAX_POSITIONS positions
+SET_SIZE = (MAX_POSITIONS + 8) // 8
+
+
+class FormatError(ValueError):
+    """
+    The data is not a compiled automaton this version can read.
+    """
+
+
+def _pad(n):
+    return -n % 4
+
+
+def dumps(compiled):
+    """
+    Serialise a compiled pattern.
+
+    @param compiled -- Pattern
+
+    @return -- bytes
+    """
+    nfa = compiled.nfa
+    if not isinstance(nfa, CompactNFA):
+        nfa = CompactNFA.from_nfa(nfa)
+    dfa = compiled.dfa if isinstance(compiled.dfa, CompactDFA) else None
+    bits = compiled.dfa if isinstance(compiled.dfa, BitParallelNFA) else None
+
+    flags = FLAG_BIG_ENDIAN if sys.byteorder == 'big' else 0
+    pattern = compiled.pattern
+    if isinstance(pattern, bytes):
+        flags |= FLAG_BYTES
+    else:
+        pattern = pattern.encode('utf-8')
+    label_blob = _strings(nfa.label_names)
+    prefix, required = [_literal_blob(getattr(compiled, name, None)) for name in ('prefix', 'required')]
+
+    sections = [pattern, label_blob, prefix, required, bytes(nfa.accept),
+                array('i', nfa.offsets).tobytes(), array('i', nfa.targets).tobytes(), array('i', nfa.labels).tobytes()]
+
+    if dfa is not None:
+        flags |= FLAG_DFA
+        sections += [bytes(dfa.classmap),
+                     array('i', dfa.upper_starts).tobytes(), array('i', dfa.upper_classes).tobytes(),
+                     bytes(dfa.accept), array('i', dfa.table).tobytes()]
+        num_classes, num_upper = dfa.num_classes, len(dfa.upper_starts)
+    elif bits is not None:
+        flags |= FLAG_BIT_PARALLEL
+        bits_blob = _strings(bits.labels)
+        sets = b''.join(x.to_bytes(SET_SIZE, 'little') for x in bits.follow + bits.masks + [bits.final])
+        sections += [bits_blob, bytes(bits.classmap),
+                     array('i', bits.upper_starts).tobytes(), array('i', bits.upper_classes).tobytes(), sets]
+        num_classes, num_upper = len(bits.masks), len(bits.upper_starts)
+    else:
+        num_classes = num_upper = 0
+
+    header = HEADER.pack(MAGIC, VERSION, flags, len(pattern), len(label_blob), len(prefix), len(required),
+                         nfa.get_num_states(), nfa.get_num_links(), dfa.get_num_states() if dfa else 0,
+                         len(bits_blob) if bits else 0, bits.get_num_states() if bits else 0, num_classes, num_upper)
+
+    out = bytearray(header)
+    for section in sections:
+        out += section
+        out += bytes(_pad(len(section)))
+
+    return bytes(out)
+
+
+def loads(buf):
+    """
+    Rebuild a compiled pattern from serialised data.
+    The NFA arrays and the DFA transition table are views on buf, not copies,
+    so a buffer mapped from a file keeps its table in the shared page cache.
+    Every state and class number in the tables is checked, so damaged data raises FormatError
+    rather than an IndexError or a wrong match later.
+
+    @param buf -- bytes-like
+
+    @return -- tuple (pattern str or bytes, CompactNFA or ByteNFA, CompactDFA, BitParallelNFA or DFA,
+                      prefix Prefilter or None, required Prefilter or None)
+    """
+    view = memoryview(buf)
+    if len(view) < HEADER.size:
+        raise FormatError("truncated header")
+
+    (magic, version, flags, pattern_len, labels_len, prefix_len, required_len, nfa_states, nfa_links,
+     dfa_states, bits_labels_len, positions, num_classes, num_upper) = HEADER.unpack_from(view)
+
+    if magic != MAGIC:
+        raise FormatError("not a compiled automaton")
+    if version != VERSION:
+        raise FormatError("unsupported format version {}".format(version))
+    if bool(flags & FLAG_BIG_ENDIAN) != (sys.byteorder == 'big'):
+        raise FormatError("written on a machine with a different byte order")
+
+    pos = HEADER.size
+
+    def section(size):
+        nonlocal pos
+        if pos + size > len(view):
+            raise FormatError("truncated data")
+        data = view[pos:pos + size]
+        pos += size + _pad(size)
+        return data
+
+    is_bytes = bool(flags & FLAG_BYTES)
+    pattern = section(pattern_len)
+    pattern = bytes(pattern) if is_bytes else _decode(pattern)
+    label_names = [_decode(name) for name in _split(section(labels_len))]
+    prefix = _prefilter(section(prefix_len), is_bytes)
+    required = _prefilter(section(required_len), is_bytes)
+    nfa_accepts = section(nfa_states)
+    offsets = section((nfa_states + 1) * 4).cast('i')
+    targets = section(nfa_links * 4).cast('i')
+    labels = section(nfa_links * 4).cast('i')
+
+    if offsets[0] != 0 or offsets[-1] != nfa_links or \
+            any(offsets[i] > offsets[i + 1] for i in range(nfa_states)):
+        raise FormatError("bad NFA link offsets")
+    _check_range(targets, 0, nfa_states, "NFA link target")
+    _check_range(labels, -1, len(label_names), "NFA link label")
+
+    nfa = (ByteNFA if is_bytes else CompactNFA)(offsets, targets, labels, label_names, nfa_accepts)
+
+    if flags & FLAG_DFA:
+        classmap = section(256)
+        upper_starts = section(num_upper * 4).cast('i')
+        upper_classes = section(num_upper * 4).cast('i')
+        accept = section(dfa_states)
+        table = section(dfa_states * num_classes * 4).cast('i')
+
+        if dfa_states < 1:
+            raise FormatError("DFA without states")
+        _check_classes(classmap, upper_starts, upper_classes, num_classes, "DFA")
+        _check_range(table, -1, dfa_states, "DFA state")
+
+        dfa = CompactDFA.from_tables(classmap, upper_starts, upper_classes, num_classes, table, accept)
+    elif flags & FLAG_BIT_PARALLEL:
+        bits_labels = [_decode(label) for label in _split(section(bits_labels_len))]
+        classmap = section(256)
+        upper_starts = section(num_upper * 4).cast('i')
+        upper_classes = section(num_upper * 4).cast('i')
+        sets = section((positions + num_classes + 1) * SET_SIZE)
+
+        if not 1 <= positions <= MAX_POSITIONS + 1 or len(bits_labels) != positions - 1:
+            raise FormatError("bad number of positions")
+        _check_classes(classmap, upper_starts, upper_classes, num_classes, "bit-parallel")
+        sets = [int.from_bytes(sets[i:i + SET_SIZE], 'little') for i in range(0, len(sets), SET_SIZE)]
+        if max(sets) >> positions:
+            raise FormatError("position out of range")
+
+        dfa = BitParallelNFA.from_tables(bits_labels, sets[:positions], sets[-1], classmap, upper_starts,
+                                         upper_classes, sets[positions:-1])
+    else:
+        dfa = DFA(nfa)
+
+    return pattern, nfa, dfa, prefix, required
+
+
+def _check_classes(classmap, upper_starts, upper_classes, num_classes, name):
+    if len(upper_starts) < 1 or upper_starts[0] != 256 or \
+            any(upper_starts[i] >= upper_starts[i + 1] for i in range(len(upper_starts) - 1)):
+        raise FormatError("bad {} class intervals".format(name))
+    _check_range(classmap, 0, num_classes, "{} class".format(name))
+    _check_range(upper_classes, 0, num_classes, "{} class".format(name))
+
+
+def _check_range(values, lo, hi, name):
+    if len(values) and (min(values) < lo or max(values) >= hi):
+        raise FormatError("{} out of range".format(name))
+
+
+def _decode(data):
+    try:
+        return str(data, 'utf-8')
+    except UnicodeDecodeError:
+        raise FormatError("bad utf-8 string")
+
+
+def _strings(items):
+    """
+    @param items -- iterable of str or bytes
+
+    @return -- bytes, each item's length followed by the item, str items encoded as utf-8
+    """
+    out = bytearray()
+    for item in items:
+        if isinstance(item, str):
+            item = item.encode('utf-8')
+        out += LENGTH.pack(len(item))
+        out += item
+    return bytes(out)
+
+
+def _split(blob):
+    """
+    @param blob -- memoryview of strings written by _strings()
+
+    @return -- list of memoryview, the items
+    """
+    items = []
+    pos = 0
+    while pos < len(blob):
+        if pos + LENGTH.size > len(blob):
+            raise FormatError("truncated string")
+        size, = LENGTH.unpack_from(blob, pos)
+        pos += LENGTH.size
+        if size < 0 or pos + size > len(blob):
+            raise FormatError("truncated string")
+        items.append(blob[pos:pos + size])
+        pos += size
+    return items
+
+
+def _literal_blob(prefilter):
+    if prefilter is None:
+        return b''
+    return _strings(prefilter.literals)
+
+
+def _prefilter(blob, is_bytes):
+    literals = [bytes(item) if is_bytes else _decode(item) for item in _split(blob)]
+    if not literals:
+        return None
+    if not all(literals):
+        raise FormatError("empty literal")
+    return Prefilter(literals)
+
+
+def load(path):
+    """
+    Map a serialised pattern file read-only and rebuild the pattern from it.
+
+    @param path -- str
+
+    @return -- tuple as returned by loads()
+    """
+    with open(path, 'rb') as f:
+        # the mapping stays valid after the file is closed
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return loads(buf)
+
+
+def dump(compiled, path):
+    """
+    Write a serialised pattern, replacing any existing file atomically.
+
+    @param compiled -- Pattern
+    @param path -- str
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(dumps(compiled))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class DiskCache(object):
+    """
+    Directory of serialised patterns, one file per pattern named after a hash of the pattern and its type.
+    """
+
+    def __init__(self, directory):
+        """
+        @param directory -- str, created if it does not exist
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, pattern):
+        """
+        @param pattern -- str or bytes
+
+        @return -- str, file the pattern is stored in
+        """
+        # a bytes pattern gets a different file from the str pattern of the same text
+        data = b'b' + pattern if isinstance(pattern, bytes) else b's' + pattern.encode('utf-8')
+        key = hashlib.sha256(data).hexdigest()
+        return os.path.join(self.directory, '{}.v{}.rgx'.format(key, VERSION))
+
+    def load(self, pattern):
+        """
+        @param pattern -- str or bytes
+
+        @return -- tuple as returned by loads(), or None if the pattern is not stored
+        """
+        try:
+            loaded = load(self.path(pattern))
+        except (OSError, ValueError):
+            # missing, unreadable, damaged or stale files are treated as a miss and overwritten by store()
+            return None
+
+        if loaded[0] != pattern:
+            return None
+        return loaded
+
+    def store(self, compiled):
+        """
+        @param compiled -- Pattern
+        """
+        dump(compiled, self.path(compiled.pattern))
@@ -0,0 +1,179 @@
+import codecs
+import mmap
+import os
+
+from .compiler import MAX_COMPACT_STATES, compile
+from .dfa import CompactDFA
+from .errors import StateLimitError
+
+CHUNK_SIZE = 1 << 16
+
+
+class LineScanner(object):
+    """
+    Unanchored automaton for a pattern that can be fed a line piece by piece,
+    reporting as soon as the line contains a match.
+    States are CompactDFA state numbers, or sets of NFA states when the DFA would be too large.
+    """
+
+    def __init__(self, pattern, nfa, dfa, prefix=None, required=None):
+        """
+        @param pattern -- str, or bytes for a pattern matching UTF-8 encoded bytes, the source pattern
+        @param nfa -- NFA, or ByteNFA for a bytes pattern, unanchored
+        @param dfa -- CompactDFA built from nfa, or None to run the NFA directly
+        @param prefix -- Prefilter, kept along with the scanner when it is serialised
+        @param required -- Prefilter for the literals every match contains, lines without one are skipped
+        """
+        self.pattern = pattern
+        self.nfa = nfa
+        self.dfa = dfa
+        self.prefix = prefix
+        self.required = required
+        self.start = 0 if dfa is not None else nfa.start_set()
+
+    @classmethod
+    def from_pattern(cls, pattern):
+        """
+        @param pattern -- Pattern
+
+        @return -- LineScanner
+        """
+        nfa = pattern.nfa.unanchored()
+
+        try:
+            dfa = CompactDFA(nfa, max_states=MAX_COMPACT_STATES)
+        except StateLimitError:
+            dfa = None
+
+        return cls(pattern.pattern, nfa, dfa, pattern.prefix, pattern.required)
+
+    def accepting(self, state):
+        """
+        @param state -- scanner state
+
+        @return -- boolean
+        """
+        if self.dfa is None:
+            return self.nfa.is_accepting(state)
+        return bool(self.dfa.accept[state])
+
+    def advance(self, state, s):
+        """
+        Feed the next piece of a line, stopping at the first match.
+
+        @param state -- scanner state before s
+        @param s -- str, or bytes for a bytes pattern
+
+        @return -- tuple (scanner state after s, whether a match was found)
+        """
+        if self.dfa is None:
+            nfa = self.nfa
+            for c in s:
+                state = nfa.step(state, c)
+                if nfa.is_accepting(state):
+                    return state, True
+            return state, False
+
+        dfa = self.dfa
+        table, classmap, char_class, n, accept = dfa.table, dfa.classmap, dfa.char_class, dfa.num_classes, dfa.accept
+
+        # the initial state loops on every char, so the unanchored DFA has no dead state
+        for o in s if isinstance(s, bytes) else map(ord, s):
+            state = table[state * n + (classmap[o] if o < 256 else char_class(o))]
+            if accept[state]:
+                return state, True
+
+        return state, False
+
+
+def search_stream(pattern, source, chunk_size=CHUNK_SIZE, use_mmap=True):
+    """
+    Find the lines of a byte stream that contain a match, reading it chunk by chunk.
+    The automaton state is carried across chunk boundaries, so only the current line is held in memory.
+
+    @param pattern -- str, bytes or Pattern
+    @param source -- path of a file, or binary file object
+    @param chunk_size -- int, bytes read at a time
+    @param use_mmap -- boolean, map files opened by path instead of reading them
+
+    @return -- generator of (byte offset of the line, line bytes without its newline)
+    """
+    if isinstance(pattern, (str, bytes)):
+        pattern = compile(pattern)
+    scanner = pattern.line_scanner
+
+    if not isinstance(source, (str, bytes, os.PathLike)):
+        yield from search_chunks(scanner, iter(lambda: source.read(chunk_size), b''))
+        return
+
+    with open(source, 'rb') as f:
+        if use_mmap and os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                chunks = (mm[i:i + chunk_size] for i in range(0, len(mm), chunk_size))
+                yield from search_chunks(scanner, chunks)
+        else:
+            yield from search_chunks(scanner, iter(lambda: f.read(chunk_size), b''))
+
+
+def search_chunks(scanner, chunks, offset=0):
+    """
+    @param scanner -- LineScanner
+    @param chunks -- iterable of bytes
+    @param offset -- int, byte offset of the first chunk
+
+    @return -- generator of (byte offset of the line, line bytes without its newline)
+    """
+    # a bytes pattern reads the bytes themselves, a str pattern the decoded text
+    decoder = codecs.getincrementaldecoder('utf-8')('replace') if isinstance(scanner.pattern, str) else None
+    line_start = offset
+    pieces = []
+    state = scanner.start
+    matched = scanner.accepting(state)
+    prefilter = scanner.required.encode() if scanner.required is not None else None
+
+    for chunk in chunks:
+        pos = 0
+        find = prefilter.finder(chunk) if prefilter is not None else None
+
+        while pos < len(chunk):
+            if find is not None and not pieces:
+                # whole lines before the next required literal cannot match, literals never span lines
+                hit = find(pos)
+                skip = chunk.rfind(b'\n', pos, hit if hit >= 0 else len(chunk)) + 1
+                if skip > pos:
+                    pos = skip
+                    line_start = offset + pos
+                    if pos == len(chunk):
+                        break
+
+            newline = chunk.find(b'\n', pos)
+            end = newline if newline >= 0 else len(chunk)
+
+            piece = chunk[pos:end]
+            pieces.append(piece)
+            # once a line has matched the rest of it only needs to be collected
+            if not matched:
+                state, matched = scanner.advance(state, decoder.decode(piece) if decoder is not None else piece)
+
+            if newline < 0:
+                break
+
+            if matched:
+                yield line_start, b''.join(pieces)
+
+            line_start = offset + newline + 1
+            pieces = []
+            if decoder is not None:
+                decoder.reset()
+            state = scanner.start
+            matched = scanner.accepting(state)
+            pos = newline + 1
+
+        offset += len(chunk)
+
+    # last line without a trailing newline
+    if line_start < offset:
+        if not matched and decoder is not None:
+            state, matched = scanner.advance(state, decoder.decode(b'', final=True))
+        if matched:
+            yield line_start, b''.join(pieces)
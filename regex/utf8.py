@@ -0,0 +1,136 @@
+from functools import lru_cache
+
+from .charset import charset
+from .compact_nfa import CompactNFA
+from .nfa import empty, epsilon
+
+# last code point encoded in 1, 2 and 3 bytes
+LENGTH_LIMITS = (0x7f, 0x7ff, 0xffff)
+# code points UTF-8 cannot encode
+SURROGATES = (0xd800, 0xdfff)
+
+
+class ByteNFA(CompactNFA):
+    """
+    CompactNFA over the bytes of UTF-8 encoded text.
+    Its labels only hold chars below 256, each standing for the byte of that value,
+    and it steps over a byte given either as an int, as iterating bytes gives, or as such a char.
+    """
+
+    __slots__ = ()
+
+    def prepare(self):
+        CompactNFA.prepare(self)
+        self._matchers = [None if name == empty else byte_matcher(name) for name in self.label_names]
+
+
+@lru_cache(maxsize=1024)
+def byte_matcher(label):
+    """
+    @param label -- str, byte label
+
+    @return -- function telling whether a byte, as an int or a char, is in the label
+    """
+    chars = charset(label)
+    values = [b for b in range(256) if chr(b) in chars]
+    return frozenset(values + [chr(b) for b in values]).__contains__
+
+
+def utf8_sequences(lo, hi):
+    """
+    Split a range of code points, without surrogates, into ranges whose UTF-8 encodings are every combination
+    of a range of bytes at each position, e.g. U+0080 to U+07FF is [C2-DF][80-BF].
+
+    @param lo -- int, first code point
+    @param hi -- int, last code point
+
+    @return -- list of tuples of (first byte, last byte), one per byte of the encodings, in code point order
+    """
+    sequences = []
+    stack = [(lo, hi)]
+
+    while stack:
+        lo, hi = stack.pop()
+
+        # encodings of different lengths are split apart first
+        split = next((limit for limit in LENGTH_LIMITS if lo <= limit < hi), None)
+        if split is not None:
+            stack += [(split + 1, hi), (lo, split)]
+            continue
+
+        # then ranges whose continuation bytes do not all run from 80 to BF
+        for i in range(1, 4):
+            mask = (1 << 6 * i) - 1
+            if lo & ~mask != hi & ~mask:
+                if lo & mask:
+                    stack += [((lo | mask) + 1, hi), (lo, lo | mask)]
+                    break
+                if hi & mask != mask:
+                    stack += [(hi & ~mask, hi), (lo, (hi & ~mask) - 1)]
+                    break
+        else:
+            sequences.append(tuple(zip(chr(lo).encode('utf-8'), chr(hi).encode('utf-8'))))
+
+    return sequences
+
+
+@lru_cache(maxsize=1024)
+def label_sequences(label):
+    """
+    @param label -- str, edge label
+
+    @return -- tuple of the byte range sequences encoding the chars of the label
+    """
+    sequences = []
+    for lo, hi in charset(label):
+        for lo, hi in ((lo, min(hi, SURROGATES[0] - 1)), (max(lo, SURROGATES[1] + 1), hi)):
+            if lo <= hi:
+                sequences += utf8_sequences(lo, hi)
+    return tuple(sequences)
+
+
+def byte_label(lo, hi):
+    """
+    @param lo -- int, first byte
+    @param hi -- int, last byte
+
+    @return -- str, edge label of the bytes as the chars of the same value
+    """
+    if lo == hi:
+        return '\\.' if lo == ord('.') else chr(lo)
+    return '[{}-{}]'.format(*('\\' + c if c in '\\-^' else c for c in (chr(lo), chr(hi))))
+
+
+def to_byte_nfa(nfa):
+    """
+    Build the NFA reading the UTF-8 encodings of the strings an NFA matches, one byte at a time.
+    Every char link becomes a tree of byte links, through new states, spelling the encodings of the chars
+    of its label, with the sequences starting with the same byte ranges sharing their first links.
+    Bytes that are not valid UTF-8 never match.
+
+    @param nfa -- CompactNFA
+
+    @return -- ByteNFA, its states numbered as in nfa, followed by the new ones
+    """
+    num_states = nfa.get_num_states()
+    links = []
+
+    for a, b, c in nfa.links():
+        if c == epsilon or c == empty:
+            links.append((a, b, c))
+            continue
+
+        # (state, byte label) -> state the link leads to, for the links shared by the sequences of this label
+        inner = {}
+        for sequence in label_sequences(c):
+            state = a
+            for lo, hi in sequence[:-1]:
+                key = state, byte_label(lo, hi)
+                if key not in inner:
+                    inner[key] = num_states
+                    links.append((state, num_states, key[1]))
+                    num_states += 1
+                state = inner[key]
+            links.append((state, b, byte_label(*sequence[-1])))
+
+    return ByteNFA.from_links(num_states, links, nfa.get_accepts())
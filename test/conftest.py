@@ -0,0 +1,2 @@
+# test_parser.py is an interactive script reading patterns from stdin, not a pytest module
+collect_ignore = ['test_parser.py']
@@ -1,40 +1,35 @@
 import sys
-import re
 
 if ".." not in sys.path: sys.path.insert(0,"..")
 
-from regex.parse_tree import build_tree
-from regex.regex_parser import Regex
-from regex.nfa import NFA
+from regex import RegexError, compile, match_many
 from regex.app import RegexApp, create_nfa
-
-parser = Regex()
+from regex.compiler import parse
+from regex.nfa import NFA
 
 while 1:
     try:
         input_expression = input("RE:\n>> ")
-        parser.run(input_expression)
 
-        if not parser.error:
-            tree = build_tree(parser.tree)
-            #print(tree)
-            #print(list(iter(tree)))
-            nfa = NFA(tree)
-            #print(nfa)
+        try:
+            pattern = compile(input_expression)
+        except RegexError as e:
+            print(str(e))
+            pattern = None
+
+        if pattern is not None:
+            #print(pattern.nfa)
 
-            test_str = input("Test:\n>> ")
-            p = re.compile(input_expression)
-            m = p.match(test_str)
+            test_strs = input("Test:\n>> ").split() or ['']
 
-            if m is None:
-                print("Reject.")
-            elif m.group() is test_str:
-                print("Accept.")
-            else:
-                print("Reject.")
+            for test_str, accepted in zip(test_strs, match_many(pattern, test_strs)):
+                if accepted:
+                    print("Accept: {}".format(test_str))
+                else:
+                    print("Reject: {}".format(test_str))
         
             app = RegexApp()
-            create_nfa(app, nfa)
+            create_nfa(app, NFA(parse(input_expression)))
             app.mainloop()
     except EOFError:
         break
@@ -0,0 +1,70 @@
+import asyncio
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+import pytest
+
+from regex import compile, purge
+from regex.aio import AsyncMatcher, find_lines
+from regex.compiler import cached
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def collect(spans):
+    return [span async for span in spans]
+
+
+async def stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.mark.parametrize('min_offload', [0, 1 << 20])
+def test_calls(min_offload):
+    # with min_offload 0 every call runs on the thread pool, otherwise on the event loop
+    matcher = AsyncMatcher(min_offload=min_offload)
+    pattern = compile('a(b|c)*')
+
+    assert run(matcher.amatch(pattern, 'abcbx')) == 4
+    assert run(matcher.afullmatch('a(b|c)*', 'abcb'))
+    assert run(matcher.asearch(pattern, 'xxabx')) == (2, 4)
+    assert list(run(matcher.amatch_many(pattern, ['a', 'ab', 'b']))) == [True, True, False]
+    assert run(collect(matcher.afinditer(pattern, 'ab ac a'))) == list(pattern.finditer('ab ac a'))
+
+
+def test_stream_spans_are_byte_offsets():
+    matcher = AsyncMatcher()
+    text = 'é ab\nxx ab\ndéab'
+    chunks = [text.encode()[i:i + 3] for i in range(0, len(text.encode()), 3)]
+
+    spans = run(collect(matcher.afinditer('ab', stream(chunks))))
+    assert spans == [(3, 5), (9, 11), (15, 17)]
+    assert all(text.encode()[start:end] == b'ab' for start, end in spans)
+
+
+def test_find_lines_long_line():
+    line = 'éab' * 10000
+    spans = find_lines('ab', line.encode() + b'\n', 100)
+    assert len(spans) == 10000
+    assert spans[:2] == [(102, 104), (106, 108)] and spans[-1] == (100 + 4 * 10000 - 2, 100 + 4 * 10000)
+
+
+def test_process_pool_compile_is_cached():
+    purge()
+    with ProcessPoolExecutor(1) as executor:
+        matcher = AsyncMatcher(executor)
+        compiled = run(matcher.acompile('(ab)+c'))
+        assert compiled.fullmatch('ababc')
+        assert cached('(ab)+c') is compiled
+        assert run(matcher.acompile('(ab)+c')) is compiled
+        assert run(matcher.asearch('(ab)+c', 'x' * 5000 + 'abc')) == (5000, 5003)
+    purge()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
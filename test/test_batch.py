@@ -0,0 +1,63 @@
+import sys
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+import pytest
+
+from regex import batch, compile, match_many
+from regex.dfa import CompactDFA
+
+STRINGS = ['', 'a', 'ab', 'abc', 'abcabc', 'ac', 'bca', 'aé', 'é', 'a\U0001f600c', 'abcabcabcabcabcabc', 'x' * 50,
+           'abc' * 20 + 'a', 'cab', 'aaaaaaaab']
+
+
+def expected(pattern, strings):
+    compiled = compile(pattern)
+    return [compiled.fullmatch(s) for s in strings]
+
+
+@pytest.mark.parametrize('pattern', ['(abc)*', 'a[^b]*c?', '(a|b)*a(a|b){14}', '.*b'])
+def test_match_many(pattern):
+    assert [bool(x) for x in match_many(pattern, STRINGS)] == expected(pattern, STRINGS)
+    assert [bool(x) for x in match_many(compile(pattern), iter(STRINGS))] == expected(pattern, STRINGS)
+
+
+def test_blocks():
+    strings = ['ab' * (i % 37) + 'c' * (i % 3) for i in range(2 * batch.BLOCK_SIZE + 5)]
+    assert isinstance(compile('(ab)*c?').dfa, CompactDFA)
+    assert [bool(x) for x in match_many('(ab)*c?', strings)] == expected('(ab)*c?', strings)
+
+
+def test_skewed_lengths(monkeypatch):
+    widths = []
+    match_columns = batch.match_columns
+
+    def recording(dfa, strings):
+        widths.append(len(strings[0]))
+        return match_columns(dfa, strings)
+
+    monkeypatch.setattr(batch, 'match_columns', recording)
+
+    # a few very long strings among many short ones are matched one by one instead of padding the block
+    strings = ['ab' * 20000, 'ab' * 20000 + 'x', 'ab' * 300 + 'c']
+    strings += ['ab' * (i % 5) + 'c' * (i % 2) for i in range(5000)]
+    assert [bool(x) for x in match_many('(ab)*c?', strings)] == expected('(ab)*c?', strings)
+    assert widths and max(widths) <= batch.MIN_WIDTH
+
+
+def test_without_numpy(monkeypatch):
+    monkeypatch.setattr(batch, 'np', None)
+    monkeypatch.setattr(batch, '_np_loaded', True)
+
+    results = match_many('(abc)*', STRINGS)
+    assert isinstance(results, bytearray)
+    assert [bool(x) for x in results] == expected('(abc)*', STRINGS)
+    assert match_many('(abc)*', []) == bytearray()
+
+
+def test_empty():
+    assert len(match_many('a', [])) == 0
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,115 @@
+import io
+import itertools
+import sys
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+import pytest
+
+from regex import RegexError, batch, compile, match_many, search_stream
+from regex.aio import find_lines
+from regex.dfa import CompactDFA
+from regex.utf8 import ByteNFA
+
+PATTERNS = ['a', '[^a]+', '.b', '(a|.)*c', '[^ab]', 'b(.|\\.)?', '(a|b)*a(a|b)', '[a-c]*']
+CHARS = ['a', 'b', 'c', 'é', '€', '\U0001f600']
+
+
+def byte_span(s, span):
+    if span is None:
+        return None
+    return tuple(len(s[:i].encode('utf-8')) for i in span)
+
+
+def inputs(max_length=4):
+    for length in range(max_length + 1):
+        for chars in itertools.product(CHARS, repeat=length):
+            yield ''.join(chars)
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_bytes_match_str(pattern):
+    text = compile(pattern)
+    data = compile(pattern.encode('utf-8'))
+    assert isinstance(data.nfa, ByteNFA)
+
+    for s in inputs():
+        b = s.encode('utf-8')
+        end = text.match(s)
+        for value in [b, bytearray(b), memoryview(b)]:
+            assert data.fullmatch(value) == text.fullmatch(s), s
+            assert data.match(value) == (len(s[:end].encode('utf-8')) if end is not None else None), s
+        assert data.search(b) == byte_span(s, text.search(s)), s
+        assert list(data.finditer(memoryview(b))) == [byte_span(s, span) for span in text.finditer(s)], s
+
+
+@pytest.mark.parametrize('data, pattern, expected', [
+    (b'\xff', '[^a]', None),
+    (b'\xc3', '.', None),
+    (b'\xc3\xa9', '.', (0, 2)),
+    # overlong encoding of '/' and an encoded surrogate
+    (b'\xc0\xaf', '[^a]+', None),
+    (b'\xed\xa0\x80', '[^a]+', None),
+    (b'\xffab\xfe', '[^x]+', (1, 3)),
+    (b'\xe2\x82\xac\xe2\x82', '[^x]+', (0, 3)),
+    (b'\x80\x80a', '.', (2, 3)),
+])
+def test_invalid_utf8_never_matches(data, pattern, expected):
+    assert compile(pattern.encode()).search(data) == expected
+
+
+def test_empty_matches_skip_whole_chars():
+    assert list(compile(b'x*').finditer('aé'.encode())) == [(0, 0), (1, 1), (3, 3)]
+
+
+@pytest.mark.parametrize('pattern', ['[^a]+c', '(a|b)*a(a|b){7}'])
+@pytest.mark.parametrize('numpy', [True, False])
+def test_match_many(pattern, numpy, monkeypatch):
+    if not numpy:
+        monkeypatch.setattr(batch, 'np', None)
+        monkeypatch.setattr(batch, '_np_loaded', True)
+    compiled = compile(pattern.encode())
+    strings = [s.encode('utf-8') for s in inputs(3)] + [b'\xffc', b'\xc3c', b'ab' * 500 + b'ac']
+
+    found = match_many(compiled, [bytearray(s) for s in strings])
+    assert [bool(x) for x in found] == [compiled.fullmatch(s) for s in strings]
+    assert [bool(x) for x in match_many(pattern.encode(), strings)] == [compiled.fullmatch(s) for s in strings]
+
+
+def test_match_many_types():
+    assert isinstance(compile(b'[^a]+c').dfa, CompactDFA)
+    with pytest.raises(TypeError):
+        match_many(b'a', ['a'])
+    with pytest.raises(TypeError):
+        match_many('a', [b'a'])
+
+
+def test_search_stream():
+    lines = ['abc', 'xé€c', '', '\U0001f600cé', 'none']
+    data = '\n'.join(lines).encode('utf-8') + b'\n\xffc\n\xc3\n'
+    # the required literal of the bytes pattern is bytes already
+    compiled = compile(b'(.|b)c')
+    assert compiled.required is not None
+
+    for chunk_size in [1, 3, 1 << 16]:
+        found = list(search_stream(compiled, io.BytesIO(data), chunk_size))
+        assert found == [(0, b'abc'), (4, 'xé€c'.encode()), (13, '\U0001f600cé'.encode())]
+        # a lone byte that is not UTF-8 is not a char
+        assert list(search_stream(b'[^a]c', io.BytesIO(data), chunk_size)) == found
+
+
+def test_find_lines():
+    data = 'xé€c\nbc\n'.encode('utf-8') + b'\xffc\n'
+    # spans are byte offsets, and the lone \xff byte is not a char
+    assert find_lines(b'[^a]c', data, 10) == [(13, 17), (18, 20)]
+    assert find_lines(compile(b'bc'), data) == [(8, 10)]
+    assert find_lines(b'zz', data) == []
+
+
+def test_invalid_pattern():
+    with pytest.raises(RegexError):
+        compile(b'a\xff')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,77 @@
+import sys
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+import pytest
+
+from regex import Limits, ParseError, cache_info, compile, compiler, purge, set_cache_size, set_parser
+from regex.compiler import cached
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    backend = compiler._parser_backend
+    purge()
+    yield
+    set_cache_size(128)
+    set_parser(backend)
+    purge()
+
+
+def test_hits_and_misses():
+    first = compile('a(b|c)*')
+    assert cache_info().misses == 1 and cache_info().hits == 0
+
+    assert compile('a(b|c)*') is first
+    assert cached('a(b|c)*') is first
+    info = cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+    purge()
+    assert cache_info() == (0, 0, 0, 128, 0)
+    assert compile('a(b|c)*') is not first
+
+
+def test_evictions():
+    set_cache_size(2)
+    compile('a')
+    compile('b')
+    compile('a')
+    compile('c')
+
+    # b was the least recently used
+    assert cached('b') is None and cached('a') is not None
+    info = cache_info()
+    assert (info.evictions, info.currsize, info.maxsize) == (1, 2, 2)
+
+
+def test_limits_bypass_the_cache():
+    assert compile('ab', Limits(max_steps=100)) is not compile('ab', Limits(max_steps=100))
+    assert cache_info().currsize == 0
+
+
+@pytest.mark.parametrize('backend', ['ply', 'rd'])
+def test_invalid_patterns(backend):
+    set_parser(backend)
+    for pattern, pos in [('a b', 1), ('aé', 1), ('(a', 2), ('a||b', 2)]:
+        with pytest.raises(ParseError) as e:
+            compile(pattern)
+        assert e.value.pos == pos
+
+
+def test_set_parser_empties_the_cache():
+    set_parser('ply')
+    by_ply = compile('ab*')
+
+    set_parser('rd')
+    assert cached('ab*') is None
+    by_rd = compile('ab*')
+    assert by_rd is not by_ply and by_rd.fullmatch('abbb')
+
+    # choosing the same backend again keeps the cache
+    set_parser('rd')
+    assert compile('ab*') is by_rd
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
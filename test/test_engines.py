@@ -0,0 +1,69 @@
+import itertools
+import re
+import sys
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+import pytest
+
+from regex.bitparallel import build_bit_parallel
+from regex.compact_nfa import build_compact_nfa
+from regex.compiler import parse
+from regex.dfa import DFA, CompactDFA
+from regex.nfa import NFA
+from regex.optimize import simplify
+
+PATTERNS = ['a', 'ab|c', 'a*', '(a|b)*c', 'a+b?', '(ab|a)(bc|c)', '[a-b]+c*', '[^a]b', '.a.', '((a|b)*c)*',
+            '(a|b?)b', 'a?b?c?', '(a|b)*a(a|b)(a|b)', '(aa|b)*(c|a)+', 'a(b|c){1,2}', '\\.|a']
+
+
+def engines(pattern):
+    """
+    @param pattern -- str
+
+    @return -- list of (name, automaton) for every engine that can run the pattern
+    """
+    tree = parse(pattern)
+    compact = build_compact_nfa(tree)
+    found = [('nfa', NFA(tree)), ('compact nfa', compact), ('simplified nfa', simplify(compact)),
+             ('lazy dfa', DFA(compact)), ('lazy dfa fallback', DFA(compact, max_states=2)),
+             ('compact dfa', CompactDFA(compact))]
+    bits = build_bit_parallel(tree)
+    if bits is not None:
+        found.append(('bit-parallel', bits))
+    return found
+
+
+def inputs(alphabet='abc.', max_length=5):
+    for length in range(max_length + 1):
+        for chars in itertools.product(alphabet, repeat=length):
+            yield ''.join(chars)
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_engines_match_re(pattern):
+    expected = re.compile(pattern)
+    found = engines(pattern)
+
+    for s in inputs():
+        ends = [i for i in range(len(s) + 1) if expected.fullmatch(s, 0, i)]
+        longest = ends[-1] if ends else None
+        for name, automaton in found:
+            assert automaton.fullmatch(s) == bool(expected.fullmatch(s)), (name, pattern, s)
+            assert automaton.match(s) == longest, (name, pattern, s)
+
+
+def test_non_ascii_input():
+    for name, automaton in engines('[^a]+'):
+        assert automaton.match('é\U0001f600a') == 2, name
+        assert automaton.fullmatch('Ā') is True, name
+
+
+def test_compact_dfa_is_minimal():
+    # (a|b)*a(a|b)(a|b) needs the last three chars read, so 8 states
+    assert CompactDFA(build_compact_nfa(parse('(a|b)*a(a|b)(a|b)'))).get_num_states() == 8
+    assert CompactDFA(build_compact_nfa(parse('(a|b)*'))).get_num_states() == 1
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
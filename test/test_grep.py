@@ -0,0 +1,68 @@
+import sys
+from itertools import accumulate
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+import pytest
+
+from regex import compiler, search_stream
+from regex import grep as grep_module
+from regex.grep import grep, main, split_lines
+
+LINES = [b'line %d %s' % (i, b'match' if i % 7 == 0 else b'miss') for i in range(3000)] + [b'', 'é match'.encode()]
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / 'data.txt'
+    path.write_bytes(b'\n'.join(LINES))
+    return str(path)
+
+
+@pytest.fixture
+def parallel(monkeypatch):
+    # small files are searched in the calling process, make the test file big enough for the pool
+    monkeypatch.setattr(grep_module, 'MIN_PARALLEL_SIZE', 1)
+    monkeypatch.setattr(grep_module, 'RANGE_SIZE', 4096)
+
+
+def test_split_lines(data_file):
+    with open(data_file, 'rb') as f:
+        data = f.read()
+
+    for parts in [1, 2, 3, 10, 1000, 100000]:
+        ranges = split_lines(data_file, parts)
+        assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+        for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+            assert start < end == next_start
+            assert data[end - 1:end] == b'\n'
+
+
+def test_split_empty_file(tmp_path):
+    path = tmp_path / 'empty.txt'
+    path.write_bytes(b'')
+    assert split_lines(str(path), 4) == []
+
+
+@pytest.mark.parametrize('pattern', ['m(a|i)tch', '1[0-9]*7', 'nothing'])
+def test_grep_matches_search_stream(data_file, parallel, pattern):
+    expected = list(search_stream(pattern, data_file))
+    assert list(grep(pattern, data_file, workers=2, chunk_size=1000)) == expected
+    assert list(grep(pattern, data_file, workers=1)) == expected
+
+
+def test_main(data_file, capsysbinary):
+    backend = compiler._parser_backend
+    try:
+        assert main(['-b', '-j', '1', '29[0-9]9', data_file]) == 0
+        # lines 2909, 2919, ... 2999
+        offsets = list(accumulate((len(line) + 1 for line in LINES), initial=0))
+        expected = b''.join(b'%d:%s\n' % (offsets[i], LINES[i]) for i in range(2909, 3000, 10))
+        assert capsysbinary.readouterr().out == expected
+        assert main(['nothing', data_file, data_file]) == 1
+    finally:
+        compiler.set_parser(backend)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
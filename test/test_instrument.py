@@ -0,0 +1,128 @@
+import sys
+import threading
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+import pytest
+
+from regex import (ParseError, add_observer, compile, purge, remove_observer, reset_stats, set_instrumentation,
+                   stats)
+from regex import instrument
+
+
+@pytest.fixture
+def events():
+    found = []
+    purge()
+    reset_stats()
+    set_instrumentation(True)
+    add_observer(found.append)
+    yield found
+    remove_observer(found.append)
+    set_instrumentation(False)
+    reset_stats()
+    purge()
+
+
+def test_compile_stages(events):
+    compile('a(b|c)*d')
+
+    stages = [event['stage'] for event in events]
+    for name in ['parse', 'build_tree', 'nfa', 'simplify', 'literals', 'dfa']:
+        assert name in stages
+    # inner stages finish first and take the pattern of the compile stage
+    assert stages[-1] == 'compile'
+    assert all(event['pattern'] == 'a(b|c)*d' for event in events)
+    assert all(event['seconds'] >= 0 for event in events)
+
+    totals = stats()
+    assert totals['compile']['calls'] == 1 and totals['compile']['errors'] == 0
+    assert totals['simplify']['states'] == next(e['states'] for e in events if e['stage'] == 'simplify')
+
+
+def test_errors_are_recorded(events):
+    with pytest.raises(ParseError):
+        compile('a(b')
+
+    assert events[-1]['stage'] == 'compile' and events[-1]['error'] == 'ParseError'
+    assert stats()['compile']['errors'] == 1
+
+
+def test_match_counts(events):
+    compiled = compile('(a|b)*c')
+    del events[:]
+
+    compiled.match('ababc')
+    compiled.search('xxabc')
+    stages = [event['stage'] for event in events]
+    # the reverse DFA of the searcher is built on the first search
+    assert stages[0] == 'match' and 'searcher' in stages and stages[-1] == 'search'
+    assert events[0]['chars'] == 5 and events[-1]['chars'] == 5
+
+    del events[:]
+    spans = compiled.finditer('c' * 10)
+    next(spans)
+    next(spans)
+    assert events == []
+    spans.close()
+    assert events[0]['stage'] == 'finditer' and events[0]['matches'] == 2 and events[0]['chars'] == 10
+
+
+def test_lazy_dfa_hit_rate(events):
+    # too many states for a CompactDFA and too many positions for a BitParallelNFA
+    compiled = compile('(a|b)*a(a|b){40}c')
+    assert stats()['dfa']['lazy'] == 1
+
+    compiled.fullmatch('ab' * 100)
+    first = stats()['fullmatch']
+    compiled.fullmatch('ab' * 100)
+    totals = stats()['fullmatch']
+
+    assert totals['calls'] == 2 and totals['dfa_lookups'] == 400
+    # the second run finds every transition the first one built
+    assert totals['dfa_misses'] == first['dfa_misses'] > 0
+    assert totals['dfa_hit_rate'] == 1.0 - first['dfa_misses'] / 400
+
+
+def test_memory(events):
+    set_instrumentation(True, memory=True)
+    try:
+        compile('(abc|d)+e')
+    finally:
+        set_instrumentation(True)
+    assert all('bytes' in event for event in events)
+
+
+def test_threads_keep_their_own_stages(events):
+    patterns = ['a{}(b|c)*'.format(i) for i in range(4)]
+
+    def work(pattern):
+        for _ in range(20):
+            purge()
+            compile(pattern)
+
+    threads = [threading.Thread(target=work, args=(pattern,)) for pattern in patterns]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(event['pattern'] in patterns for event in events)
+    for pattern in patterns:
+        assert sum(event['stage'] == 'compile' and event['pattern'] == pattern for event in events) == 20
+    assert stats()['compile']['calls'] == 80
+
+
+def test_off():
+    found = []
+    add_observer(found.append)
+    try:
+        compile('x(y|z)')
+        purge()
+    finally:
+        remove_observer(found.append)
+    assert found == [] and not instrument.enabled
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,70 @@
+import sys
+import time
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+import pytest
+
+from regex import DeadlineError, DFALimitError, Limits, NFALimitError, StepLimitError, compile
+from regex.bitparallel import BitParallelNFA
+from regex.compiler import build_pattern
+from regex.dfa import CompactDFA
+
+
+def test_nfa_states():
+    with pytest.raises(NFALimitError):
+        compile('a{20}', Limits(max_nfa_states=10))
+    assert compile('a{20}', Limits(max_nfa_states=100)).fullmatch('a' * 20)
+
+
+def test_dfa_states():
+    # too many positions for the bit-parallel matcher, and a DFA exponential in the count
+    with pytest.raises(DFALimitError):
+        compile('(a|b)*a(a|b){40}', Limits(max_dfa_states=100))
+
+
+def test_bit_parallel_replaces_only_the_lazy_dfa():
+    # 512 DFA states fit in a CompactDFA, 32768 do not
+    assert isinstance(compile('(a|b)*a(a|b){8}').dfa, CompactDFA)
+    assert isinstance(compile('(a|b)*a(a|b){14}').dfa, BitParallelNFA)
+    # a BitParallelNFA has no DFA states to limit
+    assert isinstance(compile('(a|b)*a(a|b){8}', Limits(max_dfa_states=100)).dfa, BitParallelNFA)
+
+
+def test_compile_steps_stop_the_nfa_build():
+    start = time.perf_counter()
+    with pytest.raises(StepLimitError):
+        build_pattern('(a{1000}){10}', Limits(max_steps=1000))
+    assert time.perf_counter() - start < 0.2
+
+
+def test_compile_deadline_stops_the_dfa_build():
+    start = time.perf_counter()
+    with pytest.raises(DeadlineError):
+        build_pattern('([a-z]{1,1000}){5}', Limits(timeout=0.1))
+    assert time.perf_counter() - start < 1
+
+
+def test_match_steps():
+    pattern = compile('(a|b)*c')
+    text = 'ab' * 10000 + 'c'
+
+    assert pattern.fullmatch(text)
+    for call in (pattern.match, pattern.fullmatch, pattern.search):
+        with pytest.raises(StepLimitError):
+            call(text, limits=Limits(max_steps=1000))
+
+    # limits given when compiling apply to every call
+    limited = compile('(a|b)*c', Limits(max_steps=1000))
+    with pytest.raises(StepLimitError):
+        limited.findall(text)
+    assert limited.fullmatch('abc')
+
+
+def test_match_deadline():
+    with pytest.raises(DeadlineError):
+        compile('a*').match('a' * 100000, limits=Limits(timeout=0))
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,65 @@
+import re
+import sys
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+import pytest
+
+from regex import compile
+from regex.compiler import parse
+from regex.literals import MAX_FIND, NOTHING, common_prefix, common_suffix, extract_literals, useful
+
+
+@pytest.mark.parametrize('pattern, prefixes, required', [
+    ('abc', {'abc'}, {'abc'}),
+    ('a(b|c)d', {'abd', 'acd'}, {'abd', 'acd'}),
+    ('(a|b)*c', {''}, {'c'}),
+    ('x*', {''}, {''}),
+    ('[ab]+c', {'a', 'b'}, {'ac', 'bc'}),
+    ('[a-z]+ing', set('abcdefghijklmnopqrstuvwxyz'), {'ing'}),
+    ('[0-9]+x[0-9]+', set('0123456789'), {d + 'x' for d in '0123456789'}),
+])
+def test_extract_literals(pattern, prefixes, required):
+    assert extract_literals(parse(pattern)) == (prefixes, required)
+
+
+def test_useful():
+    assert not useful(frozenset())
+    assert not useful(NOTHING)
+    assert not useful({'a', ''}, skip=True)
+    assert useful({'a', 'b'}) and not useful({'a', 'b'}, skip=True)
+    assert useful({'a'}, skip=True) and useful({'a', 'bc'}, skip=True)
+
+    many = {'x%02d' % i for i in range(MAX_FIND + 1)}
+    assert useful(many) and not useful(many, skip=True)
+    assert useful(set(list(many)[:MAX_FIND]), skip=True)
+
+
+def test_common_prefix_and_suffix():
+    assert common_prefix({'house', 'housed', 'hour'}) == {'hou'}
+    assert common_suffix({'sing', 'going', 'ring'}) == {'ing'}
+    assert common_prefix({'ab', 'cd'}) == NOTHING
+    assert common_prefix(frozenset()) == NOTHING
+
+
+def test_prefilter_choice():
+    # 26 single char prefixes are not worth looking for, the required 'ing' is
+    compiled = compile('[a-z]+ing')
+    assert compiled.prefix is None and compiled.required.literals == ('ing',)
+
+    compiled = compile('|'.join('w%02dq' % i for i in range(MAX_FIND + 2)))
+    assert compiled.prefix is None and len(compiled.required.literals) == MAX_FIND + 2
+
+
+@pytest.mark.parametrize('pattern', ['[a-z]+ing', '[ab]+c', '(ab|cd)+x', '|'.join('w%02dq' % i for i in range(20))])
+def test_finditer_with_required(pattern):
+    s = 'xx w07q abring cdabx sing w19q ing abbc ' * 20 + 'abab'
+    expected = [m.span() for m in re.finditer(pattern, s)]
+    assert list(compile(pattern).finditer(s)) == expected
+    for pos, endpos in [(3, 40), (10, 11), (5, len(s) - 3)]:
+        assert list(compile(pattern).finditer(s, pos, endpos)) == [m.span() for m in
+                                                                   re.compile(pattern).finditer(s, pos, endpos)]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,47 @@
+import itertools
+import re
+import sys
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+import pytest
+
+from regex import PatternSet
+
+PATTERNS = ['ab', 'a*', '(a|b)*c', 'b+a?', '[^a]', 'abc|ca', '(ab){2}']
+
+
+def inputs(max_length=5):
+    for length in range(max_length + 1):
+        for chars in itertools.product('abc', repeat=length):
+            yield ''.join(chars)
+
+
+@pytest.mark.parametrize('max_states', [1000, 2])
+def test_pattern_set_matches_re(max_states):
+    patterns = PatternSet(PATTERNS, max_states)
+    expected = [re.compile(pattern) for pattern in PATTERNS]
+    assert len(patterns) == len(PATTERNS)
+
+    for s in inputs():
+        assert patterns.fullmatch(s) == {i for i, e in enumerate(expected) if e.fullmatch(s)}, s
+        assert patterns.search(s) == {i for i, e in enumerate(expected) if e.search(s)}, s
+
+
+def test_duplicate_patterns():
+    patterns = PatternSet(['a+', 'a+', 'b'])
+    assert patterns.fullmatch('aa') == {0, 1}
+    assert patterns.search('xxbx') == {2}
+    assert patterns.search('') == frozenset()
+
+
+def test_long_patterns():
+    # the member NFAs are built in linear time, as compile() builds its CompactNFA
+    patterns = PatternSet(['x' * 5000, '|'.join('w{:03d}'.format(i) for i in range(500)), '(ab|c)*' * 200 + 'd'])
+    assert patterns.fullmatch('x' * 5000) == {0}
+    assert patterns.search('zzw123' + 'x' * 4999 + 'abd') == {1, 2}
+    assert patterns.search('x' * 5001) == {0}
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
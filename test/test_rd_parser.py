@@ -0,0 +1,92 @@
+import itertools
+import sys
+import threading
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+from regex.errors import ParseError
+from regex.parse_tree import build_tree
+from regex.rd_parser import RDParser
+from regex.regex_parser import Regex
+
+# every token of the grammar, so the generated patterns cover both valid and invalid token sequences,
+# and chars neither lexer accepts
+ALPHABET = list('ab.()|*+?[]^-') + ['{2,3}', '\\*', ' ', '\u00e9']
+
+
+def parse(parser, s):
+    """
+    @return -- the parse tree, or the position of the error
+    """
+    try:
+        return parser.run(s)
+    except ParseError as e:
+        return e.pos
+
+
+def test_same_trees():
+    ply = Regex()
+    rd = RDParser()
+
+    for length in range(1, 5):
+        for chars in itertools.product(ALPHABET, repeat=length):
+            s = ''.join(chars)
+            assert parse(ply, s) == parse(rd, s), s
+
+
+def test_deep_nesting():
+    ply = Regex()
+    rd = RDParser()
+
+    for depth in (300, 5000):
+        for s in ['(' * depth + 'a' + ')' * depth, '(a|' * depth + 'b' + ')*' * depth]:
+            # the trees are compared through ParseTree, whose repr does not recurse
+            assert repr(build_tree(ply.run(s))) == repr(build_tree(rd.run(s)))
+
+        for s, pos in [('(' * depth + 'a', depth + 1), ('(' * depth + ')' * depth, depth)]:
+            assert parse(ply, s) == parse(rd, s) == pos
+
+
+def test_error_position():
+    rd = RDParser()
+
+    for s, pos in [('a|', 2), ('(ab', 3), ('a)b', 1), ('[a-]', 3), ('a**', 2), ('a b', 1), ('', 0), ('ab\u00e9', 2),
+                   ('a?+', 2), ('a{3,1}', 1), ('a{1001}', 1), ('a{', 1), ('a\\', 1), ('a\\b', 1)]:
+        try:
+            rd.run(s)
+        except ParseError as e:
+            assert e.pos == pos, (s, e.pos)
+            assert e.pattern == s
+        else:
+            assert False, s
+
+
+def test_threads():
+    # each thread parses its own patterns with its own parser instance, the instances share their class tables
+    patterns = [['a{}(b|c)*[d-f]+|x{{{},3}}'.format(i, i % 3 + 1), '({}|a.)?b+'.format(i), 'a{}(b'.format(i)]
+                for i in range(8)]
+    expected = {cls: [[parse(cls(), s) for s in group] for group in patterns] for cls in (Regex, RDParser)}
+    assert expected[Regex] == expected[RDParser]
+    found = {}
+
+    def work(cls, i):
+        parser = cls()
+        found[cls, i] = [[parse(parser, s) for s in patterns[i]] for _ in range(50)]
+
+    threads = [threading.Thread(target=work, args=(cls, i)) for i in range(len(patterns)) for cls in (Regex, RDParser)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for (cls, i), runs in found.items():
+        assert all(run == expected[cls][i] for run in runs), (cls.__name__, patterns[i])
+    assert len(found) == len(threads)
+
+
+if __name__ == '__main__':
+    test_same_trees()
+    test_deep_nesting()
+    test_error_position()
+    test_threads()
+    print("OK")
@@ -0,0 +1,58 @@
+import itertools
+import re
+import sys
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+import pytest
+
+from regex import RegexError, compile
+from regex.bitparallel import MAX_POSITIONS, BitParallelNFA, build_bit_parallel
+from regex.compiler import parse
+from regex.parse_tree import MAX_REPEAT_SIZE
+
+
+@pytest.mark.parametrize('pattern', ['a{3}', 'a{2,4}', 'a{2,}', 'a{,2}', 'a{0}', '(ab|c){1,3}d', '[a-c]?b{2}',
+                                     '((ab){2}c){0,2}'])
+def test_counts_match_re(pattern):
+    compiled = compile(pattern)
+    expected = re.compile(pattern.replace('{,', '{0,'))
+
+    for s in ['', 'a', 'aa', 'aaa', 'aaaa', 'aaaaa', 'abd', 'cabd', 'ababcababc', 'abab', 'bb', 'cbb', 'abababc']:
+        assert compiled.fullmatch(s) == bool(expected.fullmatch(s)), (pattern, s)
+
+
+@pytest.mark.parametrize('n', [1, 2, 7, 8, 33, MAX_POSITIONS])
+def test_bit_parallel_positions(n):
+    # every copy only duplicates the positions of the repeated sub-pattern
+    assert len(BitParallelNFA(parse('a{{{}}}'.format(n))).labels) == n
+    assert len(BitParallelNFA(parse('(ab|c){{1,{}}}'.format(n // 3 or 1))).labels) == 3 * (n // 3 or 1)
+    assert build_bit_parallel(parse('a{{{}}}'.format(MAX_POSITIONS + 1))) is None
+
+
+@pytest.mark.parametrize('pattern', ['(a|b)*a(a|b){3}', '(ab|a){2,3}b', '(a{2}b?){1,2}', 'a{0}b', '(a|b){2,}a'])
+def test_bit_parallel_counts_match_re(pattern):
+    bits = BitParallelNFA(parse(pattern))
+    expected = re.compile(pattern)
+
+    for length in range(8):
+        for chars in itertools.product('ab', repeat=length):
+            s = ''.join(chars)
+            ends = [i for i in range(len(s) + 1) if expected.fullmatch(s, 0, i)]
+            assert bits.fullmatch(s) == bool(expected.fullmatch(s)), (pattern, s)
+            assert bits.match(s) == (ends[-1] if ends else None), (pattern, s)
+
+
+def test_nested_counts_are_capped():
+    with pytest.raises(RegexError):
+        compile('((a{1000}){1000}){1000}')
+    with pytest.raises(RegexError):
+        compile('(a{1000}){11}')
+
+    # the cap is on the expanded pattern, long patterns without counts are fine
+    compile('(a{1000}){10}')
+    assert compile('ab' * MAX_REPEAT_SIZE).fullmatch('ab' * MAX_REPEAT_SIZE)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
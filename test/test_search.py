@@ -0,0 +1,82 @@
+import itertools
+import re
+import sys
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+import pytest
+
+from regex import compile, findall, finditer, search
+
+PATTERNS = ['a', 'ab|a', 'a*', '(a|b)*c', 'b+', 'ab(c|a)*', '[^a]b?', 'aa|b', 'c(ab)+', '(a|b)*a(a|b)(a|b)',
+            'abcab', 'x*a?']
+
+
+def longest(expected, s, pos, endpos):
+    """
+    Leftmost-longest match of a re pattern by trying every span.
+
+    @return -- tuple (start, end) or None
+    """
+    for start in range(pos, endpos + 1):
+        for end in range(endpos, start - 1, -1):
+            if expected.fullmatch(s, start, end):
+                return start, end
+    return None
+
+
+def longest_all(expected, s, pos, endpos):
+    spans = []
+    while pos <= endpos:
+        span = longest(expected, s, pos, endpos)
+        if span is None:
+            break
+        spans.append(span)
+        pos = span[1] if span[1] > span[0] else span[1] + 1
+    return spans
+
+
+def inputs(max_length=6):
+    for length in range(max_length + 1):
+        for chars in itertools.product('abc', repeat=length):
+            yield ''.join(chars)
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_spans_match_brute_force(pattern):
+    compiled = compile(pattern)
+    expected = re.compile(pattern)
+
+    for s in inputs():
+        assert compiled.search(s) == longest(expected, s, 0, len(s)), s
+        assert list(compiled.finditer(s)) == longest_all(expected, s, 0, len(s)), s
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_pos_and_endpos(pattern):
+    compiled = compile(pattern)
+    expected = re.compile(pattern)
+    s = 'cabcabaabcbba'
+
+    for pos in range(len(s) + 1):
+        for endpos in range(pos, len(s) + 1):
+            assert compiled.search(s, pos, endpos) == longest(expected, s, pos, endpos), (pos, endpos)
+            assert list(compiled.finditer(s, pos, endpos)) == longest_all(expected, s, pos, endpos), (pos, endpos)
+
+
+def test_long_input_with_literals():
+    s = 'x' * 10000 + 'abcab' + 'y' * 10000 + 'abcab'
+    assert compile('abcab').search(s) == (10000, 10005)
+    assert list(compile('c(ab)+').finditer(s)) == [(10002, 10005), (20007, 20010)]
+    assert compile('abcaba').search(s) is None
+
+
+def test_module_functions():
+    assert search('b+', 'abbbcb') == (1, 4)
+    assert list(finditer('b+', 'abbbcb')) == [(1, 4), (5, 6)]
+    assert findall('a*', 'baac') == ['', 'aa', '', '']
+    assert findall('a*', 'baac') == re.findall('a*', 'baac')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,146 @@
+import os
+import sys
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+import pytest
+
+from regex import compile, compiler, purge, set_cache_dir
+from regex.bitparallel import BitParallelNFA
+from regex.compiler import build_pattern, restore
+from regex.dfa import CompactDFA
+from regex.serialize import HEADER, SET_SIZE, DiskCache, FormatError, dumps, loads
+from regex.utf8 import ByteNFA
+
+PATTERNS = ['a(b|c)*d', 'x[0-9]+y|z', '(a|b)*a(a|b)(a|b)(a|b)', 'a[^b]c', '.*']
+INPUTS = ['abcbd', 'x123y', 'z', 'babbb', 'abéc', 'a\0b\x01', '', 'qqq']
+
+
+@pytest.fixture(autouse=True)
+def no_disk_cache():
+    purge()
+    yield
+    set_cache_dir(None)
+    purge()
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_round_trip(pattern):
+    compiled = build_pattern(pattern)
+    loaded = restore(loads(dumps(compiled)))
+
+    assert loaded.pattern == pattern
+    assert type(loaded.nfa) is type(compiled.nfa)
+    assert (loaded.prefix and loaded.prefix.literals) == (compiled.prefix and compiled.prefix.literals)
+    for s in INPUTS:
+        assert loaded.match(s) == compiled.match(s)
+        assert loaded.search(s) == compiled.search(s)
+
+
+def test_bytes_pattern():
+    # the byte labels of [^a] include the NUL byte
+    compiled = build_pattern(b'[^a]b+|xy')
+    pattern, nfa, dfa, prefix, required = loads(dumps(compiled))
+
+    assert pattern == compiled.pattern and isinstance(pattern, bytes)
+    assert isinstance(nfa, ByteNFA)
+
+    loaded = restore((pattern, nfa, dfa, prefix, required))
+    for s in ['\0bb', 'éb', 'xy', 'ab']:
+        data = s.encode('utf-8')
+        assert loaded.match(data) == compiled.match(data)
+        assert list(loaded.finditer(b'a ' + data)) == list(compiled.finditer(b'a ' + data))
+
+
+def test_bit_parallel(monkeypatch):
+    # too many DFA states for a CompactDFA, few enough positions for a BitParallelNFA
+    compiled = build_pattern('(a|b)*a(a|b){14}c')
+    assert isinstance(compiled.dfa, BitParallelNFA)
+    data = dumps(compiled)
+
+    # the tables are read back rather than rebuilt from the pattern
+    monkeypatch.setattr(compiler, 'parse', None)
+    loaded = restore(loads(data))
+    assert isinstance(loaded.dfa, BitParallelNFA)
+    assert loaded.dfa.labels == compiled.dfa.labels and loaded.dfa.masks == compiled.dfa.masks
+    assert loaded.dfa.follow == compiled.dfa.follow and loaded.dfa.final == compiled.dfa.final
+    for s in ['a' * 15 + 'c', 'ba' + 'b' * 14 + 'c', 'a' * 14 + 'c', 'éa' + 'b' * 14 + 'c', '']:
+        assert loaded.fullmatch(s) == compiled.fullmatch(s)
+        assert loaded.search(s) == compiled.search(s)
+
+    # the last set, before the padding, holds the final positions: one past the last position is out of range
+    positions = compiled.dfa.get_num_states()
+    end = len(data) - -(positions + len(compiled.dfa.masks) + 1) * SET_SIZE % 4
+    with pytest.raises(FormatError):
+        loads(data[:end - SET_SIZE] + (1 << positions).to_bytes(SET_SIZE, 'little') + data[end:])
+
+
+def damaged(data, offset, value):
+    data = bytearray(data)
+    data[offset:offset + 4] = value.to_bytes(4, sys.byteorder, signed=True)
+    return bytes(data)
+
+
+def test_damaged_tables_are_rejected():
+    compiled = build_pattern('a(b|c)*d')
+    assert isinstance(compiled.dfa, CompactDFA)
+    data = dumps(compiled)
+
+    # the last int32 is the last DFA table entry, the header is followed by the pattern
+    with pytest.raises(FormatError):
+        loads(damaged(data, len(data) - 4, compiled.dfa.get_num_states()))
+    with pytest.raises(FormatError):
+        loads(damaged(data, len(data) - 4, -2))
+    with pytest.raises(FormatError):
+        loads(data[:len(data) - 4])
+    with pytest.raises(FormatError):
+        loads(b'RGXB' + data[4:])
+
+    # damage each int32 after the header in turn, the file is either rejected or still runs
+    for offset in range(HEADER.size, len(data) - 3, 4):
+        try:
+            loaded = loads(damaged(data, offset, 1 << 20))
+        except FormatError:
+            continue
+        restore(loaded).match('abd')
+
+
+def test_disk_cache(tmp_path):
+    set_cache_dir(str(tmp_path))
+    compiled = compile('a(b|c)*d')
+    files = os.listdir(str(tmp_path))
+    assert len(files) == 1
+
+    purge()
+    loaded = compile('a(b|c)*d')
+    assert loaded is not compiled
+    assert isinstance(loaded.dfa, CompactDFA)
+    assert loaded.match('abcbd') == 5
+
+    # a bytes pattern of the same text is stored in a file of its own
+    assert compile(b'a(b|c)*d').match(b'abd') == 3
+    assert len(os.listdir(str(tmp_path))) == 2
+    purge()
+    assert compile(b'a(b|c)*d').search(b'xabd') == (1, 4)
+
+
+def test_damaged_file_is_a_miss(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.store(build_pattern('a(b|c)*d'))
+    path = cache.path('a(b|c)*d')
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(damaged(data, len(data) - 4, 1 << 20))
+    assert cache.load('a(b|c)*d') is None
+
+    set_cache_dir(str(tmp_path))
+    assert compile('a(b|c)*d').match('abd') == 3
+    assert compiler._disk_cache.load('a(b|c)*d') is not None
+
+    assert cache.load(b'a(b|c)*d') is None
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
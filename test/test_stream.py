@@ -0,0 +1,60 @@
+import io
+import re
+import sys
+
+if ".." not in sys.path: sys.path.insert(0, "..")
+
+import pytest
+
+from regex import compile, search_stream
+
+DATA = 'abc\nxxabcx\n\nnone here\nézabc\ndéjà vu\nab\nc\n' + 'y' * 300 + 'abc' + 'y' * 10 + '\nlast abc'
+
+
+def expected(pattern, data):
+    lines = data.split(b'\n')
+    if not lines[-1]:
+        # no line after the last newline
+        lines.pop()
+
+    found = []
+    offset = 0
+    for line in lines:
+        if re.search(pattern, line.decode('utf-8', 'replace')):
+            found.append((offset, line))
+        offset += len(line) + 1
+    return found
+
+
+@pytest.mark.parametrize('pattern', ['abc', 'a(b|c)*c', 'y{5}a', 'x*', '[^a-z]', 'b\\.?c'])
+@pytest.mark.parametrize('chunk_size', [1, 2, 5, 64, 1 << 16])
+def test_file_objects(pattern, chunk_size):
+    data = DATA.encode('utf-8')
+    assert list(search_stream(pattern, io.BytesIO(data), chunk_size)) == expected(pattern, data)
+
+
+@pytest.mark.parametrize('use_mmap', [True, False])
+def test_paths(tmp_path, use_mmap):
+    path = tmp_path / 'data.txt'
+    for data in [DATA.encode('utf-8'), DATA.encode('utf-8') + b'\n', b'', b'\n', b'abc', b'\xffabc\xfe\n\xc3']:
+        path.write_bytes(data)
+        for pattern in ['abc', 'x*', '[^a-z]']:
+            found = list(search_stream(compile(pattern), str(path), 3, use_mmap))
+            assert found == expected(pattern, data), (data, pattern)
+
+
+def test_scanner_is_built_once():
+    compiled = compile('(a|b)*a(a|b)(a|b)')
+    scanner = compiled.line_scanner
+    assert list(search_stream(compiled, io.BytesIO(b'babb\nbb\n'))) == [(0, b'babb')]
+    assert compiled.line_scanner is scanner
+
+
+def test_required_literal_lines_are_skipped():
+    data = b'\n'.join([b'q' * 100] * 50 + [b'q' * 10 + b'needle'] + [b'r' * 100] * 50)
+    assert compile('e+dle').required is not None
+    assert list(search_stream('e+dle', io.BytesIO(data), 256)) == [(5050, b'q' * 10 + b'needle')]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])